@@ -6,7 +6,6 @@ SciResearcher Gradio Web 应用
 import os
 import json
 import time
-import uuid
 from pathlib import Path
 from typing import List, Dict
 
@@ -75,8 +74,8 @@ class SciResearcherApp:
             if not hasattr(file, 'name') or not file.name.lower().endswith('.pdf'):
                 return "❌ 错误: 请上传有效的PDF文件", "", None
 
-            # 生成或使用提供的文档ID
-            doc_id = doc_name or f"doc_{uuid.uuid4().hex[:8]}"
+            # 用户命名的文档ID；未命名时按 DOI / 标题匹配已入库的同一文档，或由其生成新ID
+            doc_id = doc_name or None
             file_name = os.path.basename(file.name)
 
             # 创建上传目录
@@ -84,13 +83,19 @@ class SciResearcherApp:
             temp_dir.mkdir(parents=True, exist_ok=True)
             temp_file = temp_dir / file_name
 
-            # 检查文件大小（MinerU支持最大200MB的文件，但HTTP请求可能有其他限制）
+            # 检查文件大小（MinerU单文件最大200MB，超过时按页切分为多个部分并发解析）
             file_size = file.size if hasattr(file, 'size') else os.path.getsize(file.name)
             if file_size > 200 * 1024 * 1024:  # 200MB
-                return "❌ 错误: 文件大小超过MinerU API限制（200MB）\n\n建议：将PDF文件分割为多个较小文件后再上传", "", None
+                yield f"""
+📤 正在处理超大PDF文件: {file_name}
+文件大小: {file_size/1024/1024:.2f}MB
+✂️ 超过MinerU单文件上限（200MB），将按页切分为多个部分并发解析后拼接
+⏳ 请耐心等待，可能需要较长时间...
 
+第一步: 文件上传和验证
+""", "", None
             # 优化进度显示：对于大文件显示更详细的处理进度
-            if file_size > 50 * 1024 * 1024:  # 50MB+
+            elif file_size > 50 * 1024 * 1024:  # 50MB+
                 yield f"""
 📤 正在处理大PDF文件: {file_name}
 文件大小: {file_size/1024/1024:.2f}MB
@@ -206,13 +211,17 @@ class SciResearcherApp:
                 "content_length": len(content)
             }
 
-            success = vector_db.add_document(
+            # 有 content_list 时按文档结构 (章节/表格/公式/图注) 分块；
+            # 已入库的同一文档 (doc_id/DOI/标题相同，如论文新版本) 只向量化改动的块
+            report = vector_db.index_document(
                 doc_id=doc_id,
                 content=content,
-                metadata=metadata
+                metadata=metadata,
+                content_list=result_dict["result"].get("content_list")
             )
 
-            if success:
+            if report:
+                doc_id = report["doc_id"]
                 # 处理成功后清理临时文件
                 if temp_file.exists():
                     temp_file.unlink()
@@ -224,7 +233,7 @@ class SciResearcherApp:
 **文档ID**: `{doc_id}`
 **文档名称**: {file_name}
 **内容长度**: {len(content):,} 字符
-**分块数量**: {len(content) // 500 + 1} 块
+**分块数量**: {report['chunks']} 块 (复用 {report['reused']}，新向量化 {report['embedded']}，删除 {report['deleted']})
 
 ---
 
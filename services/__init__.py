@@ -5,6 +5,7 @@ from .model_factory import ModelFactory
 from .vision_service import VisionService
 from .embedding_service import EmbeddingService
 from .vector_store import VectorStore
+from .vector_coordinator import VectorStoreCoordinator, ConsistentHashRing
 from .pdf_service import PDFService
 
 __all__ = [
@@ -12,5 +13,7 @@ __all__ = [
     'VisionService',
     'EmbeddingService',
     'VectorStore',
+    'VectorStoreCoordinator',
+    'ConsistentHashRing',
     'PDFService'
 ]
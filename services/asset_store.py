@@ -0,0 +1,343 @@
+"""
+图片资源库 (内容寻址)
+
+MinerU 结果中的图片 (插图、表格截图、公式图片) 登记到 SQLite 索引，按
+(doc_id, 图号, 页码) 查找。图片文件以内容的 SHA-256 命名保存在 objects/ 下，
+不同文档、同一论文的不同版本中相同的图片只存一份。
+
+登记时只记录图片所在的结果压缩包与成员名，图片内容在第一次 resolve() 时才从
+本地压缩包读出并写入资源库 (pdf_parser.keep_archives 为 false、压缩包读取后即删除
+时，登记时就写入；保留的压缩包被淘汰前，其中尚未写入的图片由 release_archive() 写入)。之后的解析、图表分析都直接使用资源库中的文件，不需要重新下载压缩包。
+
+    store = get_asset_store()
+    store.register(doc_id, archive, content_list)     # 解析后登记 (每个压缩包一次)
+    store.adopt(doc_id, result["images"])             # 解析缓存命中时按结果中的引用登记
+    path = store.resolve(doc_id, figure=3)            # 需要时才写出图片
+"""
+import re
+import time
+import sqlite3
+import hashlib
+import contextlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    doc_id TEXT NOT NULL,
+    member TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    figure INTEGER,
+    page INTEGER,
+    caption TEXT,
+    archive TEXT,
+    sha256 TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (doc_id, member)
+);
+CREATE INDEX IF NOT EXISTS idx_images_figure ON images (doc_id, kind, figure, page);
+"""
+
+_COLUMNS = ("doc_id", "member", "kind", "figure", "page", "caption", "archive", "sha256")
+
+# 图片所在块的类型 -> 说明字段
+_CAPTION_FIELDS = {
+    "image": ("image_caption", "img_caption"),
+    "table": ("table_caption",),
+    "equation": (),
+}
+_NUMBER = {
+    "image": re.compile(r'^\s*(?:fig(?:ure)?\.?|图)\s*(\d+)', re.IGNORECASE),
+    "table": re.compile(r'^\s*(?:tab(?:le)?\.?|表)\s*(\d+)', re.IGNORECASE),
+}
+
+
+def _joined(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v).strip() for v in value if str(v).strip())
+    return str(value or "").strip()
+
+
+def figures_in(content_list: Optional[List[Dict]]) -> Dict[str, Dict[str, Any]]:
+    """content_list 中带图片的块: {成员名: {kind, figure, page, caption}}
+
+    图号取自说明文字开头的 "Figure 3" / "Fig. 3" / "Table 2" / "图3"；页码从 1 开始
+    """
+    figures = {}
+    for block in content_list or []:
+        kind = block.get("type", "")
+        member = block.get("img_path")
+        if kind not in _CAPTION_FIELDS or not member:
+            continue
+        caption = ""
+        for field in _CAPTION_FIELDS[kind]:
+            caption = _joined(block.get(field))
+            if caption:
+                break
+        match = _NUMBER[kind].match(caption) if kind in _NUMBER else None
+        figures[member] = {
+            "kind": kind,
+            "figure": int(match.group(1)) if match else None,
+            "page": int(block.get("page_idx", 0)) + 1,
+            "caption": caption
+        }
+    return figures
+
+
+class AssetStore:
+    """内容寻址的图片资源库"""
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Args:
+            root: 资源库目录，默认读取 pdf_parser.asset_dir
+        """
+        if root is None:
+            from config import get_config
+            root = get_config().get('pdf_parser.asset_dir', './data/assets')
+
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.db"
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，块结束时提交并关闭 (每次操作独立连接，线程与进程间安全)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---- 登记 ----
+
+    def register(self, doc_id: str, archive, content_list: Optional[List[Dict]] = None) -> List[Dict[str, Any]]:
+        """登记压缩包中的全部图片 (同一文档重复登记时更新压缩包位置与图号)
+
+        Args:
+            doc_id: 文档 ID
+            archive: 已打开的 mineru_archive.MineruArchive
+            content_list: 解析结果的 content_list，用于确定图号、页码与说明
+
+        Returns:
+            各图片的登记信息 (doc_id, member, kind, figure, page, caption, archive, sha256)
+        """
+        from .mineru_archive import keep_archives
+
+        figures = figures_in(content_list)
+        kept = keep_archives()
+        now = time.time()
+        entries = []
+        with self._connect() as conn:
+            for member in archive.image_names():
+                info = figures.get(member, {"kind": "image", "figure": None, "page": None, "caption": ""})
+                # 压缩包读取后即删除: 现在就写入资源库
+                entry = {
+                    "doc_id": doc_id,
+                    "member": member,
+                    **info,
+                    "archive": str(archive.path) if kept else None,
+                    "sha256": None if kept else self._store(archive.read(member), member)
+                }
+                self._upsert(conn, entry, now)
+                entries.append(entry)
+        return entries
+
+    def adopt(self, doc_id: str, images: List[Dict[str, Any]]) -> int:
+        """按解析结果中的图片引用登记到 doc_id (解析缓存命中、不经过压缩包时使用)
+
+        优先复制原文档已登记的记录 (保留已写入资源库的内容哈希)，原记录不存在
+        (资源库已清空) 时使用结果中记录的压缩包与内容哈希。
+
+        Args:
+            doc_id: 文档 ID
+            images: 解析结果的 images 条目 (含 path_in_zip、doc_id、archive、sha256 等)
+
+        Returns:
+            登记的图片数 (既没有压缩包也没有内容哈希的图片无法登记)
+        """
+        now = time.time()
+        adopted = 0
+        with self._connect() as conn:
+            for image in images:
+                member = image.get("path_in_zip")
+                if not member:
+                    continue
+                row = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM images WHERE doc_id = ? AND member = ?",
+                    (image.get("doc_id") or doc_id, member)
+                ).fetchone()
+                entry = dict(zip(_COLUMNS, row)) if row else {
+                    "member": member,
+                    "kind": image.get("kind") or "image",
+                    "figure": image.get("figure"),
+                    "page": image.get("page"),
+                    "caption": image.get("caption") or "",
+                    "archive": image.get("archive"),
+                    "sha256": image.get("sha256")
+                }
+                if not entry["archive"] and not entry["sha256"]:
+                    continue
+                entry["doc_id"] = doc_id
+                self._upsert(conn, entry, now)
+                adopted += 1
+        return adopted
+
+    @staticmethod
+    def _upsert(conn, entry: Dict[str, Any], now: float):
+        conn.execute(
+            "INSERT INTO images (doc_id, member, kind, figure, page, caption, archive, sha256, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(doc_id, member) DO UPDATE SET kind = excluded.kind, figure = excluded.figure, "
+            "page = excluded.page, caption = excluded.caption, archive = excluded.archive, "
+            "sha256 = COALESCE(excluded.sha256, images.sha256), updated = excluded.updated",
+            tuple(entry[column] for column in _COLUMNS) + (now,)
+        )
+
+    # ---- 查找与读取 ----
+
+    def find(
+        self,
+        doc_id: str,
+        figure: Optional[int] = None,
+        page: Optional[int] = None,
+        kind: Optional[str] = "image"
+    ) -> List[Dict[str, Any]]:
+        """按 (doc_id, 图号, 页码) 查找已登记的图片，按页码排序
+
+        Args:
+            doc_id: 文档 ID
+            figure: 图号 (表格为表号)
+            page: 页码 (从 1 开始)
+            kind: image / table / equation，None 表示不限
+        """
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM images WHERE doc_id = ?"
+        params: List[Any] = [doc_id]
+        for column, value in (("figure", figure), ("page", page), ("kind", kind)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                params.append(value)
+        sql += " ORDER BY page, member"
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def resolve(
+        self,
+        doc_id: str,
+        figure: Optional[int] = None,
+        page: Optional[int] = None,
+        kind: Optional[str] = "image",
+        member: Optional[str] = None
+    ) -> Path:
+        """图片文件路径；图片还未写入资源库时从本地压缩包读出并写入
+
+        Raises:
+            FileNotFoundError: 没有匹配的图片，或压缩包已删除
+        """
+        if member is not None:
+            matches = [entry for entry in self.find(doc_id, kind=None) if entry["member"] == member]
+        else:
+            matches = self.find(doc_id, figure, page, kind)
+        if not matches:
+            raise FileNotFoundError(f"未登记的图片: {doc_id} figure={figure} page={page} member={member}")
+        return self.materialize(matches[0])
+
+    def materialize(self, entry: Dict[str, Any]) -> Path:
+        """把一条登记的图片写入资源库 (已写入时直接返回路径)"""
+        if entry.get("sha256"):
+            path = self._object_path(entry["sha256"], entry["member"])
+            if path.exists():
+                return path
+
+        archive_path = entry.get("archive")
+        if not archive_path or not Path(archive_path).exists():
+            raise FileNotFoundError(f"图片所在的压缩包已删除: {entry['member']}")
+
+        from .mineru_archive import MineruArchive
+        with MineruArchive(archive_path) as archive:
+            data = archive.read(entry["member"])
+        sha256 = self._store(data, entry["member"])
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE images SET sha256 = ?, updated = ? WHERE doc_id = ? AND member = ?",
+                (sha256, time.time(), entry["doc_id"], entry["member"])
+            )
+        entry["sha256"] = sha256
+        return self._object_path(sha256, entry["member"])
+
+    def release_archive(self, archive_path) -> int:
+        """压缩包即将删除: 把尚未写入资源库的图片写入，并清除对该压缩包的引用
+
+        Returns:
+            本次写入资源库的图片数
+        """
+        archive_path = str(archive_path)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM images WHERE archive = ?", (archive_path,)
+            ).fetchall()
+        pending = [
+            entry for entry in (dict(zip(_COLUMNS, row)) for row in rows)
+            if not (entry["sha256"] and self._object_path(entry["sha256"], entry["member"]).exists())
+        ]
+
+        if pending and Path(archive_path).exists():
+            from .mineru_archive import MineruArchive
+            with MineruArchive(archive_path) as archive:
+                for entry in pending:
+                    entry["sha256"] = self._store(archive.read(entry["member"]), entry["member"])
+
+        now = time.time()
+        with self._connect() as conn:
+            for entry in pending:
+                conn.execute(
+                    "UPDATE images SET sha256 = ?, updated = ? WHERE doc_id = ? AND member = ?",
+                    (entry["sha256"], now, entry["doc_id"], entry["member"])
+                )
+            conn.execute("UPDATE images SET archive = NULL WHERE archive = ?", (archive_path,))
+        return len(pending)
+
+    def _object_path(self, sha256: str, member: str) -> Path:
+        return self.objects / sha256[:2] / f"{sha256}{Path(member).suffix.lower()}"
+
+    def _store(self, data: bytes, member: str) -> str:
+        """按内容哈希写入 (相同内容只写一次)，返回哈希"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._object_path(sha256, member)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            tmp.replace(path)
+        return sha256
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            registered, documents, stored = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT doc_id), COUNT(DISTINCT sha256) FROM images"
+            ).fetchone()
+        return {"registered": registered, "documents": documents, "objects": stored}
+
+
+_store: Optional[AssetStore] = None
+_store_lock = threading.Lock()
+
+
+def get_asset_store() -> AssetStore:
+    """进程内共用的图片资源库 (按配置创建)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssetStore()
+        return _store
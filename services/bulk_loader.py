@@ -0,0 +1,250 @@
+"""
+Chroma 集合批量写入
+
+长文档 (论文集、会议论文合辑) 的分块数可能超过 Chroma 单次 add 的上限，整批写入会在
+全部向量化完成后才失败。BulkLoader 按 client.get_max_batch_size() 切分批次，并把
+第 N 批的写入与第 N+1 批的向量化流水线并行；写入失败的批次连同已算好的向量落盘到
+spill 目录，可用 replay_spill() 重新写入，不必重新向量化。
+
+重放按版本指针写入逻辑集合当前生效的版本 (迁移进行中时同时写迁移目标)；落盘之后
+集合已切换到新模型时，用新模型重新向量化后写入。
+
+重放:
+    python -m services.bulk_loader --replay ./data/bulk_spill/xxx.pkl --store ./data/chromadb --collection documents
+"""
+import time
+import pickle
+import argparse
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 256
+
+
+class BulkLoader:
+    """分批、流水线式地向 Chroma 集合写入文本"""
+
+    def __init__(
+        self,
+        client,
+        collection,
+        embed: Callable[[str], Any],
+        batch_size: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        on_embed_error: Optional[Callable[[str, str, Optional[Dict], Exception], None]] = None
+    ):
+        """
+        Args:
+            client: chromadb 客户端 (本地或 RemoteChromaClient)，用于查询单批上限
+            collection: 目标集合
+            embed: 单条文本的向量化函数
+            batch_size: 每批条数，默认读取 vector_db.bulk.batch_size，且不超过客户端上限
+            spill_dir: 写入失败时保存向量的目录，默认读取 vector_db.bulk.spill_dir
+            on_embed_error: 单条向量化失败时的回调 (id, 文本, 元数据, 异常)，该条不写入；
+                未指定时向量化失败会中止整个写入
+        """
+        from config import get_config
+        config = get_config()
+
+        self.collection = collection
+        self.embed = embed
+        self.on_embed_error = on_embed_error
+
+        if batch_size is None:
+            batch_size = config.get('vector_db.bulk.batch_size', DEFAULT_BATCH_SIZE)
+        try:
+            batch_size = min(batch_size, client.get_max_batch_size())
+        except Exception:
+            pass
+        self.batch_size = max(1, batch_size)
+
+        self.spill_dir = Path(spill_dir or config.get('vector_db.bulk.spill_dir', './data/bulk_spill'))
+
+    def load(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: Optional[List[Dict]] = None,
+        method: str = "add"
+    ) -> Dict[str, Any]:
+        """向量化并写入
+
+        Args:
+            ids: 条目 ID
+            documents: 文本
+            metadatas: 元数据(可选)
+            method: 集合写入方法，"add" 或 "upsert"
+
+        Returns:
+            统计信息: rows, written, deferred (交给 on_embed_error 的条数), batches,
+            seconds, rows_per_sec, spilled (落盘文件列表)
+        """
+        start = time.perf_counter()
+        report = {"rows": len(ids), "written": 0, "deferred": 0, "batches": 0, "spilled": []}
+
+        # 只有一个写线程: 最多一批在写、一批在向量化，内存占用有界
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending: Optional[Future] = None
+
+            for begin in range(0, len(ids), self.batch_size):
+                end = begin + self.batch_size
+                batch = {
+                    "ids": [],
+                    "documents": [],
+                    "metadatas": [] if metadatas is not None else None,
+                    "embeddings": []
+                }
+
+                try:
+                    for i in range(begin, min(end, len(ids))):
+                        meta = metadatas[i] if metadatas is not None else None
+                        try:
+                            embedding = self.embed(documents[i])
+                        except Exception as e:
+                            if self.on_embed_error is None:
+                                raise
+                            self.on_embed_error(ids[i], documents[i], meta, e)
+                            report["deferred"] += 1
+                            continue
+
+                        batch["ids"].append(ids[i])
+                        batch["documents"].append(documents[i])
+                        batch["embeddings"].append(embedding.tolist() if hasattr(embedding, "tolist") else embedding)
+                        if metadatas is not None:
+                            batch["metadatas"].append(meta)
+                except Exception:
+                    # 向量化中途失败: 等在写的批次结束，已算好的部分落盘后再抛出
+                    self._collect(pending, report)
+                    if batch["embeddings"]:
+                        done = len(batch["embeddings"])
+                        partial = {k: v[:done] if v is not None else None for k, v in batch.items()}
+                        report["spilled"].append(self._spill(method, partial))
+                    raise
+
+                self._collect(pending, report)
+                pending = writer.submit(self._write, method, batch) if batch["ids"] else None
+                print(f"  已向量化 {min(end, len(ids))}/{len(ids)} 条")
+
+            self._collect(pending, report)
+
+        report["seconds"] = time.perf_counter() - start
+        report["rows_per_sec"] = report["written"] / report["seconds"] if report["seconds"] > 0 else 0.0
+
+        print(f"📥 批量写入 {report['written']}/{report['rows']} 条，{report['batches']} 批，"
+              f"{report['rows_per_sec']:.1f} 条/秒")
+        if report["deferred"]:
+            print(f"⏳ {report['deferred']} 条向量化失败，已转入重试")
+        for path in report["spilled"]:
+            print(f"⚠️ 写入失败的向量已保存到 {path}，可用 BulkLoader.replay_spill() 重新写入")
+        return report
+
+    def load_stream(self, rows: Iterable[Tuple[str, str, Optional[Dict]]], method: str = "add") -> Dict[str, Any]:
+        """流式向量化并写入: 分批、向量化 (多线程)、写入三个阶段用有界队列串联
+
+        rows 可以是边分块边产出的生成器，第一批凑齐即开始向量化，不必等全部分块完成。
+
+        Args:
+            rows: (id, 文本, 元数据) 的可迭代对象
+            method: 集合写入方法，"add" 或 "upsert"
+
+        Returns:
+            统计信息: 同 load()，另有 stages (各阶段吞吐，见 ingest_pipeline.format_stats)
+        """
+        from .ingest_pipeline import embed_and_write, format_stats
+
+        spilled = []
+
+        def write(batch: Dict) -> int:
+            result = self._write(method, batch)
+            if "spilled" in result:
+                spilled.append(result["spilled"])
+            return result["written"]
+
+        report = embed_and_write(rows, self.embed, write, self.batch_size, on_embed_error=self.on_embed_error)
+        report["spilled"] = spilled
+
+        print(f"📥 流水线写入 {report['written']}/{report['rows']} 条，{report['batches']} 批，"
+              f"{report['rows_per_sec']:.1f} 条/秒")
+        print(format_stats(report["stages"]))
+        if report["deferred"]:
+            print(f"⏳ {report['deferred']} 条向量化失败，已转入重试")
+        for path in spilled:
+            print(f"⚠️ 写入失败的向量已保存到 {path}，可用 BulkLoader.replay_spill() 重新写入")
+        return report
+
+    def _write(self, method: str, batch: Dict) -> Dict:
+        """写入一批；失败时把整批 (含向量) 落盘"""
+        try:
+            getattr(self.collection, method)(**{k: v for k, v in batch.items() if v is not None})
+            return {"written": len(batch["ids"])}
+        except Exception as e:
+            print(f"❌ 批量写入失败 ({len(batch['ids'])} 条): {e}")
+            return {"written": 0, "spilled": self._spill(method, batch)}
+
+    def _collect(self, pending: Optional[Future], report: Dict):
+        if pending is None:
+            return
+        result = pending.result()
+        report["written"] += result["written"]
+        report["batches"] += 1
+        if "spilled" in result:
+            report["spilled"].append(result["spilled"])
+
+    def _spill(self, method: str, batch: Dict) -> str:
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spill_dir / f"{time.time_ns()}-{getattr(self.collection, 'name', 'collection')}.pkl"
+        spilled = {"method": method, **batch}
+        # 记录向量所属的版本，重放时版本已切换则需要重新向量化
+        if hasattr(self.collection, "pointer"):
+            spilled["version"] = self.collection.pointer.read()["version"]
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, 'wb') as f:
+            pickle.dump(spilled, f)
+        tmp.replace(path)
+        return str(path)
+
+    @staticmethod
+    def replay_spill(collection, path: str) -> int:
+        """把落盘的批次重新写入集合，成功后删除文件
+
+        Args:
+            collection: 目标集合；传入 VersionedCollection 时写入当前版本 (迁移中同时写迁移目标)
+
+        Returns:
+            写入条数
+        """
+        with open(path, 'rb') as f:
+            batch = pickle.load(f)
+        method = batch.pop("method")
+        version = batch.pop("version", None)
+
+        if version is not None and hasattr(collection, "pointer"):
+            state = collection.pointer.read()
+            if state["version"] != version:
+                if not state.get("model") or not batch.get("documents"):
+                    raise RuntimeError(f"{path} 的向量属于版本 {version}，集合已切换到版本 {state['version']}，无法重新向量化")
+                print(f"🔄 {path}: 集合已切换到版本 {state['version']}，用 {state['model']} 重新向量化")
+                embed = collection.embed_function(None)
+                batch["embeddings"] = [
+                    e.tolist() if hasattr(e, "tolist") else list(e)
+                    for e in map(embed, batch["documents"])
+                ]
+        getattr(collection, method)(**{k: v for k, v in batch.items() if v is not None})
+        Path(path).unlink()
+        return len(batch["ids"])
+
+
+if __name__ == "__main__":
+    from .index_server import get_chroma_client
+    from .index_migration import VersionedCollection
+
+    parser = argparse.ArgumentParser(description="重新写入批量写入失败时落盘的向量")
+    parser.add_argument("--replay", nargs="+", required=True, help="spill 文件路径")
+    parser.add_argument("--store", default="./data/chromadb", help="存储目录")
+    parser.add_argument("--collection", default="documents", help="逻辑集合名 (写入当前生效的版本)")
+    args = parser.parse_args()
+
+    target = VersionedCollection(get_chroma_client(args.store), args.store, args.collection)
+    for spill in args.replay:
+        print(f"✅ {spill}: 重新写入 {BulkLoader.replay_spill(target, spill)} 条")
@@ -0,0 +1,261 @@
+"""
+向量化失败重试队列 (SQLite)
+
+向量化失败的文本块不再以零向量/随机向量写入索引，而是记录到持久化队列中，不进入
+可检索集合。后台 RetryWorker 按指数退避重新向量化，成功后再写入对应的存储；
+超过最大重试次数的条目标记为死信，保留在队列中供人工排查。
+
+多个进程可以同时处理同一存储的队列: due() 在一条 UPDATE 语句中领取到期条目并把
+next_attempt 推迟一个租期，其他进程在租期内看不到这些条目，同一条目不会被重复写回；
+领取后进程退出时，条目在租期结束后重新到期。
+
+队列深度 (待重试/死信条数) 通过 depth() 查看，各存储的统计信息中也会带上。
+"""
+import json
+import time
+import random
+import sqlite3
+import contextlib
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS failed_chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    store TEXT NOT NULL,
+    text TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_failed_chunks_due ON failed_chunks (store, dead, next_attempt);
+"""
+
+
+class EmbeddingRetryQueue:
+    """失败文本块的持久化重试队列 (多个存储、多个进程共用一个数据库文件)"""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        lease: Optional[float] = None
+    ):
+        """
+        Args:
+            db_path: SQLite 文件路径，默认读取 vector_db.retry.db_path
+            max_attempts: 最大重试次数，超过后转为死信
+            base_delay: 首次重试的等待时间(秒)，之后按 2 的指数增长
+            max_delay: 单次等待时间上限(秒)
+            lease: 领取条目后的租期(秒)，期间其他进程不会再领取
+        """
+        from config import get_config
+        config = get_config()
+
+        self.db_path = Path(db_path or config.get('vector_db.retry.db_path', './data/embedding_retry.db'))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts or config.get('vector_db.retry.max_attempts', 8)
+        self.base_delay = base_delay or config.get('vector_db.retry.base_delay', 5.0)
+        self.max_delay = max_delay or config.get('vector_db.retry.max_delay', 600.0)
+        self.lease = lease or config.get('vector_db.retry.lease', 300.0)
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，块结束时提交并关闭 (每次操作独立连接，线程与进程间安全)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put(self, store: str, text: str, payload: Optional[Dict] = None, error: str = "") -> int:
+        """登记一个向量化失败的文本块
+
+        Args:
+            store: 所属存储的标识 (如索引目录)，重试成功后由该存储的工作线程写回
+            text: 文本
+            payload: 写回时需要的其他数据 (元数据、ID 等)
+            error: 失败原因
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO failed_chunks (store, text, payload, next_attempt, last_error, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (store, text, json.dumps(payload or {}, ensure_ascii=False), now + self.base_delay, error, now)
+            )
+            return cursor.lastrowid
+
+    def due(self, store: str, limit: int = 32) -> List[Dict[str, Any]]:
+        """领取到期待重试的条目 (原子操作: 领取的条目在租期内不会再被其他进程领取)
+
+        领取后需调用 succeed() 或 fail()；都未调用时条目在租期结束后重新到期。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "UPDATE failed_chunks SET next_attempt = ? WHERE id IN ("
+                "SELECT id FROM failed_chunks WHERE store = ? AND dead = 0 AND next_attempt <= ? "
+                "ORDER BY next_attempt LIMIT ?) "
+                "RETURNING id, text, payload, attempts",
+                (now + self.lease, store, now, limit)
+            ).fetchall()
+        return [
+            {"id": row[0], "text": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+            for row in sorted(rows)
+        ]
+
+    def succeed(self, item_id: int):
+        """重试成功，移出队列"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM failed_chunks WHERE id = ?", (item_id,))
+
+    def fail(self, item_id: int, error: str):
+        """重试失败，按指数退避 (带抖动) 安排下一次重试或转为死信"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT attempts FROM failed_chunks WHERE id = ?", (item_id,)).fetchone()
+            if row is None:
+                return
+            attempts = row[0] + 1
+            delay = min(self.max_delay, self.base_delay * 2 ** attempts) * random.uniform(0.5, 1.0)
+            conn.execute(
+                "UPDATE failed_chunks SET attempts = ?, next_attempt = ?, last_error = ?, dead = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, int(attempts >= self.max_attempts), item_id)
+            )
+
+    def depth(self, store: Optional[str] = None) -> Dict[str, int]:
+        """队列深度: {"pending": 待重试条数, "dead": 死信条数}"""
+        query = "SELECT dead, COUNT(*) FROM failed_chunks"
+        args = ()
+        if store is not None:
+            query += " WHERE store = ?"
+            args = (store,)
+        with self._connect() as conn:
+            counts = dict(conn.execute(query + " GROUP BY dead", args).fetchall())
+        return {"pending": counts.get(0, 0), "dead": counts.get(1, 0)}
+
+    def requeue_dead(self, store: Optional[str] = None) -> int:
+        """把死信重新放回待重试状态 (如修复了 API 配置之后)"""
+        query = "UPDATE failed_chunks SET dead = 0, attempts = 0, next_attempt = ? WHERE dead = 1"
+        args = [time.time()]
+        if store is not None:
+            query += " AND store = ?"
+            args.append(store)
+        with self._connect() as conn:
+            return conn.execute(query, args).rowcount
+
+
+def has_pending(store: str) -> bool:
+    """store 在重试队列中是否有待重试条目 (队列文件不存在时不创建)"""
+    from config import get_config
+    if not Path(get_config().get('vector_db.retry.db_path', './data/embedding_retry.db')).exists():
+        return False
+    return EmbeddingRetryQueue().depth(store)["pending"] > 0
+
+
+class RetryWorker:
+    """后台重试线程：到期条目重新向量化，成功后调用 insert 写回存储
+
+    队列中有待重试条目时才需要启动；空闲时按 interval 轮询。
+    insert 只写入内存的存储 (如 FAISS 索引在 save() 前) 需提供 flush: 写回的条目在
+    flush 成功后才移出队列，进程在持久化之前退出时条目不会丢失。
+    """
+
+    def __init__(
+        self,
+        queue: EmbeddingRetryQueue,
+        store: str,
+        embed: Callable[[str], Any],
+        insert: Callable[[Dict[str, Any], Any], None],
+        interval: Optional[float] = None,
+        flush: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            queue: 重试队列
+            store: 负责的存储标识
+            embed: 向量化函数，失败时抛出异常
+            insert: 写回函数，接收 (队列条目, 向量)
+            interval: 轮询间隔(秒)，默认读取 vector_db.retry.interval
+            flush: 把写回的条目持久化的函数；为 None 表示 insert 已持久写入
+        """
+        from config import get_config
+
+        self.queue = queue
+        self.store = store
+        self.embed = embed
+        self.insert = insert
+        self.interval = interval or get_config().get('vector_db.retry.interval', 5.0)
+        self.flush = flush
+
+        # 已写回、等待 flush 后才移出队列的条目 ID
+        self._unflushed: List[int] = []
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="embedding-retry")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> int:
+        """处理一轮到期条目，返回成功写回 (并已持久化) 的条数"""
+        for item in self.queue.due(self.store):
+            try:
+                embedding = self.embed(item["text"])
+                self.insert(item, embedding)
+            except Exception as e:
+                self.queue.fail(item["id"], str(e))
+                continue
+            self._unflushed.append(item["id"])
+
+        if not self._unflushed:
+            return 0
+        if self.flush is not None:
+            try:
+                self.flush()
+            except Exception as e:
+                # 条目仍在租期内，下一轮再 flush 后移出队列
+                print(f"⚠️ 重试写回的 {len(self._unflushed)} 个文本块持久化失败，下一轮重试: {e}")
+                return 0
+
+        recovered = len(self._unflushed)
+        for item_id in self._unflushed:
+            self.queue.succeed(item_id)
+        self._unflushed = []
+
+        if recovered:
+            depth = self.queue.depth(self.store)
+            print(f"♻️ 重试成功 {recovered} 个文本块，剩余待重试 {depth['pending']}，死信 {depth['dead']}")
+        return recovered
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️ 重试线程出错: {e}")
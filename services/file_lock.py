@@ -0,0 +1,216 @@
+"""
+跨进程文件锁 (带租约)
+
+gradio 应用、CLI、mineru_batch 等多个进程共用 ./data 时，用锁文件协调对同一存储的写入。
+
+锁文件以 O_EXCL 方式创建，内容记录持有者 (主机、进程号、令牌)；持有者的心跳线程
+定期刷新锁文件的修改时间以续租。持有者崩溃 (同主机上进程已不存在) 或超过租约时间
+没有续租 (进程卡死、机器休眠) 时，等待者可以接管锁。被接管的原持有者在心跳时发现
+令牌不再匹配，held 变为 False，写入提交前调用 check() 即可发现并中止。
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from pathlib import Path
+from typing import Optional
+
+_HOST = socket.gethostname()
+
+
+class LockTimeout(TimeoutError):
+    """等待锁超时"""
+
+
+class LeaseLost(RuntimeError):
+    """租约已被其他进程接管"""
+
+
+def writer_id() -> str:
+    """当前进程的写入者标识 (主机-进程号-随机后缀)，用于命名各写入者自己的段目录"""
+    return f"{_HOST}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class FileLock:
+    """带租约的跨进程互斥锁
+
+    同一进程内可重入 (同一线程重复获取只增加计数)；不同线程之间互斥。
+
+    用法:
+        with FileLock("./data/vector_index/.lock"):
+            ...
+    """
+
+    def __init__(self, path: str, lease: float = 30.0, poll_interval: float = 0.1):
+        """
+        Args:
+            path: 锁文件路径
+            lease: 租约时长(秒)，持有者超过该时间未续租时锁可被接管
+            poll_interval: 等待锁时的轮询间隔(秒)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._token: Optional[str] = None
+        self._lost = False
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def held(self) -> bool:
+        """本进程当前是否持有锁 (且租约未被接管)"""
+        return self._token is not None and not self._lost
+
+    def check(self):
+        """提交写入前确认仍持有锁，租约被接管时抛出 LeaseLost"""
+        if not self.held:
+            raise LeaseLost(f"锁已失效: {self.path}")
+
+    def acquire(self, timeout: Optional[float] = None, blocking: bool = True) -> bool:
+        """获取锁
+
+        Args:
+            timeout: 最长等待时间(秒)，None 表示一直等待
+            blocking: 为 False 时只尝试一次
+
+        Returns:
+            是否获取成功 (blocking 且超时时抛出 LockTimeout)
+        """
+        if not blocking:
+            acquired = self._thread_lock.acquire(blocking=False)
+        else:
+            acquired = self._thread_lock.acquire(timeout=-1 if timeout is None else timeout)
+        if not acquired:
+            if not blocking:
+                return False
+            raise LockTimeout(f"等待锁超时 ({timeout}s): {self.path} 被本进程其他线程持有")
+
+        if self._depth:
+            self._depth += 1
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_create():
+            self._break_if_stale()
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                self._thread_lock.release()
+                if not blocking:
+                    return False
+                raise LockTimeout(f"等待锁超时 ({timeout}s): {self.path} 持有者 {self._read_owner()}")
+            time.sleep(self.poll_interval)
+
+        self._depth = 1
+        self._lost = False
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._renew, daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def release(self):
+        """释放锁"""
+        if self._depth == 0:
+            raise RuntimeError(f"未持有锁: {self.path}")
+
+        self._depth -= 1
+        if self._depth == 0:
+            self._stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+            # 只删除自己的锁文件，已被接管时保持原样
+            if self._read_owner().get("token") == self._token:
+                self.path.unlink(missing_ok=True)
+            self._token = None
+
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def _try_create(self) -> bool:
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"host": _HOST, "pid": os.getpid(), "token": token, "acquired": time.time()}, f)
+        self._token = token
+        return True
+
+    def _read_owner(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _is_stale(self, owner: dict) -> bool:
+        try:
+            age = time.time() - self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if age > self.lease:
+            return True
+        # 同一主机上持有进程已退出，不必等租约过期
+        return owner.get("host") == _HOST and "pid" in owner and not _pid_alive(owner["pid"])
+
+    def _break_if_stale(self):
+        owner = self._read_owner()
+        if not self._is_stale(owner):
+            return
+
+        # 先改名再检查，避免删掉别人刚刚创建的新锁
+        broken = self.path.with_name(f"{self.path.name}.broken-{uuid.uuid4().hex[:8]}")
+        try:
+            os.rename(self.path, broken)
+        except FileNotFoundError:
+            return
+
+        try:
+            with open(broken, 'r') as f:
+                moved = json.load(f)
+        except ValueError:
+            moved = {}
+
+        if moved.get("token") != owner.get("token"):
+            # 改名前锁已被其他进程重新获取，尽量放回原处
+            try:
+                os.link(broken, self.path)
+            except OSError:
+                pass
+        else:
+            print(f"⚠️ 接管过期的锁 {self.path} (原持有者 {owner.get('host')}:{owner.get('pid')})")
+        broken.unlink(missing_ok=True)
+
+    def _renew(self):
+        """心跳: 确认锁仍属于自己并刷新修改时间"""
+        while not self._stop.wait(self.lease / 3):
+            if self._read_owner().get("token") != self._token:
+                self._lost = True
+                print(f"⚠️ 锁租约已被接管: {self.path}")
+                return
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self._lost = True
+                return
@@ -0,0 +1,224 @@
+"""
+HNSW 参数离线自动调优
+
+从已有集合导出向量，随机抽取其中一部分作为查询，在内存中的临时集合上遍历
+M / construction_ef / search_ef 组合，测量 recall@k (以精确检索为基准) 与单条查询的
+p50/p99 延迟，选出满足目标召回率且 p99 最低的组合，按逻辑集合名写入
+vector_db.hnsw.tuned_file。之后新建的同名集合 (hnsw_metadata(collection=...)) 使用这组
+M / construction_ef / search_ef，已有集合的 search_ef 在打开时更新；距离度量不受影响。
+
+用法:
+    python -m services.hnsw_tuner --store ./data/chromadb --collection papers --target-recall 0.95
+"""
+import json
+import time
+import uuid
+import argparse
+import itertools
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_M = (8, 16, 32, 48)
+DEFAULT_CONSTRUCTION_EF = (64, 128, 256)
+DEFAULT_SEARCH_EF = (16, 32, 64, 128, 256)
+
+
+def export_vectors(collection, max_vectors: Optional[int] = None, page_size: int = 1000) -> np.ndarray:
+    """分页导出集合中的向量"""
+    total = collection.count()
+    if max_vectors:
+        total = min(total, max_vectors)
+
+    chunks = []
+    for offset in range(0, total, page_size):
+        data = collection.get(offset=offset, limit=min(page_size, total - offset), include=["embeddings"])
+        chunks.append(np.asarray(data["embeddings"], dtype='float32'))
+    return np.vstack(chunks) if chunks else np.zeros((0, 0), dtype='float32')
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """精确检索的 top-k 下标 (与 ChromaDB 的距离定义一致)"""
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        distances = -queries @ vectors.T
+    elif space == "ip":
+        distances = -queries @ vectors.T
+    else:
+        distances = (
+            (queries ** 2).sum(axis=1, keepdims=True)
+            - 2 * queries @ vectors.T
+            + (vectors ** 2).sum(axis=1)
+        )
+
+    k = min(k, vectors.shape[0])
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def sweep(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    space: str = "l2",
+    m_values=DEFAULT_M,
+    construction_ef_values=DEFAULT_CONSTRUCTION_EF,
+    search_ef_values=DEFAULT_SEARCH_EF,
+    batch_size: int = 1000
+) -> List[Dict]:
+    """遍历参数组合，返回每组的召回率与延迟
+
+    已加载的 HNSW 索引不会响应 collection.modify 修改的 search_ef，
+    因此每个组合都新建一个临时集合。
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    truth = exact_neighbors(vectors, queries, k, space)
+    ids = [str(i) for i in range(len(vectors))]
+
+    results = []
+    for m, construction_ef, search_ef in itertools.product(m_values, construction_ef_values, search_ef_values):
+        name = f"tune-{uuid.uuid4().hex[:12]}"
+        collection = client.create_collection(name=name, metadata={
+            "hnsw:space": space,
+            "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": search_ef,
+        })
+
+        build_start = time.perf_counter()
+        for begin in range(0, len(ids), batch_size):
+            collection.add(ids=ids[begin:begin + batch_size], embeddings=vectors[begin:begin + batch_size])
+        build_seconds = time.perf_counter() - build_start
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            found = collection.query(query_embeddings=[query], n_results=k, include=[])["ids"][0]
+            latencies.append(time.perf_counter() - start)
+            hits += len(set(int(i) for i in found) & set(expected.tolist()))
+
+        client.delete_collection(name)
+
+        row = {
+            "M": m,
+            "construction_ef": construction_ef,
+            "search_ef": search_ef,
+            "recall": hits / truth.size,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000),
+            "build_seconds": build_seconds,
+        }
+        results.append(row)
+        print(f"  M={m:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+              f"recall@{k}={row['recall']:.3f}  p50={row['p50_ms']:.2f}ms  p99={row['p99_ms']:.2f}ms  "
+              f"build={build_seconds:.1f}s")
+
+    return results
+
+
+def choose_best(results: List[Dict], target_recall: float) -> Dict:
+    """满足目标召回率的组合中取 p99 最低者 (相同时取内存更小的 M)；都不满足时取召回率最高者"""
+    qualified = [r for r in results if r["recall"] >= target_recall]
+    if qualified:
+        return min(qualified, key=lambda r: (r["p99_ms"], r["M"], r["construction_ef"]))
+    print(f"⚠️ 没有组合达到目标召回率 {target_recall}，选择召回率最高的组合")
+    return max(results, key=lambda r: (r["recall"], -r["p99_ms"]))
+
+
+def tune(
+    collection,
+    target_recall: float = 0.95,
+    k: int = 10,
+    num_queries: int = 200,
+    max_vectors: Optional[int] = 20000,
+    space: Optional[str] = None,
+    output: Optional[str] = None,
+    seed: int = 0,
+    **grid
+) -> Dict:
+    """对集合执行调优，结果写入调优文件中该集合名下 (其他集合的结果保留)
+
+    Args:
+        collection: 要调优的集合；传入 VersionedCollection 时按逻辑集合名记录
+
+    Returns:
+        {"best": {...}, "space", "target_recall", "k", "results": [...]}
+    """
+    from config import get_config
+
+    space = space or (collection.metadata or {}).get("hnsw:space") or "l2"
+
+    print(f"📤 导出向量: {collection.name}")
+    vectors = export_vectors(collection, max_vectors)
+    if len(vectors) == 0:
+        raise ValueError(f"集合 {collection.name} 为空，无法调优")
+
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    print(f"🔧 {len(vectors)} 个向量，{len(queries)} 条查询，space={space}，目标 recall@{k} >= {target_recall}")
+
+    results = sweep(vectors, queries, k=k, space=space, **grid)
+    best = choose_best(results, target_recall)
+
+    report = {
+        "best": {key: best[key] for key in ("M", "construction_ef", "search_ef")},
+        "space": space,
+        "target_recall": target_recall,
+        "k": k,
+        "vectors": len(vectors),
+        "queries": len(queries),
+        "results": results,
+    }
+
+    output = Path(output or get_config().get('vector_db.hnsw.tuned_file', './data/hnsw_tuned.json'))
+    tuned = {}
+    if output.exists():
+        with open(output, 'r', encoding='utf-8') as f:
+            tuned = json.load(f)
+    tuned.setdefault("collections", {})[collection.name] = report
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(tuned, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 最佳参数: M={best['M']} construction_ef={best['construction_ef']} search_ef={best['search_ef']} "
+          f"(recall@{k}={best['recall']:.3f}, p99={best['p99_ms']:.2f}ms)，已写入 {output} [{collection.name}]")
+    return report
+
+
+if __name__ == "__main__":
+    from .index_server import get_chroma_client
+    from .index_migration import VersionedCollection
+
+    parser = argparse.ArgumentParser(description="ChromaDB HNSW 参数自动调优")
+    parser.add_argument("--store", default="./data/chromadb", help="存储目录")
+    parser.add_argument("--collection", default="papers", help="逻辑集合名 (调优当前生效的版本)")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--queries", type=int, default=200, help="抽样查询数")
+    parser.add_argument("--max-vectors", type=int, default=20000, help="最多导出的向量数")
+    parser.add_argument("--space", default=None, help="距离度量，默认沿用集合的设置")
+    parser.add_argument("--m", type=int, nargs="+", default=list(DEFAULT_M))
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=list(DEFAULT_CONSTRUCTION_EF))
+    parser.add_argument("--search-ef", type=int, nargs="+", default=list(DEFAULT_SEARCH_EF))
+    parser.add_argument("--output", default=None, help="结果文件，默认 vector_db.hnsw.tuned_file")
+    args = parser.parse_args()
+
+    source = VersionedCollection(get_chroma_client(args.store), args.store, args.collection)
+    tune(
+        source,
+        target_recall=args.target_recall,
+        k=args.k,
+        num_queries=args.queries,
+        max_vectors=args.max_vectors,
+        space=args.space,
+        output=args.output,
+        m_values=args.m,
+        construction_ef_values=args.construction_ef,
+        search_ef_values=args.search_ef
+    )
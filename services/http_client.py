@@ -0,0 +1,148 @@
+"""
+共用的 HTTP 客户端 (MinerU API、文件上传与结果下载)
+
+每个主机共用一个 requests.Session，连接池保持长连接 (keep-alive)：轮询数百个任务
+只复用少量连接，不再每个请求都重新建立 TCP + TLS。每个主机的连接数有上限，超出的
+请求等待空闲连接。
+
+幂等请求 (GET / HEAD / PUT / DELETE / OPTIONS) 在连接错误、超时或 429 / 5xx 时按
+带抖动的指数退避重试 (文件上传重试前回到文件开头)；POST 不重试，避免重复提交任务。
+
+配置 (http):
+    pool_maxsize: 每个主机的最大连接数
+    connect_timeout / read_timeout: API 请求的默认超时(秒)
+    transfer_timeout: 上传/下载文件的读取超时(秒)
+    retries / backoff / max_backoff: 重试次数、退避基数与上限(秒)
+
+    res = http_client.get(url, headers=headers)
+    res = http_client.put(upload_url, data=f, timeout=http_client.transfer_timeout())
+"""
+import time
+import random
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_sessions: Dict[Tuple[str, str], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _setting(key: str, default):
+    from config import get_config
+    return get_config().get(f'http.{key}', default)
+
+
+def api_timeout() -> Tuple[float, float]:
+    """API 请求的 (连接, 读取) 超时"""
+    return _setting('connect_timeout', 10), _setting('read_timeout', 30)
+
+
+def transfer_timeout() -> Tuple[float, float]:
+    """上传/下载文件的 (连接, 读取) 超时"""
+    return _setting('connect_timeout', 10), _setting('transfer_timeout', 300)
+
+
+def get_session(url: str) -> requests.Session:
+    """url 所在主机共用的连接池会话"""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            # pool_block: 连接数达到上限时等待空闲连接，而不是临时新建后丢弃
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_setting('pool_maxsize', 10), pool_block=True)
+            session.mount(f"{parts.scheme}://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def _backoff(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """第 attempt 次重试前的等待: 指数增长，随机取上半段 (多个客户端不会同时重试)；
+    服务器给出 Retry-After 秒数时以其为准"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), _setting('max_backoff', 30))
+    delay = min(_setting('max_backoff', 30), _setting('backoff', 1) * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def request(
+    method: str,
+    url: str,
+    timeout=None,
+    retries: Optional[int] = None,
+    **kwargs
+) -> requests.Response:
+    """通过主机连接池发送请求
+
+    Args:
+        method: HTTP 方法
+        url: 请求地址
+        timeout: 超时(秒或 (连接, 读取) 元组)，默认 api_timeout()
+        retries: 幂等请求的最大重试次数，默认读取 http.retries；非幂等请求不重试
+        **kwargs: 传给 requests.Session.request 的其余参数
+
+    Returns:
+        响应 (重试用尽后返回最后一次的响应，或抛出最后一次的连接异常)
+    """
+    method = method.upper()
+    if timeout is None:
+        timeout = api_timeout()
+    if retries is None:
+        retries = _setting('retries', 3)
+
+    # 文件上传: 记录起始位置，重试前回到该位置；无法回退的数据流不重试
+    body = kwargs.get("data")
+    start = None
+    if hasattr(body, "read"):
+        try:
+            start = body.tell()
+        except (AttributeError, OSError):
+            retries = 0
+    if method not in IDEMPOTENT_METHODS:
+        retries = 0
+
+    session = get_session(url)
+    attempt = 0
+    while True:
+        if start is not None and attempt:
+            body.seek(start)
+        try:
+            res = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            delay = _backoff(attempt)
+            print(f"⚠️ {method} {urlsplit(url).netloc} 失败，{delay:.1f}s 后重试 ({attempt + 1}/{retries}): {e}")
+        else:
+            if res.status_code not in RETRY_STATUSES or attempt >= retries:
+                return res
+            delay = _backoff(attempt, res)
+            res.close()
+            print(f"⚠️ {method} {urlsplit(url).netloc} 返回 {res.status_code}，{delay:.1f}s 后重试 ({attempt + 1}/{retries})")
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    return request("HEAD", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
@@ -0,0 +1,234 @@
+"""
+本地 JSON-over-HTTP 通信工具 (索引节点 / 索引服务共用)
+"""
+import json
+import time
+import socket
+import selectors
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def to_jsonable(obj):
+    """把 numpy 数组等对象递归转换为可 JSON 序列化的结构"""
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(v) for v in obj]
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return obj
+
+
+def make_json_handler(routes: Dict[Tuple[str, str], Callable[[Dict], Dict]]):
+    """构造 JSON 请求处理器
+
+    Args:
+        routes: {(方法, 路径): 处理函数}，处理函数接收请求体字典并返回响应字典
+    """
+
+    class JsonHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keep-alive，客户端连接池可以复用连接 (空闲连接由 PooledHTTPServer 等待，
+        # 不占用工作线程)；timeout 只限制读取单个请求的时间
+        protocol_version = "HTTP/1.1"
+        timeout = 10
+
+        def _dispatch(self, method: str):
+            handler = routes.get((method, self.path.split("?")[0]))
+            if handler is None:
+                self._reply(404, {"error": f"未知接口: {method} {self.path}"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length)) if length else {}
+                self._reply(200, to_jsonable(handler(payload)))
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def _reply(self, status: int, body: Dict):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return JsonHandler
+
+
+class PooledHTTPServer(HTTPServer):
+    """用固定大小线程池处理请求的 HTTP 服务器
+
+    工作线程只在处理请求时占用: 一个请求处理完后，keep-alive 连接交给选择器线程等待，
+    连接上有下一个请求时再提交给线程池。空闲连接不占用工作线程，客户端连接数可以
+    远多于 max_workers；空闲超过 idle_timeout 的连接关闭。
+
+    配置 (vector_db.rpc):
+        workers: 工作线程数
+        idle_timeout: keep-alive 连接的空闲超时(秒)
+    """
+
+    def __init__(
+        self,
+        server_address,
+        handler_class,
+        max_workers: Optional[int] = None,
+        idle_timeout: Optional[float] = None
+    ):
+        from config import get_config
+        config = get_config()
+        self.max_workers = max_workers or config.get('vector_db.rpc.workers', 16)
+        self.idle_timeout = idle_timeout or config.get('vector_db.rpc.idle_timeout', 30.0)
+
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="http-worker")
+        self._selector = selectors.DefaultSelector()
+        # 空闲连接 -> 处理器与过期时间
+        self._idle: Dict[socket.socket, Tuple[BaseHTTPRequestHandler, float]] = {}
+        self._idle_lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._closed = threading.Event()
+
+        super().__init__(server_address, handler_class)
+        self._watcher = threading.Thread(target=self._watch_idle, daemon=True, name="http-idle")
+        self._watcher.start()
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._open, request, client_address)
+
+    def _open(self, request, client_address):
+        """新连接: 创建处理器并处理第一个请求"""
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request, handler.client_address, handler.server = request, client_address, self
+        try:
+            handler.setup()
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self._serve(handler)
+
+    def _serve(self, handler: BaseHTTPRequestHandler):
+        """处理连接上已到达的请求，之后关闭连接或交给选择器等待下一个请求"""
+        try:
+            while True:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.close_connection or not self._has_buffered(handler):
+                    break
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+
+        if handler.close_connection or self._closed.is_set():
+            self._close(handler)
+        else:
+            self._park(handler)
+
+    @staticmethod
+    def _has_buffered(handler: BaseHTTPRequestHandler) -> bool:
+        """读缓冲中是否已有下一个请求 (客户端流水线发送时)，有则直接处理"""
+        sock = handler.connection
+        sock.setblocking(False)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(handler.timeout)
+
+    def _park(self, handler: BaseHTTPRequestHandler):
+        sock = handler.connection
+        with self._idle_lock:
+            self._idle[sock] = (handler, time.monotonic() + self.idle_timeout)
+            self._selector.register(sock, selectors.EVENT_READ)
+        self._wake_w.send(b"\0")
+
+    def _close(self, handler: BaseHTTPRequestHandler):
+        try:
+            handler.finish()
+        except Exception:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _watch_idle(self):
+        """选择器线程: 空闲连接可读时提交给线程池，超时的空闲连接关闭"""
+        while not self._closed.is_set():
+            try:
+                events = self._selector.select(timeout=1.0)
+            except (OSError, ValueError):
+                return
+
+            ready, expired = [], []
+            with self._idle_lock:
+                for key, _ in events:
+                    if key.fileobj is self._wake_r:
+                        try:
+                            while self._wake_r.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        continue
+                    self._selector.unregister(key.fileobj)
+                    ready.append(self._idle.pop(key.fileobj)[0])
+
+                now = time.monotonic()
+                for sock, (handler, deadline) in list(self._idle.items()):
+                    if deadline <= now:
+                        self._selector.unregister(sock)
+                        del self._idle[sock]
+                        expired.append(handler)
+
+            for handler in ready:
+                self._pool.submit(self._serve, handler)
+            for handler in expired:
+                self._close(handler)
+
+    def server_close(self):
+        self._closed.set()
+        super().server_close()
+        self._wake_w.send(b"\0")
+        self._watcher.join(timeout=2.0)
+        with self._idle_lock:
+            idle = [handler for handler, _ in self._idle.values()]
+            self._idle.clear()
+        for handler in idle:
+            self._close(handler)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self._pool.shutdown(wait=False)
+
+
+class JsonRpcClient:
+    """带连接池的 JSON-over-HTTP 客户端"""
+
+    def __init__(self, url: str, timeout: float = 30, pool_size: int = 16):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def call(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        res = self.session.request(method, f"{self.url}{path}", json=payload, timeout=self.timeout)
+        body = res.json()
+        if res.status_code != 200:
+            raise RuntimeError(f"{self.url}{path} 请求失败: {body.get('error', res.status_code)}")
+        return body
@@ -0,0 +1,280 @@
+"""
+文档增量重建索引
+
+论文的新版本 (如 arXiv v2) 重新入库时，先按 doc_id、DOI、标题依次找到已入库的同一文档，
+再把新分块与已存的块按内容哈希比对:
+    - 内容未变的块沿用已有向量，只在位置等元数据变化时更新元数据
+    - 新增或改动的块才向量化写入
+    - 新版本中已不存在的块删除
+先写入新块、最后删除旧块，更新期间检索始终能查到该文档。
+
+存储只需提供 Chroma 集合的 get / update / delete 接口，外加一个负责向量化并写入的函数。
+分块也可以边产出边同步 (sync_document_stream)，需要向量化的块直接流入写入流水线。
+"""
+import re
+import uuid
+import hashlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 按优先级依次尝试的文档标识字段 (同时写入每个块的元数据)
+IDENTITY_FIELDS = ("doc_id", "doi", "title_key")
+
+_DOI = re.compile(r'\b(10\.\d{4,9}/[^\s"<>]+)', re.IGNORECASE)
+# 标题少于这么多词时不参与匹配 ("Abstract"、"Introduction" 之类的标题会误合并文档)
+_MIN_TITLE_WORDS = 3
+# 会议/期刊的页眉 (如 "Published as a conference paper at ICLR 2024") 常被解析为首个标题，
+# 不同论文相同，不能作为标题参与匹配
+_GENERIC_TITLE = re.compile(
+    r'^(?:published as|under review|accepted (?:at|to|as|by)|to appear|appeared in|submitted to|'
+    r'in submission|proceedings of|preprint|arxiv|workshop|journal of|transactions on|'
+    r'(?:\w+ )?conference on|copyright|licensed under)\b'
+)
+# 在前几个一级标题中找论文标题 (跳过页眉)
+_TITLE_CANDIDATES = 3
+# DOI 一般在首页
+_DOI_SCAN_CHARS = 20000
+
+
+def chunk_hash(text: str) -> str:
+    """块内容哈希 (忽略空白差异)"""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def normalize_title(title: Optional[str]) -> str:
+    """标题归一化: 小写、去标点与多余空白；词数过少或为会议页眉时返回空字符串"""
+    words = re.sub(r'[\W_]+', ' ', (title or "").lower()).split()
+    key = " ".join(words)
+    return key if len(words) >= _MIN_TITLE_WORDS and not _GENERIC_TITLE.match(key) else ""
+
+
+def find_doi(text: Optional[str]) -> str:
+    match = _DOI.search((text or "")[:_DOI_SCAN_CHARS])
+    return match.group(1).rstrip('.,;)]}').lower() if match else ""
+
+
+def document_identity(
+    doc_id: Optional[str] = None,
+    title: Optional[str] = None,
+    doi: Optional[str] = None,
+    markdown: Optional[str] = None,
+    content_list: Optional[List[Dict]] = None
+) -> Dict[str, str]:
+    """文档标识: 未给出标题/DOI 时从解析结果中提取
+
+    Args:
+        doc_id: 文档 ID
+        title: 标题，默认取 content_list 或 markdown 前几个一级标题中第一个不是页眉的
+        doi: DOI，默认在正文开头查找
+        markdown: 解析得到的 markdown
+        content_list: MinerU 的 content_list
+
+    Returns:
+        {"doc_id", "doi", "title_key"} 中有值的部分
+    """
+    if title is None:
+        if content_list:
+            headings = [
+                block.get("text") for block in content_list
+                if block.get("type", "text") == "text" and block.get("text_level") == 1
+            ]
+        else:
+            headings = re.findall(r'^#\s+(.+)$', markdown or "", re.MULTILINE)
+        title = next((h for h in headings[:_TITLE_CANDIDATES] if normalize_title(h)), None)
+
+    if not doi:
+        if markdown:
+            doi = find_doi(markdown)
+        else:
+            doi = find_doi(" ".join(str(block.get("text", "")) for block in (content_list or [])[:50]))
+
+    identity = {"doc_id": doc_id or "", "doi": (doi or "").lower(), "title_key": normalize_title(title)}
+    return {key: value for key, value in identity.items() if value}
+
+
+def find_document(collection, identity: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+    """查找已入库的同一文档: 依次按 doc_id、DOI、标题查找
+
+    doc_id 未命中时 (如重新上传的修订版) 仍按 DOI、标题查找。会议页眉之类不同论文共用的
+    标题在 document_identity() 中已被排除，不会把另一篇论文当作同一文档。
+
+    Returns:
+        (已入库文档的 doc_id, 匹配字段)；未找到时为 (None, None)
+    """
+    for field in IDENTITY_FIELDS:
+        value = identity.get(field)
+        if not value:
+            continue
+        found = collection.get(where={field: value}, limit=1, include=["metadatas"])
+        if found["ids"]:
+            return (found["metadatas"][0] or {}).get("doc_id") or value, field
+    return None, None
+
+
+def _new_doc_id(identity: Dict[str, str]) -> str:
+    """新文档的 ID: 由 DOI 或标题生成；都没有时随机生成 (之后的新版本无法匹配到它)"""
+    key = identity.get("doi") or identity.get("title_key")
+    if not key:
+        return f"doc_{uuid.uuid4().hex[:12]}"
+    return f"doc_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]}"
+
+
+class DocumentSync:
+    """逐块的增量同步: 判断每个新块沿用已有向量还是需要向量化，最后统一更新元数据、删除旧块
+
+    新块可以边分块边加入 (流水线入库)，sync_document 是一次给出全部分块的用法。
+    """
+
+    def __init__(self, collection, identity: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            collection: 提供 get / update / delete 的集合 (chromadb.Collection 接口)
+            identity: document_identity() 的结果
+        """
+        self.collection = collection
+        self.identity = dict(identity or {})
+
+        doc_id, self.matched_by = find_document(collection, self.identity)
+        self.doc_id = doc_id or self.identity.get("doc_id") or _new_doc_id(self.identity)
+        self.identity["doc_id"] = self.doc_id
+
+        # 已存的块按内容哈希分组 (早期写入的块没有 chunk_hash 元数据，现算)
+        self.stored = collection.get(where={"doc_id": self.doc_id}, include=["documents", "metadatas"])
+        self._ids = set(self.stored["ids"])
+        self._by_hash: Dict[str, List[Tuple[str, Dict]]] = defaultdict(list)
+        for chunk_id, document, meta in zip(self.stored["ids"], self.stored["documents"], self.stored["metadatas"]):
+            meta = meta or {}
+            self._by_hash[meta.get("chunk_hash") or chunk_hash(document or "")].append((chunk_id, meta))
+
+        self.chunks = 0
+        self.new = 0
+        self.kept = set()
+        self.changed_ids: List[str] = []
+        self.changed_metas: List[Dict] = []
+
+    def add(self, text: str, meta: Optional[Dict] = None) -> Optional[Tuple[str, str, Dict]]:
+        """加入一个新块
+
+        Returns:
+            需要向量化写入时为 (id, 文本, 元数据)；沿用已有向量时为 None
+        """
+        self.chunks += 1
+        digest = chunk_hash(text)
+        meta = {**(meta or {}), **self.identity, "chunk_hash": digest}
+
+        if self._by_hash.get(digest):
+            chunk_id, old = self._by_hash[digest].pop(0)
+            self.kept.add(chunk_id)
+            if old != meta:
+                self.changed_ids.append(chunk_id)
+                self.changed_metas.append(meta)
+            return None
+
+        # 内容寻址的 ID；同一内容重复出现时加序号，且不与保留的旧块冲突
+        n = 0
+        while f"{self.doc_id}_{digest[:16]}_{n}" in self._ids:
+            n += 1
+        chunk_id = f"{self.doc_id}_{digest[:16]}_{n}"
+        self._ids.add(chunk_id)
+        self.new += 1
+        return chunk_id, text, meta
+
+    def finish(self, written: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """新块写入后调用: 更新只变了元数据的块，删除新版本中已不存在的块
+
+        Args:
+            written: 写入函数返回的统计 (written、deferred)
+
+        Returns:
+            统计信息 (见 sync_document)
+        """
+        written = written or {}
+        report = {
+            "doc_id": self.doc_id,
+            "matched_by": self.matched_by,
+            "chunks": self.chunks,
+            "reused": len(self.kept),
+            "embedded": written.get("written", self.new) if self.new else 0,
+            "deferred": written.get("deferred", 0),
+            "updated": len(self.changed_ids),
+            "deleted": 0
+        }
+
+        if self.changed_ids:
+            self.collection.update(ids=self.changed_ids, metadatas=self.changed_metas)
+
+        removed = [chunk_id for chunk_id in self.stored["ids"] if chunk_id not in self.kept]
+        if removed:
+            self.collection.delete(ids=removed)
+            report["deleted"] = len(removed)
+
+        return report
+
+
+def sync_document(
+    collection,
+    write: Callable[[List[str], List[str], List[Dict]], Dict[str, Any]],
+    texts: List[str],
+    metadatas: Optional[List[Dict]] = None,
+    identity: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """把文档的新分块增量同步到集合
+
+    Args:
+        collection: 提供 get / update / delete 的集合 (chromadb.Collection 接口)
+        write: 向量化并写入新块的函数 (ids, 文本, 元数据)，返回含 written、deferred 的统计
+        texts: 文档的全部新分块
+        metadatas: 各块的元数据
+        identity: document_identity() 的结果
+
+    Returns:
+        统计信息: doc_id, matched_by (匹配到已入库文档的字段，新文档为 None), chunks,
+        reused (沿用已有向量), embedded (新向量化), deferred (向量化失败转入重试),
+        updated (只更新元数据), deleted
+    """
+    metadatas = metadatas if metadatas is not None else [{} for _ in texts]
+    sync = DocumentSync(collection, identity)
+
+    rows = [row for row in (sync.add(text, meta) for text, meta in zip(texts, metadatas)) if row]
+    written = None
+    if rows:
+        ids, new_texts, new_metas = (list(column) for column in zip(*rows))
+        written = write(ids, new_texts, new_metas)
+    return sync.finish(written)
+
+
+def sync_document_stream(
+    collection,
+    load: Callable[[Iterable[Tuple[str, str, Dict]]], Dict[str, Any]],
+    chunks: Iterable[Tuple[str, Dict]],
+    identity: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """流式增量同步: 分块边产出边判断，需要向量化的块直接流入 load
+
+    Args:
+        collection: 提供 get / update / delete 的集合
+        load: 消费 (id, 文本, 元数据) 流并写入的函数 (如 BulkLoader.load_stream)，
+            返回含 written、deferred 的统计
+        chunks: (文本, 元数据) 的可迭代对象，可以是分块生成器
+        identity: document_identity() 的结果
+
+    Returns:
+        统计信息 (同 sync_document)，另有 stages (load 返回的各阶段吞吐)
+    """
+    sync = DocumentSync(collection, identity)
+    rows = (row for row in (sync.add(text, meta) for text, meta in chunks) if row)
+    written = load(rows) or {}
+    report = sync.finish(written)
+    if "stages" in written:
+        report["stages"] = written["stages"]
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """一行摘要，如 "复用 120 块，新向量化 8 块，删除 5 块" """
+    parts = [f"复用 {report['reused']} 块", f"新向量化 {report['embedded']} 块"]
+    if report.get("deferred"):
+        parts.append(f"{report['deferred']} 块待重试")
+    if report.get("deleted"):
+        parts.append(f"删除 {report['deleted']} 块")
+    return "，".join(parts)
@@ -0,0 +1,429 @@
+"""
+向量库在线迁移 (更换 Embedding 模型)
+
+每个逻辑集合 (如 "documents"、"papers") 对应若干带版本号的物理集合，当前生效的版本
+记录在存储目录下的指针文件 <name>.version.json 中：
+    版本 0      物理集合名即逻辑名 (兼容已有数据)
+    版本 N>0    物理集合名为 <name>-v<N>，并记录该版本使用的模型与维度
+
+迁移流程 (服务全程在线):
+    1. start     新建下一版本的物理集合，指针中登记迁移目标
+    2. backfill  后台分页读取旧集合，用新模型限速重新向量化后写入新集合；
+                 期间 VersionedCollection 的写入同时写旧集合与新集合 (双写)
+    3. cutover   补齐差异后原子替换指针文件，所有进程的读写在下一次操作时切到新版本
+
+命令行:
+    python -m services.index_migration --store ./data/chromadb --collection papers \\
+        --model text-embedding-v3 --dimension 1536 --rate 20
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .embedding_service import EmbeddingService
+from .index_server import hnsw_metadata, apply_search_ef
+
+
+def _physical_name(name: str, version: int) -> str:
+    return name if version == 0 else f"{name}-v{version}"
+
+
+class VersionPointer:
+    """逻辑集合的版本指针文件 (原子替换写入，按文件标识缓存读取)"""
+
+    def __init__(self, store: str, name: str):
+        self.path = Path(store) / f"{name}.version.json"
+        self.name = name
+        self._cached = None
+        self._cached_key = None
+
+    def read(self) -> Dict:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return {"active": self.name, "version": 0, "model": None, "dimension": None, "migration": None}
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._cached_key:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._cached = json.load(f)
+            self._cached_key = key
+        return self._cached
+
+    def write(self, state: Dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+_embedders: Dict[tuple, EmbeddingService] = {}
+
+
+def _embedder(model: str, dimension: Optional[int]) -> Callable[[str], Any]:
+    key = (model, dimension)
+    if key not in _embedders:
+        _embedders[key] = EmbeddingService(model_name=model, dimension=dimension or 1536)
+    return _embedders[key].embed
+
+
+def _as_list(embedding) -> List[float]:
+    return embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+
+
+class VersionedCollection:
+    """按版本指针路由的集合，接口与 chromadb.Collection 的常用子集一致
+
+    读取走当前版本；迁移进行中时写入同时写当前版本与迁移目标 (目标的向量用新模型重新计算)。
+    每次操作前检查指针文件，其他进程完成切换后无需重启即可生效。
+    """
+
+    def __init__(self, client, store: str, name: str, metadata: Optional[Dict] = None):
+        self.client = client
+        self.name = name
+        self.pointer = VersionPointer(store, name)
+        self._metadata = metadata
+        self._collections: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _open(self, physical: str):
+        with self._lock:
+            if physical not in self._collections:
+                collection = self.client.get_or_create_collection(name=physical, metadata=self._metadata)
+                apply_search_ef(collection, self.name)
+                self._collections[physical] = collection
+            return self._collections[physical]
+
+    @property
+    def active(self):
+        return self._open(self.pointer.read()["active"])
+
+    @property
+    def metadata(self) -> Optional[Dict]:
+        return self.active.metadata
+
+    def embed_function(self, default: Callable[[str], Any]) -> Callable[[str], Any]:
+        """当前版本使用的向量化函数；版本未登记模型时使用调用方的默认函数"""
+        state = self.pointer.read()
+        if state.get("model"):
+            return _embedder(state["model"], state.get("dimension"))
+        return default
+
+    # ---- 读取: 当前版本 ----
+
+    def count(self) -> int:
+        return self.active.count()
+
+    def get(self, *args, **kwargs) -> Dict:
+        return self.active.get(*args, **kwargs)
+
+    def query(self, *args, **kwargs) -> Dict:
+        return self.active.query(*args, **kwargs)
+
+    # ---- 写入: 当前版本 + 迁移目标 ----
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        state = self.pointer.read()
+        self._open(state["active"]).add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self._write_target(state, ids, documents, metadatas)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        state = self.pointer.read()
+        self._open(state["active"]).upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self._write_target(state, ids, documents, metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        state = self.pointer.read()
+        self._open(state["active"]).update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        migration = state.get("migration")
+        if migration:
+            target = self._open(migration["target"])
+            if documents is not None:
+                embed = _embedder(migration["model"], migration.get("dimension"))
+                target.update(ids=ids, embeddings=[_as_list(embed(d)) for d in documents],
+                              documents=documents, metadatas=metadatas)
+            elif metadatas is not None:
+                target.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        state = self.pointer.read()
+        self._open(state["active"]).delete(ids=ids, where=where)
+        if state.get("migration"):
+            self._open(state["migration"]["target"]).delete(ids=ids, where=where)
+
+    def _write_target(self, state: Dict, ids, documents, metadatas):
+        migration = state.get("migration")
+        if not migration or documents is None:
+            return
+        embed = _embedder(migration["model"], migration.get("dimension"))
+        self._open(migration["target"]).upsert(
+            ids=ids,
+            embeddings=[_as_list(embed(document)) for document in documents],
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def reset(self):
+        """清空当前版本 (进行中的迁移一并放弃)，保留当前版本的模型登记"""
+        state = dict(self.pointer.read())
+        names = [state["active"]] + ([state["migration"]["target"]] if state.get("migration") else [])
+        for physical in names:
+            try:
+                self.client.delete_collection(physical)
+            except Exception:
+                pass
+            self._collections.pop(physical, None)
+
+        if state.get("migration"):
+            state["migration"] = None
+            self.pointer.write(state)
+        self._open(state["active"])
+
+
+class IndexMigration:
+    """把逻辑集合迁移到新的 Embedding 模型"""
+
+    def __init__(
+        self,
+        client,
+        store: str,
+        name: str,
+        model: str,
+        dimension: int,
+        rate: Optional[float] = None,
+        page_size: Optional[int] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """
+        Args:
+            client: chromadb 客户端 (本地或 RemoteChromaClient)
+            store: 存储目录 (指针文件所在位置)
+            name: 逻辑集合名
+            model: 新的 Embedding 模型
+            dimension: 新模型的向量维度
+            rate: 回填限速 (条/秒)，默认读取 vector_db.migration.rate，0 表示不限速
+            page_size: 每次从旧集合读取的条数，默认读取 vector_db.migration.page_size
+            metadata: 覆盖新集合元数据中的项 (如 {"hnsw:space": "l2"})；默认与旧集合一致，
+                距离度量 (hnsw:space) 等索引参数沿用旧集合
+        """
+        from config import get_config
+        config = get_config()
+
+        self.client = client
+        self.name = name
+        self.model = model
+        self.dimension = dimension
+        self.rate = config.get('vector_db.migration.rate', 20) if rate is None else rate
+        self.page_size = page_size or config.get('vector_db.migration.page_size', 100)
+        self.metadata = metadata
+
+        self.pointer = VersionPointer(store, name)
+        self.embed = _embedder(model, dimension)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Dict:
+        """新建目标版本并开启双写；已有同模型的迁移时继续该迁移"""
+        state = dict(self.pointer.read())
+        migration = state.get("migration")
+        if migration:
+            if migration["model"] != self.model:
+                raise RuntimeError(f"集合 {self.name} 正在迁移到 {migration['model']}，请先完成或放弃 (abort)")
+            print(f"↪️ 继续迁移 {self.name} -> {migration['target']} (已回填 {migration['offset']} 条)")
+            return migration
+
+        version = state["version"] + 1
+        migration = {
+            "target": _physical_name(self.name, version),
+            "version": version,
+            "model": self.model,
+            "dimension": self.dimension,
+            "offset": 0,
+            "started": time.time(),
+        }
+        self.client.get_or_create_collection(name=migration["target"], metadata=self._target_metadata(state))
+
+        state["migration"] = migration
+        self.pointer.write(state)
+        print(f"🚚 开始迁移 {self.name}: {state['active']} -> {migration['target']} ({self.model}, {self.dimension} 维)")
+        return migration
+
+    def _target_metadata(self, state: Dict) -> Optional[Dict]:
+        """目标集合的元数据: 复制旧集合 (保留 hnsw:space，否则余弦集合会退回 l2)，
+        维度改为新模型的维度，再应用调用方显式给出的覆盖项"""
+        metadata = dict(self.client.get_or_create_collection(name=state["active"]).metadata or {})
+        if not metadata:
+            metadata = hnsw_metadata(collection=self.name)
+        if "dimension" in metadata:
+            metadata["dimension"] = self.dimension
+        metadata.update(self.metadata or {})
+        return metadata or None
+
+    def _source_target(self):
+        state = self.pointer.read()
+        if not state.get("migration"):
+            raise RuntimeError(f"集合 {self.name} 没有进行中的迁移")
+        source = self.client.get_or_create_collection(name=state["active"])
+        target = self.client.get_or_create_collection(name=state["migration"]["target"])
+        return state, source, target
+
+    def _copy(self, source, target, data: Dict):
+        """用新模型重新向量化一页数据并写入目标 (限速)"""
+        started = time.perf_counter()
+        embeddings = [_as_list(self.embed(document)) for document in data["documents"]]
+        target.upsert(ids=data["ids"], embeddings=embeddings, documents=data["documents"], metadatas=data["metadatas"])
+
+        # 读取之后被删除的条目不能在目标中复活
+        alive = set(source.get(ids=data["ids"], include=[])["ids"])
+        gone = [i for i in data["ids"] if i not in alive]
+        if gone:
+            target.delete(ids=gone)
+
+        if self.rate:
+            time.sleep(max(0.0, len(data["ids"]) / self.rate - (time.perf_counter() - started)))
+
+    def backfill(self) -> int:
+        """分页把旧集合的数据重新向量化写入目标版本，进度记录在指针文件中，可中断续跑
+
+        Returns:
+            本次回填的条数
+        """
+        state, source, target = self._source_target()
+        offset = state["migration"]["offset"]
+        copied = 0
+
+        while not self._stop.is_set():
+            data = source.get(offset=offset, limit=self.page_size, include=["documents", "metadatas"])
+            if not data["ids"]:
+                break
+
+            self._copy(source, target, data)
+            offset += len(data["ids"])
+            copied += len(data["ids"])
+
+            state = dict(self.pointer.read())
+            state["migration"] = {**state["migration"], "offset": offset}
+            self.pointer.write(state)
+            print(f"  已回填 {offset}/{source.count()} 条")
+
+        return copied
+
+    def _all_ids(self, collection) -> set:
+        ids, offset = set(), 0
+        while True:
+            page = collection.get(offset=offset, limit=1000, include=[])["ids"]
+            if not page:
+                return ids
+            ids.update(page)
+            offset += len(page)
+
+    def reconcile(self) -> Dict[str, int]:
+        """比对新旧集合的 ID，补写遗漏的条目、删除多余的条目 (分页期间的并发删除会造成偏移)"""
+        _, source, target = self._source_target()
+        source_ids, target_ids = self._all_ids(source), self._all_ids(target)
+
+        missing = sorted(source_ids - target_ids)
+        for begin in range(0, len(missing), self.page_size):
+            page = source.get(ids=missing[begin:begin + self.page_size], include=["documents", "metadatas"])
+            if page["ids"]:
+                self._copy(source, target, page)
+
+        extra = sorted(target_ids - source_ids)
+        if extra:
+            target.delete(ids=extra)
+        return {"missing": len(missing), "extra": len(extra)}
+
+    def cutover(self, drop_old: bool = False) -> Dict:
+        """补齐差异后原子切换到目标版本
+
+        Args:
+            drop_old: 是否删除旧版本集合 (默认保留，便于回滚)
+        """
+        diff = self.reconcile()
+        state = dict(self.pointer.read())
+        migration = state["migration"]
+        previous = state["active"]
+
+        self.pointer.write({
+            "active": migration["target"],
+            "version": migration["version"],
+            "model": migration["model"],
+            "dimension": migration["dimension"],
+            "migration": None,
+            "previous": previous,
+            "switched": time.time(),
+        })
+        print(f"✅ {self.name} 已切换到 {migration['target']} (补写 {diff['missing']} 条，清理 {diff['extra']} 条)")
+
+        if drop_old:
+            # 给仍在使用旧指针的请求留出完成时间
+            time.sleep(1.0)
+            self.client.delete_collection(previous)
+            print(f"🗑️ 已删除旧版本 {previous}")
+        return self.pointer.read()
+
+    def abort(self):
+        """放弃进行中的迁移，删除目标版本"""
+        state = dict(self.pointer.read())
+        migration = state.get("migration")
+        if not migration:
+            return
+        state["migration"] = None
+        self.pointer.write(state)
+        self.client.delete_collection(migration["target"])
+        print(f"↩️ 已放弃迁移 {self.name} -> {migration['target']}")
+
+    def run(self, drop_old: bool = False) -> Dict:
+        """完整执行: start -> backfill -> cutover"""
+        self.start()
+        self.backfill()
+        if self._stop.is_set():
+            print("⏸️ 迁移已暂停，下次运行时从断点继续")
+            return self.pointer.read()
+        return self.cutover(drop_old=drop_old)
+
+    def run_in_background(self, drop_old: bool = False) -> threading.Thread:
+        """在后台线程执行迁移，stop() 可暂停"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, kwargs={"drop_old": drop_old}, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    from .index_server import get_chroma_client
+
+    parser = argparse.ArgumentParser(description="向量库在线迁移 (更换 Embedding 模型)")
+    parser.add_argument("--store", default="./data/chromadb", help="存储目录")
+    parser.add_argument("--collection", default="papers", help="逻辑集合名")
+    parser.add_argument("--model", help="新的 Embedding 模型")
+    parser.add_argument("--dimension", type=int, help="新模型的向量维度")
+    parser.add_argument("--rate", type=float, default=None, help="回填限速 (条/秒)")
+    parser.add_argument("--space", choices=["cosine", "l2", "ip"], help="改用的距离度量 (默认沿用旧集合)")
+    parser.add_argument("--drop-old", action="store_true", help="切换后删除旧版本集合")
+    parser.add_argument("--abort", action="store_true", help="放弃进行中的迁移")
+    args = parser.parse_args()
+
+    chroma = get_chroma_client(args.store)
+    if args.abort:
+        state = VersionPointer(args.store, args.collection).read()
+        migration = state.get("migration") or {}
+        IndexMigration(chroma, args.store, args.collection, migration.get("model", ""), migration.get("dimension", 0)).abort()
+    else:
+        if not args.model or not args.dimension:
+            parser.error("迁移需要 --model 与 --dimension")
+        overrides = {"hnsw:space": args.space} if args.space else None
+        IndexMigration(
+            chroma, args.store, args.collection, args.model, args.dimension, rate=args.rate, metadata=overrides
+        ).run(drop_old=args.drop_old)
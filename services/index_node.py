@@ -0,0 +1,194 @@
+"""
+向量索引节点 (HTTP)
+
+每个节点是一个独立进程，持有一个本地 ChromaDB 集合，只存储已经向量化好的数据，
+由 VectorStoreCoordinator 负责向量化、路由与结果归并。
+
+协议 (JSON over HTTP):
+    GET  /stats   -> {"count": n}
+    POST /add     {ids, embeddings, documents, metadatas} -> {"added": n}
+    POST /search  {embedding, top_k, where?} -> {"results": [{id, text, score, metadata}]}
+    POST /delete  {ids?, where?} -> {"deleted": n}
+    POST /export  {offset, limit} -> {ids, embeddings, documents, metadatas}
+    POST /reset   -> {"count": 0}
+
+启动:
+    python -m services.index_node --port 8101 --data-dir ./data/nodes/8101
+"""
+import argparse
+from pathlib import Path
+from typing import List, Dict, Optional
+
+from .http_rpc import make_json_handler, PooledHTTPServer, JsonRpcClient
+from .index_server import apply_search_ef, chroma_where, hnsw_metadata
+
+
+class IndexNode:
+    """单个索引节点的存储实现"""
+
+    def __init__(self, data_dir: str, collection_name: str = "documents"):
+        import chromadb
+        from chromadb.config import Settings
+
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.collection_name = collection_name
+
+        self.client = chromadb.PersistentClient(
+            path=str(self.data_dir),
+            settings=Settings(anonymized_telemetry=False, allow_reset=True)
+        )
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name, metadata=hnsw_metadata(collection=collection_name)
+        )
+        apply_search_ef(self.collection)
+
+    def stats(self, _payload: Dict = None) -> Dict:
+        return {"count": self.collection.count()}
+
+    def add(self, payload: Dict) -> Dict:
+        ids = payload.get("ids") or []
+        if ids:
+            self.collection.add(
+                ids=ids,
+                embeddings=payload["embeddings"],
+                documents=payload["documents"],
+                metadatas=payload["metadatas"]
+            )
+        return {"added": len(ids)}
+
+    def search(self, payload: Dict) -> Dict:
+        count = self.collection.count()
+        if count == 0:
+            return {"results": []}
+
+        query = {
+            "query_embeddings": [payload["embedding"]],
+            "n_results": min(int(payload.get("top_k", 5)), count)
+        }
+        if payload.get("where"):
+            query["where"] = chroma_where(payload["where"])
+
+        results = self.collection.query(**query)
+
+        formatted = []
+        for i in range(len(results["ids"][0])):
+            formatted.append({
+                "id": results["ids"][0][i],
+                "text": results["documents"][0][i],
+                "score": float(results["distances"][0][i]),
+                "metadata": results["metadatas"][0][i] or {}
+            })
+        return {"results": formatted}
+
+    def get(self, payload: Dict) -> Dict:
+        query = {"include": payload.get("include") or ["documents", "metadatas"]}
+        if payload.get("where"):
+            query["where"] = chroma_where(payload["where"])
+        if payload.get("limit"):
+            query["limit"] = int(payload["limit"])
+        data = self.collection.get(**query)
+        return {key: data.get(key) or [] for key in ["ids"] + query["include"]}
+
+    def update(self, payload: Dict) -> Dict:
+        ids = payload.get("ids") or []
+        if ids:
+            self.collection.update(ids=ids, metadatas=payload["metadatas"])
+        return {"updated": len(ids)}
+
+    def delete(self, payload: Dict) -> Dict:
+        if payload.get("ids"):
+            ids = payload["ids"]
+        elif payload.get("where"):
+            ids = self.collection.get(where=chroma_where(payload["where"]), include=[])["ids"]
+        else:
+            ids = []
+
+        if ids:
+            self.collection.delete(ids=ids)
+        return {"deleted": len(ids)}
+
+    def export(self, payload: Dict) -> Dict:
+        data = self.collection.get(
+            offset=int(payload.get("offset", 0)),
+            limit=int(payload.get("limit", 500)),
+            include=["embeddings", "documents", "metadatas"]
+        )
+        return {
+            "ids": data["ids"],
+            "embeddings": data["embeddings"],
+            "documents": data["documents"],
+            "metadatas": data["metadatas"]
+        }
+
+    def reset(self, _payload: Dict = None) -> Dict:
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.client.create_collection(
+            name=self.collection_name, metadata=hnsw_metadata(collection=self.collection_name)
+        )
+        return {"count": 0}
+
+
+def node_routes(node: IndexNode) -> Dict:
+    """索引节点的接口路由表"""
+    return {
+        ("GET", "/stats"): node.stats,
+        ("POST", "/add"): node.add,
+        ("POST", "/search"): node.search,
+        ("POST", "/get"): node.get,
+        ("POST", "/update"): node.update,
+        ("POST", "/delete"): node.delete,
+        ("POST", "/export"): node.export,
+        ("POST", "/reset"): node.reset,
+    }
+
+
+def serve(host: str, port: int, data_dir: str):
+    """启动索引节点 (阻塞)"""
+    node = IndexNode(data_dir)
+    server = PooledHTTPServer((host, port), make_json_handler(node_routes(node)))
+    print(f"🗄️ 索引节点已启动: http://{host}:{port} ({node.collection.count()} 个向量)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class IndexNodeClient(JsonRpcClient):
+    """索引节点 HTTP 客户端"""
+
+    def count(self) -> int:
+        return self.call("GET", "/stats")["count"]
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]) -> int:
+        payload = {"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas}
+        return self.call("POST", "/add", payload)["added"]
+
+    def search(self, embedding: List[float], top_k: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        payload = {"embedding": embedding, "top_k": top_k, "where": where}
+        return self.call("POST", "/search", payload)["results"]
+
+    def get(self, where: Optional[Dict] = None, limit: Optional[int] = None, include: Optional[List[str]] = None) -> Dict:
+        return self.call("POST", "/get", {"where": where, "limit": limit, "include": include})
+
+    def update(self, ids: List[str], metadatas: List[Dict]) -> int:
+        return self.call("POST", "/update", {"ids": ids, "metadatas": metadatas})["updated"]
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None) -> int:
+        return self.call("POST", "/delete", {"ids": ids, "where": where})["deleted"]
+
+    def export(self, offset: int = 0, limit: int = 500) -> Dict:
+        return self.call("POST", "/export", {"offset": offset, "limit": limit})
+
+    def reset(self):
+        self.call("POST", "/reset")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SciResearcher 向量索引节点")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--data-dir", default=None, help="数据目录，默认 ./data/nodes/<port>")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.data_dir or f"./data/nodes/{args.port}")
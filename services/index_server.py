@@ -0,0 +1,496 @@
+"""
+独立向量索引服务
+
+一个长期运行的进程持有 ChromaDB 的 PersistentClient (以及内存中的 HNSW 索引)，
+多个应用进程 (gradio worker、CLI、批处理脚本) 通过本地 HTTP 共享同一份向量库，
+不再各自在导入时打开 PersistentClient，也避免多个进程并发写同一目录。
+
+服务端用固定大小线程池处理连接，并把同一集合上并发到达的查询合并成一次
+collection.query 调用 (微批处理)。
+
+启动:
+    python -m services.index_server --port 8200
+
+客户端:
+    设置环境变量 INDEX_SERVER_URL=http://127.0.0.1:8200 (或配置 vector_db.server_url)，
+    VectorStore 与 VectorDB 会通过 get_chroma_client() 自动连接索引服务。
+"""
+import os
+import json
+import time
+import argparse
+import threading
+import contextlib
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .http_rpc import make_json_handler, PooledHTTPServer, JsonRpcClient
+from .file_lock import FileLock
+
+# query 结果中按查询拆分的字段
+_PER_QUERY_FIELDS = ("ids", "documents", "metadatas", "distances", "embeddings", "uris", "data")
+
+
+class QueryBatcher:
+    """查询微批处理器
+
+    第一个到达的请求成为 leader，等待一个很短的时间窗口收集同键的后续请求，
+    然后一次性执行并把结果拆分给各请求。
+    """
+
+    def __init__(self, window: float = 0.005, max_batch: int = 64):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: Dict[Any, List] = {}
+        self.batches = 0
+        self.queries = 0
+
+    def submit(self, key, query_embeddings: List, run: Callable[[List], Dict]) -> Dict:
+        """提交查询并等待结果
+
+        Args:
+            key: 批处理键，只有键相同的查询才会合并
+            query_embeddings: 本请求的查询向量列表
+            run: 执行函数，接收合并后的查询向量列表，返回 chroma 查询结果
+        """
+        future = Future()
+
+        with self._lock:
+            batch = self._pending.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = self._pending[key] = []
+            batch.append((query_embeddings, future))
+            # 批次满了就从等待表中摘下，后续请求开启新批次
+            if len(batch) >= self.max_batch:
+                self._pending.pop(key, None)
+
+        if is_leader:
+            time.sleep(self.window)
+            with self._lock:
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            self._run_batch(batch, run)
+
+        return future.result()
+
+    def _run_batch(self, batch: List, run: Callable[[List], Dict]):
+        merged = [emb for embeddings, _ in batch for emb in embeddings]
+        try:
+            results = run(merged)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.queries += len(merged)
+
+        pos = 0
+        for embeddings, future in batch:
+            n = len(embeddings)
+            part = dict(results)
+            for field in _PER_QUERY_FIELDS:
+                if results.get(field) is not None:
+                    part[field] = results[field][pos:pos + n]
+            future.set_result(part)
+            pos += n
+
+
+class IndexServer:
+    """索引服务端：按存储目录管理 PersistentClient，对外暴露集合级操作"""
+
+    def __init__(self, batch_window: float = 0.005, max_batch: int = 64):
+        self._clients: Dict[str, Any] = {}
+        self._clients_lock = threading.Lock()
+        self.batcher = QueryBatcher(window=batch_window, max_batch=max_batch)
+
+    def _client(self, store: str):
+        """获取 (必要时打开) 某个存储目录的 PersistentClient"""
+        import chromadb
+        from chromadb.config import Settings
+
+        path = str(Path(store).resolve())
+        with self._clients_lock:
+            if path not in self._clients:
+                Path(path).mkdir(parents=True, exist_ok=True)
+                self._clients[path] = chromadb.PersistentClient(
+                    path=path,
+                    settings=Settings(anonymized_telemetry=False, allow_reset=True)
+                )
+                print(f"📂 已打开存储: {path}")
+            return self._clients[path]
+
+    def _collection(self, payload: Dict):
+        return self._client(payload["store"]).get_collection(payload["collection"])
+
+    @staticmethod
+    def _kwargs(payload: Dict, *names: str) -> Dict:
+        return {name: payload[name] for name in names if payload.get(name) is not None}
+
+    def open_collection(self, payload: Dict) -> Dict:
+        client = self._client(payload["store"])
+        if payload.get("create_only"):
+            collection = client.create_collection(name=payload["name"], metadata=payload.get("metadata"))
+        else:
+            collection = client.get_or_create_collection(name=payload["name"], metadata=payload.get("metadata"))
+        return {"name": collection.name, "metadata": collection.metadata}
+
+    def delete_collection(self, payload: Dict) -> Dict:
+        self._client(payload["store"]).delete_collection(payload["name"])
+        return {"deleted": payload["name"]}
+
+    def max_batch_size(self, payload: Dict) -> Dict:
+        return {"max_batch_size": self._client(payload["store"]).get_max_batch_size()}
+
+    def count(self, payload: Dict) -> Dict:
+        return {"count": self._collection(payload).count()}
+
+    def add(self, payload: Dict) -> Dict:
+        self._collection(payload).add(**self._kwargs(payload, "ids", "embeddings", "documents", "metadatas"))
+        return {"added": len(payload["ids"])}
+
+    def upsert(self, payload: Dict) -> Dict:
+        self._collection(payload).upsert(**self._kwargs(payload, "ids", "embeddings", "documents", "metadatas"))
+        return {"upserted": len(payload["ids"])}
+
+    def update(self, payload: Dict) -> Dict:
+        self._collection(payload).update(**self._kwargs(payload, "ids", "embeddings", "documents", "metadatas"))
+        return {"updated": len(payload["ids"])}
+
+    def get(self, payload: Dict) -> Dict:
+        return self._collection(payload).get(**self._kwargs(payload, "ids", "where", "limit", "offset", "include"))
+
+    def delete(self, payload: Dict) -> Dict:
+        self._collection(payload).delete(**self._kwargs(payload, "ids", "where"))
+        return {}
+
+    def query(self, payload: Dict) -> Dict:
+        collection = self._collection(payload)
+        options = self._kwargs(payload, "n_results", "where", "include")
+
+        key = (
+            payload["store"],
+            payload["collection"],
+            json.dumps(options, sort_keys=True, ensure_ascii=False)
+        )
+        return self.batcher.submit(
+            key,
+            payload["query_embeddings"],
+            lambda embeddings: collection.query(query_embeddings=embeddings, **options)
+        )
+
+    def stats(self, _payload: Dict = None) -> Dict:
+        return {
+            "stores": list(self._clients),
+            "query_batches": self.batcher.batches,
+            "queries": self.batcher.queries
+        }
+
+    def routes(self) -> Dict:
+        return {
+            ("GET", "/stats"): self.stats,
+            ("POST", "/collection"): self.open_collection,
+            ("POST", "/collection/delete"): self.delete_collection,
+            ("POST", "/max_batch_size"): self.max_batch_size,
+            ("POST", "/count"): self.count,
+            ("POST", "/add"): self.add,
+            ("POST", "/upsert"): self.upsert,
+            ("POST", "/update"): self.update,
+            ("POST", "/get"): self.get,
+            ("POST", "/delete"): self.delete,
+            ("POST", "/query"): self.query,
+        }
+
+
+def serve(host: str, port: int, max_workers: Optional[int] = None, batch_window: float = 0.005):
+    """启动索引服务 (阻塞)
+
+    Args:
+        max_workers: 处理请求的工作线程数，默认读取 vector_db.rpc.workers
+    """
+    index_server = IndexServer(batch_window=batch_window)
+    server = PooledHTTPServer((host, port), make_json_handler(index_server.routes()), max_workers=max_workers)
+    print(f"🗄️ 索引服务已启动: http://{host}:{port} (工作线程 {server.max_workers}, "
+          f"批处理窗口 {batch_window * 1000:.1f}ms)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# ============================================================================
+# 客户端 (与 chromadb 的 Client / Collection 接口保持一致)
+# ============================================================================
+
+class RemoteCollection:
+    """远程集合，接口与 chromadb.Collection 的常用子集一致"""
+
+    def __init__(self, rpc: JsonRpcClient, store: str, name: str, metadata: Optional[Dict] = None):
+        self._rpc = rpc
+        self._store = store
+        self.name = name
+        self.metadata = metadata
+
+    def _call(self, path: str, **kwargs) -> Dict:
+        payload = {"store": self._store, "collection": self.name}
+        payload.update({k: v for k, v in kwargs.items() if v is not None})
+        return self._rpc.call("POST", path, payload)
+
+    def count(self) -> int:
+        return self._call("/count")["count"]
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._call("/add", ids=ids, embeddings=_as_lists(embeddings), documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._call("/upsert", ids=ids, embeddings=_as_lists(embeddings), documents=documents, metadatas=metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._call("/update", ids=ids, embeddings=_as_lists(embeddings), documents=documents, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> Dict:
+        return self._call("/get", ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=None) -> Dict:
+        return self._call(
+            "/query",
+            query_embeddings=_as_lists(query_embeddings),
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+
+    def delete(self, ids=None, where=None):
+        self._call("/delete", ids=ids, where=where)
+
+
+class RemoteChromaClient:
+    """远程客户端，接口与 chromadb.PersistentClient 的常用子集一致"""
+
+    def __init__(self, url: str, store: str, timeout: float = 60, pool_size: int = 8):
+        self.url = url
+        self.store = store
+        self._rpc = JsonRpcClient(url, timeout=timeout, pool_size=pool_size)
+
+    def _open(self, name: str, metadata: Optional[Dict], create_only: bool) -> RemoteCollection:
+        info = self._rpc.call("POST", "/collection", {
+            "store": self.store,
+            "name": name,
+            "metadata": metadata,
+            "create_only": create_only
+        })
+        return RemoteCollection(self._rpc, self.store, info["name"], info.get("metadata"))
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> RemoteCollection:
+        return self._open(name, metadata, create_only=False)
+
+    def create_collection(self, name: str, metadata: Optional[Dict] = None) -> RemoteCollection:
+        return self._open(name, metadata, create_only=True)
+
+    def delete_collection(self, name: str):
+        self._rpc.call("POST", "/collection/delete", {"store": self.store, "name": name})
+
+    def get_max_batch_size(self) -> int:
+        return self._rpc.call("POST", "/max_batch_size", {"store": self.store})["max_batch_size"]
+
+    def write_lock(self):
+        """写入由索引服务进程串行执行，客户端无需加锁"""
+        return contextlib.nullcontext()
+
+
+# ============================================================================
+# 本地模式: 多进程共用同一存储目录时用文件锁串行化写入
+# ============================================================================
+
+class LockedCollection:
+    """写操作持有存储目录文件锁的集合代理，其余操作直接转发"""
+
+    _WRITE_METHODS = ("add", "upsert", "update", "delete", "modify")
+
+    def __init__(self, collection, lock: FileLock):
+        self._collection = collection
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self._WRITE_METHODS:
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+class LockedChromaClient:
+    """本地 PersistentClient 代理
+
+    ChromaDB 的本地存储不支持多进程并发写入；gradio 应用、CLI 与批处理脚本
+    同时写 ./data/chromadb 时，用带租约的文件锁串行化写操作与集合的创建删除。
+    需要"读取再写入"的调用方 (如按数量生成 ID) 可用 write_lock() 包住整个过程。
+    """
+
+    def __init__(self, client, path: str, lease: float = 30.0):
+        self._client = client
+        self._lock = FileLock(Path(path) / ".write.lock", lease=lease)
+
+    def write_lock(self) -> FileLock:
+        return self._lock
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> LockedCollection:
+        with self._lock:
+            return LockedCollection(self._client.get_or_create_collection(name=name, metadata=metadata), self._lock)
+
+    def create_collection(self, name: str, metadata: Optional[Dict] = None) -> LockedCollection:
+        with self._lock:
+            return LockedCollection(self._client.create_collection(name=name, metadata=metadata), self._lock)
+
+    def get_collection(self, name: str) -> LockedCollection:
+        return LockedCollection(self._client.get_collection(name=name), self._lock)
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._client.delete_collection(name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _as_lists(embeddings):
+    if embeddings is None:
+        return None
+    return [emb.tolist() if hasattr(emb, "tolist") else list(emb) for emb in embeddings]
+
+
+def get_index_server_url() -> Optional[str]:
+    """索引服务地址：环境变量 INDEX_SERVER_URL 优先，其次 vector_db.server_url"""
+    url = os.getenv("INDEX_SERVER_URL")
+    if not url:
+        from config import get_config
+        url = get_config().get('vector_db.server_url')
+    return url or None
+
+
+# 自动调优可以覆盖的参数 (距离度量由集合本身决定，不参与调优)
+TUNABLE_HNSW_PARAMS = ("M", "construction_ef", "search_ef")
+
+
+def tuned_hnsw_params(collection: Optional[str]) -> Dict:
+    """自动调优 (python -m services.hnsw_tuner) 为该逻辑集合选出的参数，未调优时为空"""
+    from config import get_config
+    tuned_file = get_config().get('vector_db.hnsw.tuned_file')
+    if not collection or not tuned_file or not Path(tuned_file).exists():
+        return {}
+    with open(tuned_file, 'r', encoding='utf-8') as f:
+        best = ((json.load(f).get("collections") or {}).get(collection) or {}).get("best") or {}
+    return {k: v for k, v in best.items() if k in TUNABLE_HNSW_PARAMS and v is not None}
+
+
+def hnsw_metadata(default_space: Optional[str] = None, collection: Optional[str] = None, **extra) -> Dict:
+    """新建集合时使用的 HNSW 参数 (集合元数据形式)
+
+    读取 vector_db.hnsw 的配置；该集合有自动调优结果时覆盖其中的 M / construction_ef /
+    search_ef (space 始终来自配置或 default_space)。M 与 construction_ef 只在新建集合时
+    生效，已有集合需重建；search_ef 由 apply_search_ef() 更新到已有集合。
+
+    Args:
+        default_space: 未配置 space 时使用的距离度量 (None 表示使用 ChromaDB 默认的 l2)
+        collection: 逻辑集合名 (按集合查找调优结果)
+        extra: 额外写入集合元数据的键值
+    """
+    from config import get_config
+    config = get_config()
+
+    params = {
+        "space": config.get('vector_db.hnsw.space') or default_space,
+        "M": config.get('vector_db.hnsw.M'),
+        "construction_ef": config.get('vector_db.hnsw.construction_ef'),
+        "search_ef": config.get('vector_db.hnsw.search_ef'),
+    }
+    params.update(tuned_hnsw_params(collection))
+
+    metadata = {f"hnsw:{k}": v for k, v in params.items() if v is not None}
+    metadata.update(extra)
+    return metadata
+
+
+def apply_search_ef(collection, name: Optional[str] = None):
+    """把配置 (或该逻辑集合的调优结果) 中的 search_ef 更新到已有集合
+
+    get_or_create_collection 不会修改已有集合的元数据，这里通过 collection.modify 更新
+    集合配置。已加载的索引不会响应修改，新值在索引下次加载 (服务重启) 时生效。
+    远程集合由索引服务进程打开，不在客户端修改。
+
+    Args:
+        collection: chromadb 集合
+        name: 逻辑集合名，默认为集合名
+    """
+    configuration = getattr(collection, "configuration_json", None)
+    if not configuration or not hasattr(collection, "modify"):
+        return
+
+    from config import get_config
+    search_ef = tuned_hnsw_params(name or collection.name).get(
+        "search_ef", get_config().get('vector_db.hnsw.search_ef')
+    )
+    current = (configuration.get("hnsw") or {}).get("ef_search")
+    if search_ef is None or current is None or current == search_ef:
+        return
+
+    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    print(f"🔧 集合 {collection.name} 的 search_ef: {current} -> {search_ef} (索引重新加载后生效)")
+
+
+def chroma_where(where: Optional[Dict]) -> Optional[Dict]:
+    """等值条件 {键: 值} 转为 ChromaDB 的 where (多个键需要用 $and 组合)
+
+    已是 ChromaDB 语法 (含 $ 运算符) 的条件原样返回。
+    """
+    if not where:
+        return None
+    if len(where) == 1 or any(key.startswith("$") for key in where):
+        return where
+    return {"$and": [{key: value} for key, value in where.items()]}
+
+
+def get_chroma_client(path: str):
+    """获取向量库客户端
+
+    配置了索引服务时返回 RemoteChromaClient (共享服务端的索引)，
+    否则在本进程内打开 chromadb.PersistentClient，并用 LockedChromaClient 包装，
+    与其他进程的写入互斥。
+
+    Args:
+        path: 存储目录；远程模式下作为服务端的存储命名空间
+    """
+    url = get_index_server_url()
+    if url:
+        store = str(Path(path).resolve())
+        print(f"🔗 连接索引服务: {url} ({store})")
+        return RemoteChromaClient(url, store=store)
+
+    import chromadb
+    from chromadb.config import Settings
+
+    from config import get_config
+
+    Path(path).mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(
+        path=str(path),
+        settings=Settings(anonymized_telemetry=False, allow_reset=True)
+    )
+    return LockedChromaClient(client, path, lease=get_config().get('vector_db.storage.lock_lease', 30.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SciResearcher 独立向量索引服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--workers", type=int, default=None, help="处理请求的工作线程数，默认读取 vector_db.rpc.workers")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0, help="查询合并窗口 (毫秒)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, max_workers=args.workers, batch_window=args.batch_window_ms / 1000)
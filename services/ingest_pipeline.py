@@ -0,0 +1,285 @@
+"""
+流水线式入库: 分块 → 向量化 → 写入
+
+各阶段在各自的线程中运行，阶段之间用有界队列连接:
+    - 上游每产出一项就交给下游，不等整篇文档处理完，各阶段的耗时相互重叠而不是相加
+    - 队列满时上游阻塞等待 (背压)，每个队列中最多 queue_size 项在途，内存占用有界
+    - 任一阶段出错时整条流水线停止，异常由 run() 重新抛出
+每个阶段统计处理项数、忙碌时间 (不含等待上下游的时间) 与吞吐，瓶颈阶段一目了然。
+
+    pipeline = Pipeline([
+        Stage("chunk", lambda: batches),                # 首个阶段不接收输入
+        Stage("embed", embed_batches, workers=4),       # 其余阶段: 输入迭代器 -> 输出迭代器
+        Stage("index", write_batches)
+    ])
+    results = pipeline.run()        # 最后一个阶段的全部输出
+    print(format_stats(pipeline.stats))
+"""
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_END = object()
+_POLL = 0.1
+
+
+class _Aborted(Exception):
+    """其他阶段出错，当前阶段退出"""
+
+
+class Stage:
+    """流水线的一个阶段"""
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Iterable],
+        workers: int = 1,
+        size: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            name: 阶段名 (用于统计)
+            fn: 首个阶段为 fn() -> 输出迭代器；其余阶段为 fn(输入迭代器) -> 输出迭代器
+            workers: 并行的线程数 (多个线程共同消费同一输入队列)
+            size: 每项输出计入统计的条数 (如批次的行数)，默认每项计 1
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.size = size
+
+
+class Pipeline:
+    """用有界队列串联的多阶段流水线"""
+
+    def __init__(self, stages: List[Stage], queue_size: Optional[int] = None):
+        """
+        Args:
+            stages: 各阶段，按数据流向排列
+            queue_size: 相邻阶段之间的队列容量，默认读取 vector_db.bulk.queue_size
+        """
+        if queue_size is None:
+            from config import get_config
+            queue_size = get_config().get('vector_db.bulk.queue_size', 4)
+
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.stats: Dict[str, Any] = {}
+
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def run(self) -> List[Any]:
+        """运行到全部阶段结束
+
+        Returns:
+            最后一个阶段的全部输出
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages[:-1]]
+        remaining = [stage.workers for stage in self.stages]
+        results: List[Any] = []
+        self.stats = {
+            stage.name: {"items": 0, "busy": 0.0, "workers": stage.workers}
+            for stage in self.stages
+        }
+        self._abort.clear()
+        self._error = None
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(index, queues, remaining, results),
+                name=f"pipeline-{stage.name}-{n}",
+                daemon=True
+            )
+            for index, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seconds = time.perf_counter() - start
+        for stat in self.stats.values():
+            busy = stat["busy"] / stat["workers"]
+            stat["rate"] = stat["items"] / busy if busy > 0 else 0.0
+        self.stats["seconds"] = seconds
+
+        if self._error is not None:
+            raise self._error
+        return results
+
+    def _work(self, index: int, queues: List[queue.Queue], remaining: List[int], results: List[Any]):
+        stage = self.stages[index]
+        last = index == len(self.stages) - 1
+        waited = [0.0]
+        begin = time.perf_counter()
+
+        try:
+            outputs = stage.fn() if index == 0 else stage.fn(self._drain(queues[index - 1], waited))
+            for item in outputs:
+                with self._lock:
+                    self.stats[stage.name]["items"] += stage.size(item) if stage.size else 1
+                if last:
+                    with self._lock:
+                        results.append(item)
+                else:
+                    self._put(queues[index], item, waited)
+        except _Aborted:
+            pass
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._abort.set()
+        finally:
+            with self._lock:
+                self.stats[stage.name]["busy"] += time.perf_counter() - begin - waited[0]
+                remaining[index] -= 1
+                finished = remaining[index] == 0
+            # 本阶段的最后一个线程结束时通知下游
+            if finished and not last:
+                try:
+                    self._put(queues[index], _END, [0.0])
+                except _Aborted:
+                    pass
+
+    def _put(self, q: queue.Queue, item: Any, waited: List[float]):
+        """放入下游队列；队列满时等待 (背压)"""
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    q.put(item, timeout=_POLL)
+                    return
+                except queue.Full:
+                    if self._abort.is_set():
+                        raise _Aborted()
+        finally:
+            waited[0] += time.perf_counter() - start
+
+    def _drain(self, q: queue.Queue, waited: List[float]) -> Iterator[Any]:
+        """逐项取出上游队列，直到上游结束"""
+        while True:
+            start = time.perf_counter()
+            try:
+                while True:
+                    try:
+                        item = q.get(timeout=_POLL)
+                        break
+                    except queue.Empty:
+                        if self._abort.is_set():
+                            raise _Aborted()
+            finally:
+                waited[0] += time.perf_counter() - start
+
+            if item is _END:
+                # 放回结束标记，同一阶段的其他线程也能看到
+                q.put(_END)
+                return
+            yield item
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """各阶段吞吐的多行摘要"""
+    lines = []
+    busy_total = 0.0
+    for name, stat in stats.items():
+        if name == "seconds":
+            continue
+        busy_total += stat["busy"]
+        workers = f" ×{stat['workers']}" if stat["workers"] > 1 else ""
+        lines.append(f"  {name}{workers}: {stat['items']} 项 | 忙碌 {stat['busy']:.2f}s | {stat['rate']:.1f} 项/秒")
+    lines.append(f"  总耗时 {stats.get('seconds', 0.0):.2f}s (各阶段忙碌合计 {busy_total:.2f}s)")
+    return "\n".join(lines)
+
+
+def embed_and_write(
+    rows: Iterable[Tuple[str, str, Optional[Dict]]],
+    embed: Callable[[str], Any],
+    write: Callable[[Dict[str, list]], int],
+    batch_size: int,
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    on_embed_error: Optional[Callable[[str, str, Optional[Dict], Exception], None]] = None
+) -> Dict[str, Any]:
+    """把 (id, 文本, 元数据) 流水线式地分批、向量化并写入
+
+    Args:
+        rows: (id, 文本, 元数据) 的可迭代对象，可以是边分块边产出的生成器
+        embed: 单条文本的向量化函数
+        write: 写入一批 ({"ids", "documents", "metadatas", "embeddings"})，返回写入条数
+        batch_size: 每批条数
+        workers: 向量化线程数，默认读取 vector_db.bulk.embed_workers
+        queue_size: 阶段间队列容量 (批)，默认读取 vector_db.bulk.queue_size
+        on_embed_error: 单条向量化失败时的回调 (id, 文本, 元数据, 异常)，该条不写入；
+            未指定时向量化失败会中止整个写入
+
+    Returns:
+        统计信息: rows, written, deferred, batches, seconds, rows_per_sec, stages (各阶段吞吐)
+    """
+    if workers is None:
+        from config import get_config
+        workers = get_config().get('vector_db.bulk.embed_workers', 4)
+
+    counts = {"rows": 0, "deferred": 0, "batches": 0}
+    lock = threading.Lock()
+
+    def chunk() -> Iterator[List[tuple]]:
+        batch = []
+        for row in rows:
+            counts["rows"] += 1
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def embed_batches(batches: Iterator[List[tuple]]) -> Iterator[Dict[str, list]]:
+        for batch in batches:
+            out = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            for row_id, text, meta in batch:
+                try:
+                    embedding = embed(text)
+                except Exception as e:
+                    if on_embed_error is None:
+                        raise
+                    on_embed_error(row_id, text, meta, e)
+                    with lock:
+                        counts["deferred"] += 1
+                    continue
+                out["ids"].append(row_id)
+                out["documents"].append(text)
+                out["metadatas"].append(meta)
+                out["embeddings"].append(embedding.tolist() if hasattr(embedding, "tolist") else embedding)
+            if out["ids"]:
+                yield out
+
+    def index(batches: Iterator[Dict[str, list]]) -> Iterator[int]:
+        for batch in batches:
+            counts["batches"] += 1
+            yield write(batch)
+
+    pipeline = Pipeline([
+        Stage("chunk", chunk, size=len),
+        Stage("embed", embed_batches, workers=workers, size=lambda batch: len(batch["ids"])),
+        Stage("index", index, size=lambda written: written)
+    ], queue_size)
+    written = sum(pipeline.run())
+
+    seconds = pipeline.stats["seconds"]
+    return {
+        "rows": counts["rows"],
+        "written": written,
+        "deferred": counts["deferred"],
+        "batches": counts["batches"],
+        "seconds": seconds,
+        "rows_per_sec": written / seconds if seconds > 0 else 0.0,
+        "stages": pipeline.stats
+    }
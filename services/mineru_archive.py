@@ -0,0 +1,273 @@
+"""
+MinerU 结果压缩包
+
+图片较多的论文结果包可达数百 MB。压缩包分块流式下载到磁盘 (不整体读入内存)，
+再用 zipfile 从磁盘打开，只读取需要的成员 (markdown、content_list、tables.html)；
+图片只记录成员名，使用时才通过 load_image() 从压缩包中读取。单次解析的内存占用
+与压缩包大小无关。
+
+压缩包保存在 pdf_parser.archive_dir；pdf_parser.keep_archives 为 false 时读取文本后删除。
+保留的压缩包总大小超过 pdf_parser.archive_max_size_mb 时按最近使用 (LRU) 淘汰，超过
+archive_ttl 的直接删除；删除前把仍只登记在压缩包中的图片写入图片资源库。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from . import http_client
+
+# 按顺序查找的 markdown 文件名 (full.md 是 MinerU 默认的完整解析结果)
+MARKDOWN_NAMES = ("full.md", "output.md", "parsed.md", "document.md")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+_DOWNLOAD_BLOCK = 1 << 20
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+def archive_dir() -> Path:
+    from config import get_config
+    return Path(get_config().get('pdf_parser.archive_dir', './data/mineru_archives'))
+
+
+def keep_archives() -> bool:
+    from config import get_config
+    return bool(get_config().get('pdf_parser.keep_archives', True))
+
+
+def archive_limits():
+    """保留压缩包的 (总大小上限字节数或 None, 有效期秒数或 0)"""
+    from config import get_config
+    config = get_config()
+    max_size_mb = config.get('pdf_parser.archive_max_size_mb', 4096)
+    return (max_size_mb * 1024 * 1024 if max_size_mb else None), config.get('pdf_parser.archive_ttl', 0)
+
+
+def print_progress(step: float = 0.25) -> ProgressCallback:
+    """默认的进度回调: 每完成 step 比例打印一次 (总大小未知时每 50MB 打印一次)"""
+    state = {"next": step, "next_bytes": 50 << 20}
+
+    def report(downloaded: int, total: Optional[int]):
+        if total:
+            if downloaded >= total or downloaded / total >= state["next"]:
+                print(f"  已下载 {downloaded / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f} MB")
+                while state["next"] <= downloaded / total:
+                    state["next"] += step
+        elif downloaded >= state["next_bytes"]:
+            print(f"  已下载 {downloaded / 1024 / 1024:.1f} MB")
+            state["next_bytes"] += 50 << 20
+
+    return report
+
+
+def download(
+    url: str,
+    dest: Optional[Path] = None,
+    progress: Optional[ProgressCallback] = None,
+    timeout=None
+) -> Path:
+    """把压缩包分块流式下载到磁盘
+
+    Args:
+        url: 压缩包地址
+        dest: 保存路径，默认 archive_dir 下按 URL (不含查询参数) 的哈希命名
+        progress: 进度回调 (已下载字节数, 总字节数或 None)
+        timeout: 连接/读取超时(秒)，默认 http_client.transfer_timeout()
+
+    Returns:
+        压缩包路径
+    """
+    if dest is None:
+        parts = urlsplit(url)
+        name = hashlib.sha256(f"{parts.netloc}{parts.path}".encode("utf-8")).hexdigest()[:24]
+        dest = archive_dir() / f"{name}.zip"
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+
+    # 先写 .part，完成后再改名，中途失败不会留下不完整的压缩包
+    part = dest.with_suffix(dest.suffix + ".part")
+    try:
+        with http_client.get(url, stream=True, timeout=timeout or http_client.transfer_timeout()) as res:
+            res.raise_for_status()
+            total = int(res.headers.get("Content-Length") or 0) or None
+            downloaded = 0
+            with open(part, 'wb') as f:
+                for block in res.iter_content(_DOWNLOAD_BLOCK):
+                    f.write(block)
+                    downloaded += len(block)
+                    if progress:
+                        progress(downloaded, total)
+        part.replace(dest)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+    return dest
+
+
+class MineruArchive:
+    """从磁盘按需读取 MinerU 结果压缩包的成员"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._zf = zipfile.ZipFile(self.path)
+        # 访问时间记录最近一次使用 (LRU 淘汰)，修改时间保持为下载时间 (有效期)
+        try:
+            os.utime(self.path, (time.time(), self.path.stat().st_mtime))
+        except OSError:
+            pass
+
+    def __enter__(self) -> "MineruArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zf.close()
+
+    def names(self) -> List[str]:
+        return self._zf.namelist()
+
+    def _find(self, predicate: Callable[[str], bool]) -> Optional[str]:
+        return next((name for name in self._zf.namelist() if predicate(name)), None)
+
+    def read_text(self, name: str) -> str:
+        return self._zf.read(name).decode("utf-8")
+
+    def markdown(self) -> str:
+        """解析得到的 markdown；没有标准文件名时取第一个 .md 文件"""
+        names = set(self._zf.namelist())
+        name = next((n for n in MARKDOWN_NAMES if n in names), None) or self._find(lambda n: n.endswith(".md"))
+        return self.read_text(name) if name else ""
+
+    def content_list(self) -> List[Dict[str, Any]]:
+        """content_list (MinerU 命名为 <id>_content_list.json)"""
+        name = self._find(lambda n: n.endswith("content_list.json"))
+        if not name:
+            return []
+        with self._zf.open(name) as f:
+            return json.load(f)
+
+    def tables_html(self) -> str:
+        name = self._find(lambda n: n.endswith("tables.html"))
+        return self.read_text(name) if name else ""
+
+    def image_names(self) -> List[str]:
+        return [
+            name for name in self._zf.namelist()
+            if name.startswith("images/") and name.lower().endswith(IMAGE_SUFFIXES)
+        ]
+
+    def read(self, name: str) -> bytes:
+        """读取单个成员 (如图片)"""
+        return self._zf.read(name)
+
+    def extract(self, name: str, dest_dir) -> Path:
+        """把单个成员流式解压到 dest_dir，返回文件路径"""
+        target = Path(dest_dir) / Path(name).name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with self._zf.open(name) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, _DOWNLOAD_BLOCK)
+        return target
+
+    def result(self) -> Dict[str, Any]:
+        """解析结果的文本部分；图片只列出成员名，使用时再调用 load_image()"""
+        archive = str(self.path) if keep_archives() else None
+        images = [{"path_in_zip": name} for name in self.image_names()]
+        if archive:
+            for image in images:
+                image["archive"] = archive
+        return {
+            "markdown": self.markdown(),
+            "content_list": self.content_list(),
+            "tables": [],
+            "images": images,
+            "archive": archive
+        }
+
+
+def fetch(url: str, progress: Optional[ProgressCallback] = None, timeout=None) -> MineruArchive:
+    """下载并打开结果压缩包 (用完后 close；不保留压缩包时 discard)"""
+    archive = MineruArchive(download(url, progress=progress or print_progress(), timeout=timeout))
+    if keep_archives():
+        try:
+            evict(keep=archive.path)
+        except Exception as e:
+            print(f"⚠️ 压缩包淘汰失败: {e}")
+    return archive
+
+
+def evict(keep: Optional[Path] = None) -> int:
+    """删除过期的压缩包，再按最近使用淘汰到总大小上限以内
+
+    删除前由图片资源库接管其中登记的图片 (写入资源库并清除对压缩包的引用)。
+
+    Args:
+        keep: 不淘汰的压缩包 (如刚下载、正在读取的)
+
+    Returns:
+        删除的压缩包数
+    """
+    directory = archive_dir()
+    if not directory.exists():
+        return 0
+
+    max_bytes, ttl = archive_limits()
+    entries = []
+    for path in directory.glob("*.zip"):
+        try:
+            entries.append((path, path.stat()))
+        except OSError:
+            continue
+
+    now = time.time()
+    total = sum(stat.st_size for _, stat in entries)
+    removed = 0
+    # 过期的排在最前，其余按最近使用时间
+    entries.sort(key=lambda e: (not (ttl and now - e[1].st_mtime > ttl), e[1].st_atime))
+    for path, stat in entries:
+        expired = bool(ttl) and now - stat.st_mtime > ttl
+        if not expired and (max_bytes is None or total <= max_bytes):
+            break
+        if keep is not None and path.resolve() == Path(keep).resolve():
+            continue
+        _release(path)
+        path.unlink(missing_ok=True)
+        total -= stat.st_size
+        removed += 1
+
+    if removed:
+        print(f"🗑️ 已淘汰 {removed} 个 MinerU 结果压缩包 (剩余 {total / 1024 / 1024:.1f} MB)")
+    return removed
+
+
+def _release(path: Path):
+    """压缩包删除前，把图片资源库中仍只引用它的图片写入资源库"""
+    from .asset_store import get_asset_store
+    get_asset_store().release_archive(path)
+
+
+def discard(archive: MineruArchive):
+    """关闭压缩包，并在不保留压缩包时删除文件"""
+    archive.close()
+    if not keep_archives():
+        archive.path.unlink(missing_ok=True)
+
+
+def load_image(image: Dict[str, Any]) -> bytes:
+    """按需读取解析结果中的一张图片
+
+    Args:
+        image: 解析结果 images 列表中的一项 ({"path_in_zip", "archive"})
+    """
+    if not image.get("archive"):
+        raise FileNotFoundError(f"压缩包未保留，无法读取图片: {image.get('path_in_zip')}")
+    with MineruArchive(image["archive"]) as archive:
+        return archive.read(image["path_in_zip"])
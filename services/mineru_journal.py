@@ -0,0 +1,107 @@
+"""
+MinerU 批量解析任务日志 (SQLite)
+
+目录级批量解析可能持续数小时。每个 PDF 的内容哈希、所在批次 (batch_id / data_id)、
+状态与结果路径都记录到持久化日志中，中断后重新运行时:
+    - 已完成且内容未变 (哈希相同、结果文件仍在) 的文件直接跳过
+    - 已上传、尚未完成的文件按原 batch_id 重新接上轮询，不再重新上传
+    - 只重新提交失败的文件 (以及新增或内容有变化的文件)
+
+状态: uploaded (已上传，等待解析) / done / failed
+"""
+import time
+import sqlite3
+import contextlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    pdf_path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    state TEXT NOT NULL,
+    batch_id TEXT,
+    data_id TEXT,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_state ON files (state);
+"""
+
+UPLOADED = "uploaded"
+DONE = "done"
+FAILED = "failed"
+
+
+class ParseJournal:
+    """批量解析的持久化任务日志"""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: SQLite 文件路径
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，块结束时提交并关闭 (每次操作独立连接，线程间安全)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(pdf_path: str) -> str:
+        return str(Path(pdf_path).resolve())
+
+    def get(self, pdf_path: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT sha256, state, batch_id, data_id, result, attempts FROM files WHERE pdf_path = ?",
+                (self._key(pdf_path),)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("sha256", "state", "batch_id", "data_id", "result", "attempts")
+        return dict(zip(keys, row))
+
+    def mark_uploaded(self, pdf_path: str, sha256: str, batch_id: str, data_id: str):
+        """文件已上传到批次 (中断后可按 batch_id 重新接上轮询)"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO files (pdf_path, sha256, state, batch_id, data_id, attempts, updated) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT(pdf_path) DO UPDATE SET sha256 = excluded.sha256, state = excluded.state, "
+                "batch_id = excluded.batch_id, data_id = excluded.data_id, result = NULL, "
+                "attempts = files.attempts + 1, updated = excluded.updated",
+                (self._key(pdf_path), sha256, UPLOADED, batch_id, data_id, time.time())
+            )
+
+    def mark_done(self, pdf_path: str, sha256: str, result: str):
+        self._finish(pdf_path, sha256, DONE, result)
+
+    def mark_failed(self, pdf_path: str, sha256: str, error: str):
+        self._finish(pdf_path, sha256, FAILED, error)
+
+    def _finish(self, pdf_path: str, sha256: str, state: str, result: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO files (pdf_path, sha256, state, result, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(pdf_path) DO UPDATE SET sha256 = excluded.sha256, state = excluded.state, "
+                "result = excluded.result, updated = excluded.updated",
+                (self._key(pdf_path), sha256, state, result, time.time())
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的文件数"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall())
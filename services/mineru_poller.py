@@ -0,0 +1,338 @@
+"""
+MinerU 任务轮询协调器
+
+PDFService、smolagents_tools 与 mineru_batch 原先各自用一个阻塞循环按固定间隔
+(5-10 秒) 轮询，每个进行中的解析占用一个睡眠线程。协调器在一个后台线程里运行
+asyncio 事件循环，统一跟踪所有未完成的任务 ID / 批次 ID:
+    - 每轮把到期的查询并发发出 (请求在有界线程池中执行，空闲时不占线程)
+    - 查询间隔按 extract_progress 自适应: 根据解析速度估计剩余时间，临近完成时
+      缩短到 min_interval；排队中 (pending) 的任务逐步放宽到 max_interval
+    - 结果通过每个任务 (批次内每个文件) 的 Future 返回，同步代码用 .result()，
+      协程中用 await poller.task(...) / poller.batch(...)
+
+    poller = get_poller()
+    data = poller.watch_task(task_id, token).result()          # {"state": "done", "full_zip_url": ...}
+    futures = poller.watch_batch(batch_id, token, ["f0", "f1"])  # {data_id: Future}
+"""
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import http_client
+
+BASE_URL = "https://mineru.net/api/v4"
+
+# watch_batch 中表示 "批次中的第一个文件" 的键 (单文件批次不知道 data_id 时使用)
+FIRST_FILE = ""
+
+# 连续查询失败这么多次后放弃该任务
+_MAX_ERRORS = 5
+
+
+class _Watch:
+    """一个被跟踪的任务或批次"""
+
+    __slots__ = ("kind", "key", "token", "futures", "deadline", "interval", "next_due", "errors", "progress")
+
+    def __init__(self, kind: str, key: str, token: str, deadline: float, next_due: float, interval: float):
+        self.kind = kind
+        self.key = key
+        self.token = token
+        self.futures: Dict[str, Future] = {}
+        self.deadline = deadline
+        self.interval = interval
+        self.next_due = next_due
+        self.errors = 0
+        # 各文件首次观察到的解析进度 (时间, 已解析页数)，用于估计解析速度
+        self.progress: Dict[str, Tuple[float, int]] = {}
+
+
+class MineruPoller:
+    """统一轮询所有未完成的 MinerU 任务"""
+
+    def __init__(
+        self,
+        min_interval: Optional[float] = None,
+        initial_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        base_url: str = BASE_URL
+    ):
+        """
+        Args:
+            min_interval: 最短查询间隔(秒)，默认读取 pdf_parser.poll.min_interval
+            initial_interval: 首次查询前的等待(秒)，默认读取 pdf_parser.poll.initial_interval
+            max_interval: 最长查询间隔(秒)，默认读取 pdf_parser.poll.max_interval
+            timeout: 单个任务的默认最长等待(秒)，默认读取 pdf_parser.poll.timeout
+            max_concurrency: 同时进行的查询请求数，默认读取 pdf_parser.poll.max_concurrency
+            base_url: MinerU API 地址
+        """
+        from config import get_config
+        config = get_config()
+
+        self.min_interval = min_interval or config.get('pdf_parser.poll.min_interval', 2)
+        self.initial_interval = initial_interval or config.get('pdf_parser.poll.initial_interval', 5)
+        self.max_interval = max_interval or config.get('pdf_parser.poll.max_interval', 30)
+        self.timeout = timeout or config.get('pdf_parser.poll.timeout', 1800)
+        self.base_url = base_url
+
+        self._http = ThreadPoolExecutor(
+            max_workers=max_concurrency or config.get('pdf_parser.poll.max_concurrency', 8),
+            thread_name_prefix="mineru-poll"
+        )
+
+        self._watches: Dict[Tuple[str, str], _Watch] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._start_lock = threading.Lock()
+
+    # ---- 对外接口 ----
+
+    def watch_task(self, task_id: str, token: str, timeout: Optional[float] = None) -> Future:
+        """跟踪单个解析任务 (/extract/task/{task_id})
+
+        Returns:
+            完成时结果为任务数据 (含 full_zip_url)；解析失败抛出 RuntimeError，超时抛出 TimeoutError
+        """
+        return self._watch("task", task_id, token, [FIRST_FILE], timeout)[FIRST_FILE]
+
+    def watch_batch(
+        self,
+        batch_id: str,
+        token: str,
+        data_ids: Iterable[str] = (FIRST_FILE,),
+        timeout: Optional[float] = None
+    ) -> Dict[str, Future]:
+        """跟踪批次中的文件 (/extract-results/batch/{batch_id})
+
+        Args:
+            batch_id: 批次 ID
+            token: MinerU API Token
+            data_ids: 要跟踪的文件 (按 data_id 或文件名匹配)；FIRST_FILE 表示批次中的第一个文件
+            timeout: 最长等待(秒)
+
+        Returns:
+            {data_id: Future}，完成时结果为该文件的 extract_result 条目 (含 full_zip_url)
+        """
+        return self._watch("batch", batch_id, token, list(data_ids), timeout)
+
+    async def task(self, task_id: str, token: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.watch_task(task_id, token, timeout))
+
+    async def batch(
+        self,
+        batch_id: str,
+        token: str,
+        data_ids: Iterable[str] = (FIRST_FILE,),
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """等待批次中全部文件完成 (任一文件失败时抛出异常)"""
+        futures = self.watch_batch(batch_id, token, data_ids, timeout)
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures.values()))
+        return dict(zip(futures, results))
+
+    @property
+    def outstanding(self) -> int:
+        """未完成的文件数"""
+        return sum(
+            sum(1 for future in watch.futures.values() if not future.done())
+            for watch in list(self._watches.values())
+        )
+
+    # ---- 事件循环 ----
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._wakeup = asyncio.Event()
+                    loop.create_task(self._run())
+                    started.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run, daemon=True, name="mineru-poller").start()
+                started.wait()
+                self._loop = loop
+            return self._loop
+
+    def _watch(self, kind: str, key: str, token: str, data_ids: List[str], timeout: Optional[float]) -> Dict[str, Future]:
+        loop = self._ensure_loop()
+        futures = {data_id: Future() for data_id in data_ids}
+        deadline = time.monotonic() + (timeout or self.timeout)
+        loop.call_soon_threadsafe(self._add, kind, key, token, futures, deadline)
+        return futures
+
+    def _add(self, kind: str, key: str, token: str, futures: Dict[str, Future], deadline: float):
+        """在事件循环线程中登记 (同一任务/批次被多次跟踪时合并为一次查询)"""
+        now = time.monotonic()
+        watch = self._watches.get((kind, key))
+        if watch is None:
+            watch = _Watch(kind, key, token, deadline, now + self.initial_interval, self.initial_interval)
+            self._watches[(kind, key)] = watch
+        else:
+            watch.deadline = max(watch.deadline, deadline)
+
+        for data_id, future in futures.items():
+            existing = watch.futures.get(data_id)
+            if existing is not None and not existing.done():
+                existing.add_done_callback(lambda done, future=future: _copy_result(done, future))
+            else:
+                watch.futures[data_id] = future
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._watches:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            now = time.monotonic()
+            due = [watch for watch in self._watches.values() if watch.next_due <= now]
+            if due:
+                await asyncio.gather(*(self._poll(watch) for watch in due))
+
+            if not self._watches:
+                continue
+            wait = min(watch.next_due for watch in self._watches.values()) - time.monotonic()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+    def _get(self, url: str, token: str) -> Dict[str, Any]:
+        # 查询失败由 _poll 按退避间隔重新排期，这里不在查询线程中等待重试
+        res = http_client.get(url, headers={"Authorization": f"Bearer {token}"}, retries=0)
+        res.raise_for_status()
+        return res.json()
+
+    async def _poll(self, watch: _Watch):
+        if watch.kind == "task":
+            url = f"{self.base_url}/extract/task/{watch.key}"
+        else:
+            url = f"{self.base_url}/extract-results/batch/{watch.key}"
+
+        try:
+            resp = await asyncio.get_running_loop().run_in_executor(self._http, self._get, url, watch.token)
+            if resp["code"] != 0:
+                raise RuntimeError(f"轮询失败: {resp['msg']}")
+        except Exception as e:
+            watch.errors += 1
+            if watch.errors >= _MAX_ERRORS or isinstance(e, RuntimeError):
+                self._finish(watch, e)
+            else:
+                print(f"⚠️ 查询 {watch.key[:12]} 失败 ({watch.errors}/{_MAX_ERRORS}): {e}")
+                self._schedule(watch, min(self.max_interval, watch.interval * 2))
+            return
+        watch.errors = 0
+
+        if watch.kind == "task":
+            items = [resp["data"]]
+        else:
+            items = resp["data"].get("extract_result") or []
+
+        etas, queued = [], False
+        for position, item in enumerate(items):
+            futures = [
+                watch.futures.get(name) for name in
+                ({item.get("data_id"), item.get("file_name")} | ({FIRST_FILE} if position == 0 else set()))
+                if name is not None
+            ]
+            futures = [future for future in futures if future is not None and not future.done()]
+            if not futures:
+                continue
+
+            state = item.get("state")
+            if state == "done":
+                for future in futures:
+                    future.set_result(item)
+            elif state == "failed":
+                error = RuntimeError(f"解析失败: {item.get('err_msg') or '未知错误'}")
+                for future in futures:
+                    future.set_exception(error)
+            elif state == "running":
+                eta = self._eta(watch, item)
+                if eta is not None:
+                    etas.append(eta)
+            elif state == "converting":
+                etas.append(0.0)
+            else:
+                # pending / waiting-file: 排队中
+                queued = True
+
+        watch.futures = {name: future for name, future in watch.futures.items() if not future.done()}
+        if not watch.futures:
+            self._watches.pop((watch.kind, watch.key), None)
+            return
+        if time.monotonic() > watch.deadline:
+            self._finish(watch, TimeoutError("解析超时"))
+            return
+
+        if etas:
+            # 按最快完成的文件估计: 剩余时间的一半，临近完成时缩到最短间隔
+            interval = min(etas) / 2
+        elif queued:
+            interval = watch.interval * 1.5
+        else:
+            interval = self.initial_interval
+        self._schedule(watch, interval)
+
+    def _eta(self, watch: _Watch, item: Dict[str, Any]) -> Optional[float]:
+        """按解析速度估计剩余时间(秒)；速度未知时返回 None"""
+        progress = item.get("extract_progress") or {}
+        done, total = progress.get("extracted_pages") or 0, progress.get("total_pages") or 0
+        if not total:
+            return None
+
+        name = item.get("data_id") or item.get("file_name") or FIRST_FILE
+        print(f"📄 {(item.get('file_name') or watch.key)[:40]} 进度: {done}/{total} 页")
+
+        now = time.monotonic()
+        first = watch.progress.setdefault(name, (now, done))
+        elapsed, parsed = now - first[0], done - first[1]
+        if elapsed <= 0 or parsed <= 0:
+            return None
+        return (total - done) / (parsed / elapsed)
+
+    def _schedule(self, watch: _Watch, interval: float):
+        watch.interval = max(self.min_interval, min(self.max_interval, interval))
+        watch.next_due = time.monotonic() + watch.interval
+
+    def _finish(self, watch: _Watch, error: Exception):
+        for future in watch.futures.values():
+            if not future.done():
+                future.set_exception(error)
+        self._watches.pop((watch.kind, watch.key), None)
+
+
+def _copy_result(source: Future, target: Future):
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+_poller: Optional[MineruPoller] = None
+_poller_lock = threading.Lock()
+
+
+def get_poller() -> MineruPoller:
+    """进程内共用的轮询协调器"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = MineruPoller()
+        return _poller
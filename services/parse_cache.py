@@ -0,0 +1,244 @@
+"""
+MinerU 解析结果缓存 (内容寻址)
+
+同一个 PDF 每次解析都要上传并等待 MinerU (几十秒到数分钟，且消耗额度)。解析结果
+(markdown、content_list、tables、images) 以 PDF 内容的 SHA-256 加模型版本为键保存到
+本地目录，再次解析时直接返回。远程 PDF 优先用 URL + ETag/Last-Modified 作键，
+服务器不提供时下载 PDF 计算内容哈希。
+
+淘汰策略由 cache.parse 配置:
+    ttl: 条目写入后的有效期(秒)，0 表示不过期
+    max_size_mb / max_entries: 总大小 / 条目数上限，超出时淘汰
+    eviction: lru 淘汰最久未命中的条目，fifo 淘汰最早写入的条目
+
+每个条目是一个 JSON 文件 (写临时文件后原子替换)，多个进程可共用一个缓存目录；
+命中时更新文件的访问时间，作为 LRU 的依据。
+
+    python -m services.parse_cache --stats
+    python -m services.parse_cache --evict
+    python -m services.parse_cache --clear
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+
+from . import http_client
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+_HASH_BLOCK = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    """分块计算文件的 SHA-256 (大文件不整体读入内存)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """PDF 解析结果缓存"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_size_mb: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        eviction: Optional[str] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录，默认 cache.dir 下的 parse 子目录
+            ttl: 有效期(秒)，默认读取 cache.parse.ttl，0 表示不过期
+            max_size_mb: 总大小上限(MB)，默认读取 cache.parse.max_size_mb，0 表示不限
+            max_entries: 条目数上限，默认读取 cache.parse.max_entries，0 表示不限
+            eviction: 淘汰策略 lru / fifo，默认读取 cache.parse.eviction
+            enabled: 是否启用，默认读取 cache.enabled
+        """
+        from config import get_config
+        config = get_config()
+
+        self.enabled = config.get('cache.enabled', True) if enabled is None else enabled
+        self.cache_dir = Path(cache_dir or Path(config.get('cache.dir', './data/cache')) / "parse")
+        self.ttl = config.get('cache.parse.ttl', 0) if ttl is None else ttl
+        self.max_size_mb = config.get('cache.parse.max_size_mb', 2048) if max_size_mb is None else max_size_mb
+        self.max_entries = config.get('cache.parse.max_entries', 0) if max_entries is None else max_entries
+        self.eviction = (eviction or config.get('cache.parse.eviction', 'lru')).lower()
+        if self.eviction not in EVICTION_POLICIES:
+            raise ValueError(f"未知的缓存淘汰策略: {self.eviction} (可选 {', '.join(EVICTION_POLICIES)})")
+
+    # ---- 键 ----
+
+    @staticmethod
+    def _key(content_id: str, model_version: str) -> str:
+        return hashlib.sha256(f"{content_id}\n{model_version}".encode("utf-8")).hexdigest()
+
+    def key_for_file(self, path: str, model_version: str = "") -> str:
+        """本地 PDF: 按文件内容"""
+        return self.key_for_sha256(file_sha256(path), model_version)
+
+    def key_for_sha256(self, digest: str, model_version: str = "") -> str:
+        """已算好内容哈希的 PDF"""
+        return self._key(f"sha256:{digest}", model_version)
+
+    def key_for_url(self, url: str, model_version: str = "") -> str:
+        """远程 PDF: 优先用 URL + ETag/Last-Modified，服务器不提供时下载后按内容"""
+        try:
+            res = http_client.head(url, allow_redirects=True)
+            if res.ok:
+                validator = res.headers.get("ETag") or res.headers.get("Last-Modified")
+                if validator:
+                    return self._key(f"url:{url}\n{validator}", model_version)
+        except requests.RequestException:
+            pass
+
+        digest = hashlib.sha256()
+        with http_client.get(url, stream=True, timeout=http_client.transfer_timeout()) as res:
+            res.raise_for_status()
+            for block in res.iter_content(_HASH_BLOCK):
+                digest.update(block)
+        return self._key(f"sha256:{digest.hexdigest()}", model_version)
+
+    # ---- 读写 ----
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的解析结果；未命中或已过期时返回 None"""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if self.ttl and time.time() - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # 访问时间记录最近一次命中 (LRU)，修改时间保持为写入时间 (TTL / FIFO)
+            os.utime(path, (time.time(), stat.st_mtime))
+        except (OSError, ValueError):
+            return None
+
+        print(f"⚡ 命中解析缓存: {(entry.get('source') or key)[:60]}")
+        return entry["result"]
+
+    def put(self, key: str, result: Dict[str, Any], source: str = ""):
+        """保存解析结果，随后按策略淘汰超出上限的条目"""
+        if not self.enabled:
+            return
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"source": source, "created": time.time(), "result": result}, f, ensure_ascii=False)
+        tmp.replace(path)
+
+        self.evict()
+
+    # ---- 淘汰 ----
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((path, path.stat()))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self) -> int:
+        """删除过期条目，再按策略淘汰到大小与条目数上限以内
+
+        Returns:
+            删除的条目数
+        """
+        if not self.cache_dir.exists():
+            return 0
+
+        now = time.time()
+        removed = 0
+        entries = []
+        for path, stat in self._entries():
+            if self.ttl and now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((path, stat))
+
+        # 优先淘汰的排在前面
+        order = (lambda e: e[1].st_atime) if self.eviction == "lru" else (lambda e: e[1].st_mtime)
+        entries.sort(key=order)
+
+        max_bytes = self.max_size_mb * 1024 * 1024 if self.max_size_mb else None
+        total = sum(stat.st_size for _, stat in entries)
+        count = len(entries)
+        for path, stat in entries:
+            over_size = max_bytes is not None and total > max_bytes
+            over_count = bool(self.max_entries) and count > self.max_entries
+            if not (over_size or over_count):
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            count -= 1
+            removed += 1
+
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries() if self.cache_dir.exists() else []
+        return {
+            "dir": str(self.cache_dir),
+            "entries": len(entries),
+            "size_mb": round(sum(stat.st_size for _, stat in entries) / 1024 / 1024, 2),
+            "eviction": self.eviction,
+            "ttl": self.ttl
+        }
+
+    def clear(self) -> int:
+        entries = self._entries() if self.cache_dir.exists() else []
+        for path, _ in entries:
+            path.unlink(missing_ok=True)
+        return len(entries)
+
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """进程内共用的解析缓存 (按配置创建)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache()
+        return _cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MinerU 解析结果缓存")
+    parser.add_argument("--stats", action="store_true", help="查看缓存条目数与大小")
+    parser.add_argument("--evict", action="store_true", help="按配置的策略立即淘汰")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    args = parser.parse_args()
+
+    cache = get_parse_cache()
+    if args.clear:
+        print(f"🗑️ 已删除 {cache.clear()} 个缓存条目")
+    elif args.evict:
+        print(f"🧹 已淘汰 {cache.evict()} 个缓存条目")
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
@@ -2,12 +2,15 @@
 MinerU PDF 解析服务
 """
 import os
-import time
-import requests
-import zipfile
-import io
-import json
 from typing import Dict, Any
+from . import mineru_archive, http_client
+from .parse_cache import get_parse_cache
+from .mineru_poller import get_poller
+from .asset_store import get_asset_store
+
+# 图片条目中记录的登记信息 (缓存命中时据此重新登记)
+_IMAGE_FIELDS = ("doc_id", "kind", "figure", "page", "caption", "archive", "sha256")
+
 
 class PDFService:
     """MinerU 云服务 PDF 解析"""
@@ -17,8 +20,24 @@ class PDFService:
         self.timeout = timeout
         self.base_url = "https://mineru.net/api/v4"
 
-    def parse(self, pdf_url: str, model_version: str = "vlm") -> Dict[str, Any]:
-        """解析 PDF"""
+    def parse(self, pdf_url: str, model_version: str = "vlm", doc_id: str = None) -> Dict[str, Any]:
+        """解析 PDF (同一 PDF、同一模型版本的结果从本地缓存返回)
+
+        结果中的图片登记到图片资源库 (doc_id 默认为 pdf_url)，之后用
+        get_asset_store().resolve(doc_id, figure=...) 取图，无需重新下载压缩包
+        """
+        cache = get_parse_cache()
+        cache_key = None
+        if cache.enabled:
+            try:
+                cache_key = cache.key_for_url(pdf_url, model_version)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    self._adopt_images(cached, doc_id or pdf_url)
+                    return cached
+            except Exception as e:
+                print(f"⚠️ 解析缓存不可用: {e}")
+
         print(f"📤 提交 PDF: {pdf_url[:60]}...")
 
         task_id = self._submit_task(pdf_url, model_version)
@@ -27,7 +46,10 @@ class PDFService:
         result = self._poll_task(task_id)
         print(f"📥 下载结果...")
 
-        return self._extract_zip(result["full_zip_url"])
+        extracted = self._extract_zip(result["full_zip_url"], doc_id or pdf_url)
+        if cache_key:
+            cache.put(cache_key, extracted, source=pdf_url)
+        return extracted
 
     def _submit_task(self, pdf_url: str, model_version: str) -> str:
         """提交任务"""
@@ -38,7 +60,7 @@ class PDFService:
         }
         data = {"url": pdf_url, "model_version": model_version}
 
-        res = requests.post(url, headers=headers, json=data, timeout=10)
+        res = http_client.post(url, headers=headers, json=data)
         res.raise_for_status()
         resp = res.json()
 
@@ -47,60 +69,20 @@ class PDFService:
 
         return resp["data"]["task_id"]
 
-    def _poll_task(self, task_id: str, interval: int = 5) -> Dict[str, Any]:
-        """轮询任务"""
-        url = f"{self.base_url}/extract/task/{task_id}"
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-        start = time.time()
-
-        while time.time() - start < self.timeout:
-            res = requests.get(url, headers=headers, timeout=10)
-            res.raise_for_status()
-            resp = res.json()
+    def _poll_task(self, task_id: str) -> Dict[str, Any]:
+        """等待任务完成 (由共用的轮询协调器统一查询，间隔按解析进度自适应)"""
+        return get_poller().watch_task(task_id, self.api_token, timeout=self.timeout).result()
 
-            if resp["code"] != 0:
-                raise RuntimeError(f"轮询失败: {resp['msg']}")
-
-            data = resp["data"]
-            state = data["state"]
-
-            if state == "done":
-                return data
-            elif state == "failed":
-                raise RuntimeError(f"解析失败: {data.get('err_msg', '未知错误')}")
-            elif state == "running":
-                progress = data["extract_progress"]
-                print(f"📄 进度: {progress['extracted_pages']}/{progress['total_pages']} 页")
-
-            time.sleep(interval)
-
-        raise TimeoutError("解析超时")
-
-    def _extract_zip(self, zip_url: str) -> Dict[str, Any]:
-        """提取 ZIP 内容"""
-        res = requests.get(zip_url, timeout=60)
-        res.raise_for_status()
-
-        result = {"markdown": "", "content_list": [], "tables": [], "images": []}
-
-        with zipfile.ZipFile(io.BytesIO(res.content)) as zf:
-            # Markdown
-            try:
-                result["markdown"] = zf.read("output.md").decode("utf-8")
-            except KeyError:
-                pass
-
-            # Content List
-            try:
-                result["content_list"] = json.loads(zf.read("content_list.json"))
-            except KeyError:
-                pass
+    def _extract_zip(self, zip_url: str, doc_id: str = None) -> Dict[str, Any]:
+        """提取 ZIP 内容 (流式下载到磁盘，只读取文本成员；图片登记到资源库，使用时才写出)"""
+        archive = mineru_archive.fetch(zip_url)
+        try:
+            result = archive.result()
 
             # Tables
             try:
                 from bs4 import BeautifulSoup
-                tables_html = zf.read("tables.html").decode("utf-8")
-                soup = BeautifulSoup(tables_html, "html.parser")
+                soup = BeautifulSoup(archive.tables_html(), "html.parser")
 
                 for tbl in soup.find_all("table"):
                     caption = tbl.find_previous("p", string=lambda x: x and "Table" in x)
@@ -111,14 +93,32 @@ class PDFService:
             except Exception:
                 pass
 
-            # Images
-            try:
-                result["images"] = [
-                    {"path_in_zip": name}
-                    for name in zf.namelist()
-                    if name.startswith("images/") and name.endswith(".jpg")
-                ]
-            except Exception:
-                pass
+            # Images: 按 (doc_id, 图号, 页码) 登记，图片条目带上图号与页码
+            if doc_id:
+                try:
+                    figures = {
+                        entry["member"]: entry
+                        for entry in get_asset_store().register(doc_id, archive, result["content_list"])
+                    }
+                    for image in result["images"]:
+                        entry = figures.get(image["path_in_zip"], {})
+                        image.update({key: entry.get(key) for key in _IMAGE_FIELDS})
+                except Exception as e:
+                    print(f"⚠️ 图片登记失败: {e}")
+        finally:
+            mineru_archive.discard(archive)
 
         return result
+
+    @staticmethod
+    def _adopt_images(result: Dict[str, Any], doc_id: str):
+        """缓存命中时不经过压缩包: 按结果中的图片引用登记到 doc_id，图片条目改为该 doc_id"""
+        images = result.get("images") or []
+        if not images:
+            return
+        try:
+            get_asset_store().adopt(doc_id, images)
+            for image in images:
+                image["doc_id"] = doc_id
+        except Exception as e:
+            print(f"⚠️ 图片登记失败: {e}")
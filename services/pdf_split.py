@@ -0,0 +1,130 @@
+"""
+超限 PDF 的切分与结果拼接
+
+MinerU 单个文件上限 200MB / 600 页。超过上限的 PDF (会议论文集、学位论文) 在本地按
+页段切分为若干部分，各部分并发提交解析，结果再按页段顺序拼接为一篇文档:
+content_list 的 page_idx 换算为全文页码，之后的分块与块 ID 与整篇解析一致。
+
+    parts = split_pdf(path, out_dir)              # [(部分文件, 起始页, 结束页)]
+    result = stitch_results([(start, end, part_result), ...])
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 切分时按上限的这一比例估算每部分页数 (各部分都要带上共用的字体等资源)
+_SIZE_MARGIN = 0.85
+
+
+def _open_pdf(path):
+    try:
+        import pymupdf as fitz
+    except ImportError:  # PyMuPDF < 1.24 只提供 fitz
+        import fitz
+    return fitz.open(path)
+
+
+def limits() -> Tuple[int, int]:
+    """MinerU 单文件上限 (字节数, 页数)"""
+    from config import get_config
+    config = get_config()
+    return (
+        int(config.get('pdf_parser.split.max_upload_mb', 200) * 1024 * 1024),
+        int(config.get('pdf_parser.split.max_pages', 600))
+    )
+
+
+def needs_split(pdf_path: str) -> bool:
+    """文件大小或页数是否超过上限 (未安装 PyMuPDF 时只检查大小)"""
+    max_bytes, max_pages = limits()
+    if Path(pdf_path).stat().st_size > max_bytes:
+        return True
+    try:
+        doc = _open_pdf(pdf_path)
+    except ImportError:
+        print("⚠️ 未安装 PyMuPDF，只按文件大小判断是否切分: pip install pymupdf")
+        return False
+    with doc:
+        return doc.page_count > max_pages
+
+
+def split_pdf(
+    pdf_path: str,
+    out_dir: str,
+    max_bytes: Optional[int] = None,
+    max_pages: Optional[int] = None
+) -> List[Tuple[str, int, int]]:
+    """按页段把 PDF 切分为不超过上限的若干部分
+
+    先按平均每页大小估算每部分页数，写出后仍超过大小上限的部分再对半切分。
+
+    Args:
+        pdf_path: PDF 文件路径
+        out_dir: 各部分的输出目录
+        max_bytes: 每部分大小上限，默认读取 pdf_parser.split.max_upload_mb
+        max_pages: 每部分页数上限，默认读取 pdf_parser.split.max_pages
+
+    Returns:
+        [(部分文件路径, 起始页, 结束页)]，页码从 0 开始、左闭右开，按页码排序
+    """
+    default_bytes, default_pages = limits()
+    max_bytes = max_bytes or default_bytes
+    max_pages = max_pages or default_pages
+
+    pdf_path = Path(pdf_path)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    parts: List[Tuple[str, int, int]] = []
+    with _open_pdf(pdf_path) as src:
+        num_pages = src.page_count
+        per_page = pdf_path.stat().st_size / max(1, num_pages)
+        step = max(1, min(max_pages, int(max_bytes * _SIZE_MARGIN / max(per_page, 1))))
+
+        pending = [(start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+        while pending:
+            start, end = pending.pop(0)
+            part = out_dir / f"{pdf_path.stem}_p{start + 1:05d}-{end:05d}.pdf"
+            with _open_pdf(None) as doc:
+                doc.insert_pdf(src, from_page=start, to_page=end - 1)
+                doc.save(part, garbage=3, deflate=True)
+
+            if part.stat().st_size > max_bytes and end - start > 1:
+                part.unlink()
+                middle = (start + end) // 2
+                pending[:0] = [(start, middle), (middle, end)]
+                continue
+            parts.append((str(part), start, end))
+
+    print(f"✂️ {pdf_path.name}: {num_pages} 页切分为 {len(parts)} 部分")
+    return parts
+
+
+def stitch_results(parts: List[Tuple[int, int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """按页段顺序拼接各部分的解析结果
+
+    Args:
+        parts: [(起始页, 结束页, 该部分的解析结果)]，页码同 split_pdf
+
+    Returns:
+        与整篇解析相同格式的结果；content_list 的 page_idx 为全文页码，
+        另有 parts 记录各部分的页码范围
+    """
+    stitched: Dict[str, Any] = {"markdown": "", "content_list": [], "tables": [], "images": [], "parts": []}
+    markdowns = []
+    for start, end, result in sorted(parts, key=lambda part: part[0]):
+        markdowns.append(result.get("markdown", ""))
+        for block in result.get("content_list") or []:
+            block = dict(block)
+            block["page_idx"] = int(block.get("page_idx", 0)) + start
+            stitched["content_list"].append(block)
+        for image in result.get("images") or []:
+            stitched["images"].append({**image, "page_offset": start})
+        stitched["tables"].extend(result.get("tables") or [])
+        stitched["parts"].append({
+            "first_page": start + 1,
+            "last_page": end,
+            "archive": result.get("archive")
+        })
+
+    stitched["markdown"] = "\n\n".join(markdown for markdown in markdowns if markdown)
+    return stitched
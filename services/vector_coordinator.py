@@ -0,0 +1,316 @@
+"""
+多节点向量存储协调器 (一致性哈希)
+"""
+import bisect
+import hashlib
+import heapq
+import itertools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterable, Tuple
+
+from .index_node import IndexNodeClient
+from .incremental_index import sync_document, sync_document_stream, format_report
+from .ingest_pipeline import embed_and_write, format_stats
+
+
+class ConsistentHashRing:
+    """带虚拟节点的一致性哈希环"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._hashes: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners.values()))
+
+    def add_node(self, node: str):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            if h not in self._owners:
+                bisect.insort(self._hashes, h)
+                self._owners[h] = node
+
+    def remove_node(self, node: str):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            if self._owners.get(h) == node:
+                del self._owners[h]
+                self._hashes.remove(h)
+
+    def get_node(self, key: str) -> str:
+        if not self._hashes:
+            raise RuntimeError("哈希环中没有可用节点")
+        pos = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[self._hashes[pos]]
+
+
+class VectorStoreCoordinator:
+    """VectorStore 的多节点协调模式
+
+    文档按一致性哈希分配到各索引节点 (services.index_node)，同一文档的所有块
+    落在同一节点；检索并发扇出到全部节点后按距离归并全局 top-k。
+    新增节点时只迁移哈希环上归属发生变化的文档。
+    """
+
+    ROUTE_KEY = "route_key"
+
+    def __init__(self, embedding_service, nodes: List[str], replicas: int = 64, timeout: float = 30):
+        if not nodes:
+            raise ValueError("至少需要一个索引节点")
+
+        self.embedding_service = embedding_service
+        self.dimension = embedding_service.dimension
+        self.timeout = timeout
+
+        self.ring = ConsistentHashRing(replicas=replicas)
+        self.clients: Dict[str, IndexNodeClient] = {}
+        for url in nodes:
+            self.ring.add_node(url)
+            self.clients[url] = IndexNodeClient(url, timeout=timeout)
+
+        self._executor = ThreadPoolExecutor(max_workers=max(4, len(nodes) * 2), thread_name_prefix="vector-node")
+
+        print(f"🌐 向量协调器已初始化: {len(nodes)} 个节点, {self.count()} 个向量")
+
+    def count(self) -> int:
+        """所有节点的向量总数"""
+        return sum(self._executor.map(lambda client: client.count(), self.clients.values()))
+
+    def _route_key(self, text: str, meta: Dict) -> str:
+        return str(meta.get(self.ROUTE_KEY) or meta.get("doc_id") or meta.get("source") or text)
+
+    def add_texts(self, texts: List[str], metadata: Optional[List[Dict]] = None, ids: Optional[List[str]] = None):
+        """批量添加文本"""
+        if not texts:
+            return
+
+        print(f"📊 向量化 {len(texts)} 个文本块...")
+        embeddings = [self.embedding_service.embed(text).tolist() for text in texts]
+
+        if metadata is None:
+            metadata = [{"index": i} for i in range(len(texts))]
+
+        ids = ids or [f"doc_{uuid.uuid4().hex}" for _ in texts]
+        nodes = self._write(ids, texts, embeddings, metadata)
+
+        print(f"✅ 成功添加 {len(texts)} 个向量 (涉及 {nodes} 个节点)")
+        return {"written": len(texts), "deferred": 0}
+
+    def _write(self, ids: List[str], texts: List[str], embeddings: List[list], metadata: List[Dict]) -> int:
+        """按路由键分组并发写入各节点，返回涉及的节点数"""
+        batches: Dict[str, Dict[str, list]] = {}
+        for vec_id, text, emb, meta in zip(ids, texts, embeddings, metadata):
+            route_key = self._route_key(text, meta)
+            batch = batches.setdefault(
+                self.ring.get_node(route_key),
+                {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+            )
+            batch["ids"].append(vec_id)
+            batch["embeddings"].append(emb)
+            batch["documents"].append(text)
+            batch["metadatas"].append({**meta, self.ROUTE_KEY: route_key})
+
+        futures = [
+            self._executor.submit(self.clients[url].add, **batch)
+            for url, batch in batches.items()
+        ]
+        for future in futures:
+            future.result()
+        return len(batches)
+
+    def index_document(
+        self,
+        texts: List[str],
+        metadata: Optional[List[Dict]] = None,
+        identity: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """增量索引一篇文档 (见 VectorStore.index_document)"""
+        report = sync_document(
+            _NodesCollection(self),
+            lambda ids, chunks, metas: self.add_texts(chunks, metas, ids=ids),
+            texts,
+            metadata,
+            identity
+        )
+        print(f"🔁 文档 '{report['doc_id']}': {format_report(report)}")
+        return report
+
+    def index_stream(self, chunks: Iterable[Tuple[str, Dict]], identity: Dict[str, str]) -> Dict:
+        """流水线式增量索引一篇文档 (见 VectorStore.index_stream)"""
+        from config import get_config
+        batch_size = get_config().get('vector_db.bulk.batch_size', 256)
+
+        def write(batch: Dict[str, list]) -> int:
+            self._write(batch["ids"], batch["documents"], batch["embeddings"], batch["metadatas"])
+            return len(batch["ids"])
+
+        def load(rows):
+            return embed_and_write(rows, self.embedding_service.embed, write, batch_size)
+
+        report = sync_document_stream(_NodesCollection(self), load, chunks, identity)
+        print(f"🔁 文档 '{report['doc_id']}': {format_report(report)}")
+        print(format_stats(report["stages"]))
+        return report
+
+    def search(self, query: str, top_k: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """语义搜索 (并发扇出 + 全局 top-k 归并)"""
+        query_vector = self.embedding_service.embed(query).tolist()
+
+        futures = {
+            url: self._executor.submit(client.search, query_vector, top_k, where)
+            for url, client in self.clients.items()
+        }
+
+        partials = []
+        for url, future in futures.items():
+            try:
+                partials.append(future.result())
+            except Exception as e:
+                print(f"⚠️ 节点 {url} 检索失败，结果可能不完整: {e}")
+
+        merged = heapq.merge(*partials, key=lambda r: r["score"])
+        return [
+            {"text": r["text"], "score": r["score"], "metadata": r["metadata"]}
+            for r in itertools.islice(merged, top_k)
+        ]
+
+    def add_node(self, url: str, batch_size: int = 500) -> int:
+        """加入新节点并迁移归属发生变化的文档
+
+        Returns:
+            迁移的向量数
+        """
+        if url in self.clients:
+            return 0
+
+        self.clients[url] = IndexNodeClient(url, timeout=self.timeout)
+        self.ring.add_node(url)
+
+        moved = 0
+        for source_url in list(self.clients):
+            if source_url != url:
+                moved += self._rebalance_from(source_url, batch_size)
+
+        print(f"🔀 节点 {url} 已加入, 迁移 {moved} 个向量")
+        return moved
+
+    def remove_node(self, url: str, batch_size: int = 500) -> int:
+        """移除节点，先把其数据迁移到剩余节点
+
+        Returns:
+            迁移的向量数
+        """
+        if url not in self.clients:
+            return 0
+        if len(self.clients) == 1:
+            raise RuntimeError("不能移除最后一个索引节点")
+
+        self.ring.remove_node(url)
+        moved = self._rebalance_from(url, batch_size)
+        del self.clients[url]
+
+        print(f"🔀 节点 {url} 已移除, 迁移 {moved} 个向量")
+        return moved
+
+    def _rebalance_from(self, source_url: str, batch_size: int) -> int:
+        """把 source 节点上不再归属于它的向量迁移到新的归属节点"""
+        source = self.clients[source_url]
+        moved = 0
+        offset = 0
+
+        while True:
+            page = source.export(offset=offset, limit=batch_size)
+            if not page["ids"]:
+                break
+
+            outgoing: Dict[str, Dict[str, list]] = {}
+            for i, vec_id in enumerate(page["ids"]):
+                meta = page["metadatas"][i] or {}
+                owner = self.ring.get_node(self._route_key(page["documents"][i], meta))
+                if owner == source_url:
+                    continue
+                batch = outgoing.setdefault(owner, {"ids": [], "embeddings": [], "documents": [], "metadatas": []})
+                batch["ids"].append(vec_id)
+                batch["embeddings"].append(page["embeddings"][i])
+                batch["documents"].append(page["documents"][i])
+                batch["metadatas"].append(meta)
+
+            # 先写入目标节点再删除源数据，中途失败只会留下重复而不会丢数据
+            page_moved = 0
+            for owner, batch in outgoing.items():
+                self.clients[owner].add(**batch)
+                source.delete(ids=batch["ids"])
+                page_moved += len(batch["ids"])
+
+            moved += page_moved
+            # 删除会使后续条目前移，偏移量只跨过留在本节点的条目
+            offset += len(page["ids"]) - page_moved
+
+        return moved
+
+    def save(self):
+        """保存索引 (各节点自动持久化)"""
+        print(f"💾 索引已保存: {self.count()} 个向量 (各节点 ChromaDB 自动持久化)")
+
+    def reset(self):
+        """清空所有节点"""
+        for client in self.clients.values():
+            client.reset()
+        print("🗑️ 向量库已清空")
+
+
+class _NodesCollection:
+    """把所有节点看作一个集合 (get / update / delete)，供增量索引使用
+
+    get 扇出到全部节点并记住每个 ID 所在节点，之后的 update / delete 只发给对应节点。
+    """
+
+    def __init__(self, coordinator: VectorStoreCoordinator):
+        self.coordinator = coordinator
+        self._owners: Dict[str, str] = {}
+
+    def get(self, where: Optional[Dict] = None, limit: Optional[int] = None, include: Optional[List[str]] = None) -> Dict:
+        include = include or ["documents", "metadatas"]
+        clients = self.coordinator.clients
+        futures = {
+            url: self.coordinator._executor.submit(client.get, where, limit, include)
+            for url, client in clients.items()
+        }
+
+        merged = {key: [] for key in ["ids"] + include}
+        for url, future in futures.items():
+            data = future.result()
+            for key in merged:
+                merged[key].extend(data.get(key) or [])
+            for vec_id in data["ids"]:
+                self._owners[vec_id] = url
+
+        if limit:
+            merged = {key: values[:limit] for key, values in merged.items()}
+        return merged
+
+    def _by_owner(self, ids: List[str], *columns: List) -> Dict[str, List[list]]:
+        groups: Dict[str, List[list]] = {}
+        for i, vec_id in enumerate(ids):
+            group = groups.setdefault(self._owners[vec_id], [[] for _ in range(len(columns) + 1)])
+            group[0].append(vec_id)
+            for column, values in zip(group[1:], columns):
+                column.append(values[i])
+        return groups
+
+    def update(self, ids: List[str], metadatas: List[Dict]):
+        for url, (group_ids, group_metas) in self._by_owner(ids, metadatas).items():
+            self.coordinator.clients[url].update(group_ids, group_metas)
+
+    def delete(self, ids: List[str]):
+        for url, (group_ids,) in self._by_owner(ids).items():
+            self.coordinator.clients[url].delete(ids=group_ids)
@@ -1,10 +1,13 @@
 """
 向量存储服务 (ChromaDB)
 """
+import uuid
 from pathlib import Path
-from typing import List, Dict, Optional
-import chromadb
-from chromadb.config import Settings
+from typing import Iterable, List, Dict, Optional, Tuple
+from .index_server import chroma_where, get_chroma_client, hnsw_metadata
+from .bulk_loader import BulkLoader
+from .index_migration import VersionedCollection
+from .incremental_index import sync_document, sync_document_stream, format_report
 
 class VectorStore:
     """ChromaDB 向量存储 (单例)"""
@@ -24,67 +27,105 @@ class VectorStore:
         self.embedding_service = embedding_service
         self.dimension = embedding_service.dimension
 
-        # 初始化 ChromaDB 客户端
+        # 初始化 ChromaDB 客户端 (配置了索引服务时连接共享的服务进程)
         self.index_dir = Path(index_dir)
-        self.index_dir.mkdir(parents=True, exist_ok=True)
-
-        self.client = chromadb.PersistentClient(
-            path=str(self.index_dir),
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-
-        # 创建或获取集合
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            metadata={"dimension": self.dimension}
+        self.client = get_chroma_client(str(self.index_dir))
+
+        # 创建或获取集合 (HNSW 参数来自 vector_db.hnsw)；按版本指针路由，支持在线更换模型
+        self.collection = VersionedCollection(
+            self.client,
+            str(self.index_dir),
+            "documents",
+            metadata=hnsw_metadata(collection="documents", dimension=self.dimension)
         )
 
         print(f"📂 ChromaDB 已初始化: {self.collection.count()} 个向量")
         self._initialized = True
 
-    def add_texts(self, texts: List[str], metadata: Optional[List[Dict]] = None):
+    def add_texts(self, texts: List[str], metadata: Optional[List[Dict]] = None, ids: Optional[List[str]] = None):
         """批量添加文本"""
         if not texts:
             return
 
         print(f"📊 向量化 {len(texts)} 个文本块...")
 
-        # 生成向量
-        embeddings = [self.embedding_service.embed(text) for text in texts]
-
-        # 生成ID
-        current_count = self.collection.count()
-        ids = [f"doc_{current_count + i}" for i in range(len(texts))]
+        # 生成ID (不依赖当前数量，多个进程并发写入也不会冲突)
+        ids = ids or [f"doc_{uuid.uuid4().hex}" for _ in texts]
 
         # 准备元数据
         if metadata is None:
+            current_count = self.collection.count()
             metadata = [{"index": current_count + i} for i in range(len(texts))]
 
-        # 添加到 ChromaDB
-        self.collection.add(
-            embeddings=[emb.tolist() for emb in embeddings],
-            documents=texts,
-            metadatas=metadata,
-            ids=ids
+        # 分批写入 ChromaDB (向量化与写入流水线并行)
+        embed = self.collection.embed_function(self.embedding_service.embed)
+        loader = BulkLoader(self.client, self.collection, embed)
+        report = loader.load(ids, texts, metadata)
+
+        print(f"✅ 成功添加 {report['written']} 个向量")
+        return report
+
+    def index_document(
+        self,
+        texts: List[str],
+        metadata: Optional[List[Dict]] = None,
+        identity: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """增量索引一篇文档
+
+        已入库的同一文档 (按 doc_id / DOI / 标题匹配) 只向量化新增或改动的块，
+        删除新版本中已不存在的块，避免重复入库。
+
+        Args:
+            texts: 文档的全部分块
+            metadata: 各块的元数据
+            identity: services.incremental_index.document_identity() 的结果
+
+        Returns:
+            统计信息 (reused / embedded / deleted 等，见 sync_document)
+        """
+        report = sync_document(
+            self.collection,
+            lambda ids, chunks, metas: self.add_texts(chunks, metas, ids=ids),
+            texts,
+            metadata,
+            identity
         )
-
-        print(f"✅ 成功添加 {len(texts)} 个向量")
-
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """语义搜索"""
+        print(f"🔁 文档 '{report['doc_id']}': {format_report(report)}")
+        return report
+
+    def index_stream(self, chunks: Iterable[Tuple[str, Dict]], identity: Dict[str, str]) -> Dict:
+        """流水线式增量索引一篇文档
+
+        与 index_document 相同的增量规则，但分块、向量化、写入三个阶段并行:
+        chunks 可以是分块生成器，新块凑满一批即开始向量化，向量化完的批次随即写入。
+
+        Args:
+            chunks: (文本, 元数据) 的可迭代对象
+            identity: services.incremental_index.document_identity() 的结果
+
+        Returns:
+            统计信息 (同 index_document)，另有 stages (各阶段吞吐)
+        """
+        embed = self.collection.embed_function(self.embedding_service.embed)
+        loader = BulkLoader(self.client, self.collection, embed)
+        report = sync_document_stream(self.collection, loader.load_stream, chunks, identity)
+        print(f"🔁 文档 '{report['doc_id']}': {format_report(report)}")
+        return report
+
+    def search(self, query: str, top_k: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """语义搜索 (where 为元数据等值过滤，如 {"chunk_type": "table"})"""
         if self.collection.count() == 0:
             return []
 
-        # 查询向量化
-        query_vector = self.embedding_service.embed(query)
+        # 查询向量化 (使用当前版本的模型)
+        query_vector = self.collection.embed_function(self.embedding_service.embed)(query)
 
         # ChromaDB 搜索
         results = self.collection.query(
             query_embeddings=[query_vector.tolist()],
-            n_results=min(top_k, self.collection.count())
+            n_results=min(top_k, self.collection.count()),
+            where=chroma_where(where)
         )
 
         # 构建结果
@@ -106,9 +147,5 @@ class VectorStore:
 
     def reset(self):
         """清空集合"""
-        self.client.delete_collection("documents")
-        self.collection = self.client.create_collection(
-            name="documents",
-            metadata={"dimension": self.dimension}
-        )
+        self.collection.reset()
         print("🗑️ 向量库已清空")
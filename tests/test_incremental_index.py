@@ -0,0 +1,90 @@
+"""
+services.incremental_index 的文档匹配
+"""
+import uuid
+
+import chromadb
+import pytest
+
+from services.incremental_index import document_identity, normalize_title, sync_document
+
+SHARED_HEADER = "Published as a conference paper at ICLR 2024"
+
+
+@pytest.fixture
+def collection():
+    client = chromadb.EphemeralClient()
+    return client.create_collection(f"docs_{uuid.uuid4().hex[:8]}")
+
+
+def _write(collection):
+    def write(ids, texts, metadatas):
+        collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=[[0.0, 1.0]] * len(ids))
+        return {"written": len(ids)}
+    return write
+
+
+def _ingest(collection, doc_id, texts, title=None, doi=None):
+    markdown = f"# {SHARED_HEADER}\n\n"
+    if title:
+        markdown += f"# {title}\n\n"
+    if doi:
+        markdown += f"doi: {doi}\n\n"
+    markdown += "\n\n".join(texts)
+    identity = document_identity(doc_id=doc_id, markdown=markdown)
+    return sync_document(collection, _write(collection), texts, [{} for _ in texts], identity)
+
+
+def test_conference_header_is_not_a_title():
+    assert normalize_title(SHARED_HEADER) == ""
+    identity = document_identity(markdown=f"# {SHARED_HEADER}\n\n# Attention Is All You Need\n\nbody")
+    assert identity["title_key"] == "attention is all you need"
+
+
+def test_shared_header_different_doc_id_kept_apart(collection):
+    _ingest(collection, "http://x/A.pdf", ["paper A introduction"])
+    report = _ingest(collection, "http://x/B.pdf", ["paper B introduction", "paper B method"])
+
+    assert report["doc_id"] == "http://x/B.pdf"
+    assert report["matched_by"] is None
+    assert report["deleted"] == 0
+
+    a = collection.get(where={"doc_id": "http://x/A.pdf"})
+    b = collection.get(where={"doc_id": "http://x/B.pdf"})
+    assert a["documents"] == ["paper A introduction"]
+    assert sorted(b["documents"]) == ["paper B introduction", "paper B method"]
+
+
+def test_shared_header_different_titles_without_doc_id(collection):
+    first = _ingest(collection, None, ["paper A introduction"], title="Scaling Laws for Retrieval")
+    second = _ingest(collection, None, ["paper B introduction"], title="Sparse Mixture of Experts")
+
+    assert second["matched_by"] is None
+    assert second["doc_id"] != first["doc_id"]
+    assert second["deleted"] == 0
+
+
+def test_same_doc_id_reindexed_incrementally(collection):
+    _ingest(collection, "http://x/A.pdf", ["unchanged chunk", "old chunk"])
+    report = _ingest(collection, "http://x/A.pdf", ["unchanged chunk", "new chunk"])
+
+    assert report["matched_by"] == "doc_id"
+    assert (report["reused"], report["embedded"], report["deleted"]) == (1, 1, 1)
+
+
+def test_revision_matched_by_title_without_doc_id(collection):
+    first = _ingest(collection, None, ["chunk one"], title="Scaling Laws for Retrieval")
+    second = _ingest(collection, None, ["chunk one", "chunk two"], title="Scaling Laws for Retrieval")
+
+    assert second["matched_by"] == "title_key"
+    assert second["doc_id"] == first["doc_id"]
+    assert second["reused"] == 1
+
+
+def test_doc_id_miss_falls_back_to_doi(collection):
+    _ingest(collection, "http://x/v1.pdf", ["chunk one"], doi="10.1234/abcd.5678")
+    report = _ingest(collection, "http://x/v2.pdf", ["chunk one", "chunk two"], doi="10.1234/abcd.5678")
+
+    assert report["matched_by"] == "doi"
+    assert report["doc_id"] == "http://x/v1.pdf"
+    assert report["reused"] == 1
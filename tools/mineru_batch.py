@@ -4,39 +4,49 @@ MVP实现：简化版批量PDF处理功能
 """
 import os
 import json
-import time
 from pathlib import Path
 from typing import List, Dict, Optional
-import zipfile
-import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from services import mineru_archive, http_client
+from services.parse_cache import get_parse_cache, file_sha256
+from services.mineru_journal import ParseJournal, DONE, UPLOADED
+from services.mineru_poller import get_poller
+
 # ====================== 批量处理配置 ======================
-MAX_WORKERS = 2  # 并发处理数量
-MAX_RETRY = 60  # 最大重试次数
-RETRY_INTERVAL = 10  # 重试间隔(秒)
+MAX_WORKERS = 2  # 同时进行的批次数
+BATCH_SIZE = 50  # 每批文件数 (一次申请上传URL、一个轮询循环)
+UPLOAD_WORKERS = 4  # 每批并发上传数
+MAX_RETRY = 60  # 最长等待 MAX_RETRY * RETRY_INTERVAL 秒
+RETRY_INTERVAL = 10
 SAVE_DIR = "/data/parse_results"  # 结果保存目录
+JOURNAL_PATH = os.path.join(SAVE_DIR, "mineru_journal.db")  # 任务日志 (中断后续跑)
 
 # 确保保存目录存在
 os.makedirs(SAVE_DIR, exist_ok=True)
 
 # ====================== 核心功能函数 ======================
 
-def apply_upload_url(token: str, filename: str) -> Optional[tuple]:
-    """申请临时上传URL"""
+def apply_upload_urls(token: str, filenames: List[str]) -> Optional[tuple]:
+    """为一批文件申请临时上传URL
+
+    :return: (batch_id, 与 filenames 一一对应的上传URL列表, 各文件的 data_id)，失败时为 None
+    """
     url = "https://mineru.net/api/v4/file-urls/batch"
     headers = {"Authorization": f"Bearer {token}"}
+    # data_id 在批内唯一，用于把结果对应回文件 (同名文件也不会混淆)
+    data_ids = [f"f{i}" for i in range(len(filenames))]
     data = {
-        "files": [{"name": filename}],
+        "files": [{"name": name, "data_id": data_id} for name, data_id in zip(filenames, data_ids)],
         "model_version": "vlm"
     }
 
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = http_client.post(url, headers=headers, json=data)
         result = response.json()
 
         if result["code"] == 0:
-            return result["data"]["batch_id"], result["data"]["file_urls"][0]
+            return result["data"]["batch_id"], result["data"]["file_urls"], data_ids
         else:
             print(f"❌ 申请URL失败: {result['msg']}")
             return None
@@ -44,178 +54,325 @@ def apply_upload_url(token: str, filename: str) -> Optional[tuple]:
         print(f"❌ 申请URL异常: {str(e)}")
         return None
 
+def apply_upload_url(token: str, filename: str) -> Optional[tuple]:
+    """申请单个文件的临时上传URL"""
+    batch_info = apply_upload_urls(token, [filename])
+    if not batch_info:
+        return None
+    batch_id, upload_urls, _ = batch_info
+    return batch_id, upload_urls[0]
+
 def upload_pdf(upload_url: str, pdf_path: str) -> bool:
     """通过PUT方式上传PDF"""
     try:
         with open(pdf_path, "rb") as f:
-            response = requests.put(upload_url, data=f, timeout=60)
+            response = http_client.put(upload_url, data=f, timeout=http_client.transfer_timeout())
         return response.status_code in (200, 201)
     except Exception as e:
         print(f"❌ 上传异常: {str(e)}")
         return False
 
-def poll_result(token: str, batch_id: str, filename: str) -> Optional[str]:
-    """轮询解析结果"""
-    query_url = f"https://mineru.net/api/v4/extract-results/batch/{batch_id}"
+def save_markdown(full_zip_url: str, zip_save_path: str, filename: str) -> Optional[str]:
+    """下载结果压缩包并把 MD 文件保存为 SAVE_DIR/<PDF名>.md"""
+    # 流式下载压缩包到磁盘，只解压 MD 文件 (图片留在压缩包中按需读取)
+    print(f"\n✅ 解析完成！开始下载压缩包：{full_zip_url[:60]}...")
+    mineru_archive.download(full_zip_url, Path(zip_save_path), mineru_archive.print_progress())
+    print(f"✅ 压缩包下载完成：{zip_save_path}")
+
+    pdf_name = os.path.splitext(filename)[0]
+    md_file_path = os.path.join(SAVE_DIR, f"{pdf_name}.md")
+    with mineru_archive.MineruArchive(zip_save_path) as archive:
+        markdown = archive.markdown()
+        if not markdown:
+            print(f"❌ 压缩包中未找到MD文件，成员列表：{archive.names()}")
+            return None
 
-    for retry in range(MAX_RETRY):
-        try:
-            # 查询状态
-            response = requests.get(query_url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
-            response.raise_for_status()  # 捕获HTTP错误（4xx/5xx）
-            result = response.json()
-
-            # 校验接口返回码
-            if result["code"] != 0:
-                print(f"❌ 第{retry+1}次查询失败：{result['msg']}")
-                time.sleep(RETRY_INTERVAL)
-                continue
+    with open(md_file_path, "w", encoding="utf-8") as f:
+        f.write(markdown)
+    print(f"✅ MD文件提取成功！路径：{md_file_path}")
+    print(f"\n📝 MD文件内容预览：\n{markdown[:200]}...")
+    return md_file_path
 
-            # 提取核心字段（严格匹配接口返回结构）
-            extract_result = result["data"]["extract_result"]
-            if not extract_result:
-                print(f"❌ 第{retry+1}次查询：extract_result为空")
-                time.sleep(RETRY_INTERVAL)
-                continue
+def result_zip_path(batch_id: str, data_id: str) -> str:
+    return os.path.join(SAVE_DIR, f"{batch_id}_{data_id}.zip")
 
-            task_info = extract_result[0]
-            task_state = task_info["state"]
-            task_err_msg = task_info.get("err_msg", "")
-            full_zip_url = task_info.get("full_zip_url", "")
-
-            # 打印关键日志（便于排查）
-            zip_url_preview = full_zip_url[:60] if full_zip_url else "空"
-            print(f"📌 第{retry+1}/{MAX_RETRY}次查询 | 状态：{task_state} | ZIP链接：{zip_url_preview} | 错误：{task_err_msg}")
-
-            # 状态判断逻辑
-            if task_state == "done":
-                if full_zip_url:
-                    # 下载压缩包
-                    zip_save_path = os.path.join(SAVE_DIR, f"{batch_id}.zip")
-                    print(f"\n✅ 解析完成！开始下载压缩包：{full_zip_url[:60]}...")
-                    zip_response = requests.get(full_zip_url, timeout=60)
-                    zip_response.raise_for_status()
-                    with open(zip_save_path, "wb") as f:
-                        f.write(zip_response.content)
-                    print(f"✅ 压缩包下载完成：{zip_save_path}")
-
-                    # 解压并提取MD文件
-                    pdf_name = os.path.splitext(filename)[0]
-                    md_filename = f"{pdf_name}.md"
-                    with ZipFile(zip_save_path, "r") as zf:
-                        zf.extractall(SAVE_DIR)
-
-                    # 验证MD文件
-                    md_file_path = os.path.join(SAVE_DIR, md_filename)
-                    if os.path.exists(md_file_path):
-                        print(f"✅ MD文件提取成功！路径：{md_file_path}")
-                        # 预览MD文件前200字符
-                        with open(md_file_path, "r", encoding="utf-8") as f:
-                            preview = f.read(200)
-                            print(f"\n📝 MD文件内容预览：\n{preview}...")
-                        return md_file_path
-                    else:
-                        print(f"❌ 解压成功但未找到MD文件：{md_filename}")
-                        # 列出解压后的文件，便于排查
-                        extracted_files = os.listdir(SAVE_DIR)
-                        print(f"📂 解压后的文件列表：{extracted_files}")
-                        return None
-                else:
-                    print(f"⚠️ 状态为done，但full_zip_url为空，终止轮询")
-                    return None
-            elif task_state == "failed":
-                print(f"❌ 解析任务失败：{task_err_msg}")
-                return None
-            else:
-                # 任务仍在处理中（pending/running/converting）
-                time.sleep(RETRY_INTERVAL)
+def poll_batch(
+    token: str,
+    batch_id: str,
+    files: Dict[str, str],
+    timed_out: Optional[set] = None
+) -> Dict[str, Optional[str]]:
+    """等待一批文件的解析结果，每个文件完成后立即下载
 
+    查询由共用的轮询协调器统一进行 (所有批次共用一个轮询循环，间隔按解析进度自适应)
+
+    :param files: {data_id: 文件名}
+    :param timed_out: 收集轮询超时 (可能仍在解析) 的 data_id (可选)
+    :return: {data_id: MD文件路径，失败为 None}
+    """
+    futures = get_poller().watch_batch(batch_id, token, files, timeout=MAX_RETRY * RETRY_INTERVAL)
+    data_ids = {future: data_id for data_id, future in futures.items()}
+    settled: Dict[str, Optional[str]] = {}
+
+    for future in as_completed(data_ids):
+        data_id = data_ids[future]
+        filename = files[data_id]
+        try:
+            task_info = future.result()
+        except TimeoutError:
+            print(f"❌ {filename} 轮询超时，请手动查询：https://mineru.net/api/v4/extract-results/batch/{batch_id}")
+            settled[data_id] = None
+            if timed_out is not None:
+                timed_out.add(data_id)
+            continue
         except Exception as e:
-            print(f"❌ 第{retry+1}次查询异常：{str(e)}")
-            time.sleep(RETRY_INTERVAL)
+            print(f"❌ {filename} 解析任务失败：{str(e)}")
+            settled[data_id] = None
+            continue
+
+        full_zip_url = task_info.get("full_zip_url", "")
+        if not full_zip_url:
+            print(f"⚠️ {filename} 状态为done，但full_zip_url为空")
+            settled[data_id] = None
+            continue
+        try:
+            settled[data_id] = save_markdown(full_zip_url, result_zip_path(batch_id, data_id), filename)
+        except Exception as e:
+            print(f"❌ {filename} 结果下载失败：{str(e)}")
+            settled[data_id] = None
+        print(f"📌 批次 {batch_id} | 已完成 {len(settled)}/{len(files)}")
 
-    # 轮询超时
-    print(f"\n❌ 轮询超时（已重试{MAX_RETRY}次），请手动查询：")
-    print(f"手动查询URL：{query_url}")
-    return None
+    return settled
 
-def process_single_pdf(pdf_path: str, token: str) -> Dict:
+def poll_result(token: str, batch_id: str, filename: str) -> Optional[str]:
+    """轮询单文件批次的解析结果"""
+    return poll_batch(token, batch_id, {"f0": filename})["f0"]
+
+def load_result(md_path: str, zip_path: str) -> Dict:
+    """从压缩包读取解析结果 (与 PDFService.parse 的结果格式一致)"""
+    if os.path.exists(zip_path):
+        with mineru_archive.MineruArchive(zip_path) as archive:
+            return archive.result()
+
+    with open(md_path, "r", encoding="utf-8") as f:
+        return {"markdown": f.read(), "content_list": [], "tables": [], "images": []}
+
+def _succeed(result: Dict, md_path: str, note: str = ""):
+    result["success"] = True
+    result["result"] = md_path
+    print(f"✅ 解析完成{note}: {md_path}")
+
+def _await_members(token: str, batch_id: str, members: List[tuple], journal: Optional[ParseJournal] = None):
     """
-    处理单个PDF文件
-    :param pdf_path: PDF文件路径
+    等待批内已上传文件的解析结果，并写入结果、解析缓存与任务日志
+    :param members: [(结果字典, 内容哈希, 缓存键, data_id)]
+    """
+    files = {data_id: os.path.basename(result["pdf_path"]) for result, _, _, data_id in members}
+    cache = get_parse_cache()
+    timed_out = set()
+
+    print(f"⏳ 等待解析完成...")
+    md_paths = poll_batch(token, batch_id, files, timed_out)
+
+    for result, sha256, cache_key, data_id in members:
+        md_path = md_paths.get(data_id)
+        if md_path:
+            _succeed(result, md_path)
+            if cache_key:
+                cache.put(cache_key, load_result(md_path, result_zip_path(batch_id, data_id)),
+                          source=result["pdf_path"])
+            if journal:
+                journal.mark_done(result["pdf_path"], sha256, md_path)
+        elif data_id in timed_out:
+            # 仍在解析: 日志保持 uploaded，下次运行按 batch_id 重新接上
+            result["result"] = f"轮询超时 (批次 {batch_id})"
+        else:
+            result["result"] = "解析失败"
+            if journal:
+                journal.mark_failed(result["pdf_path"], sha256, result["result"])
+
+def process_pdf_group(pdf_paths: List[str], token: str, journal: Optional[ParseJournal] = None) -> List[Dict]:
+    """
+    作为一个 MinerU 批次处理一组PDF：一次申请全部上传URL，并发上传，一个轮询循环跟踪全部文件
+    :param pdf_paths: PDF文件路径列表 (不超过 BATCH_SIZE)
     :param token: MinerU API Token
-    :return: 处理结果字典 {文件路径, 成功状态, 结果路径/错误信息}
+    :param journal: 任务日志，记录每个文件的批次与状态 (可选)
+    :return: 与 pdf_paths 一一对应的处理结果字典 {文件路径, 成功状态, 结果路径/错误信息}
     """
-    result = {
-        "pdf_path": pdf_path,
-        "success": False,
-        "result": None
-    }
+    results = [{"pdf_path": pdf_path, "success": False, "result": None} for pdf_path in pdf_paths]
+
+    # 0. 解析过的 PDF (内容哈希相同) 直接使用缓存结果，不再上传
+    cache = get_parse_cache()
+    pending = []  # (结果, 内容哈希, 缓存键)
+    for result in results:
+        pdf_path = result["pdf_path"]
+        if not os.path.exists(pdf_path):
+            result["result"] = f"文件不存在: {pdf_path}"
+            continue
+        try:
+            sha256 = file_sha256(pdf_path) if (cache.enabled or journal) else None
+            cache_key = cache.key_for_sha256(sha256, "upload:vlm") if cache.enabled else None
+            cached = cache.get(cache_key) if cache_key else None
+        except Exception as e:
+            result["result"] = f"处理异常: {str(e)}"
+            continue
+        if cached is not None:
+            md_path = os.path.join(SAVE_DIR, f"{os.path.splitext(os.path.basename(pdf_path))[0]}.md")
+            with open(md_path, "w", encoding="utf-8") as f:
+                f.write(cached.get("markdown", ""))
+            _succeed(result, md_path, " (缓存)")
+            if journal:
+                journal.mark_done(pdf_path, sha256, md_path)
+        else:
+            pending.append((result, sha256, cache_key))
 
-    if not os.path.exists(pdf_path):
-        result["result"] = f"文件不存在: {pdf_path}"
-        return result
+    if not pending:
+        return results
 
-    filename = os.path.basename(pdf_path)
+    def fail(result: Dict, sha256: Optional[str], error: str):
+        result["result"] = error
+        if journal:
+            journal.mark_failed(result["pdf_path"], sha256, error)
+
+    filenames = [os.path.basename(result["pdf_path"]) for result, _, _ in pending]
     print(f"\n{'='*60}")
-    print(f"处理文件: {filename}")
+    print(f"处理批次: {len(filenames)} 个文件 ({', '.join(filenames[:3])}{' ...' if len(filenames) > 3 else ''})")
     print(f"{'='*60}")
 
     try:
-        # 1. 申请临时上传URL
+        # 1. 一次申请全部临时上传URL
         print(f"📤 申请上传URL...")
-        batch_info = apply_upload_url(token, filename)
+        batch_info = apply_upload_urls(token, filenames)
         if not batch_info:
-            result["result"] = "申请上传URL失败"
-            return result
-
-        batch_id, upload_url = batch_info
+            for result, sha256, _ in pending:
+                fail(result, sha256, "申请上传URL失败")
+            return results
+
+        batch_id, upload_urls, data_ids = batch_info
+
+        # 2. 并发上传，上传成功即记入日志 (中断后可按 batch_id 重新接上)
+        print(f"📤 上传 {len(pending)} 个文件...")
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as uploader:
+            uploaded = list(uploader.map(
+                upload_pdf, upload_urls, [result["pdf_path"] for result, _, _ in pending]
+            ))
+
+        members = []
+        for (result, sha256, cache_key), data_id, ok in zip(pending, data_ids, uploaded):
+            if ok:
+                members.append((result, sha256, cache_key, data_id))
+                if journal:
+                    journal.mark_uploaded(result["pdf_path"], sha256, batch_id, data_id)
+            else:
+                fail(result, sha256, "文件上传失败")
 
-        # 2. 上传文件
-        print(f"📤 上传文件...")
-        if not upload_pdf(upload_url, pdf_path):
-            result["result"] = "文件上传失败"
-            return result
+        # 3. 一个轮询循环跟踪批内全部文件
+        if members:
+            _await_members(token, batch_id, members, journal)
 
-        # 3. 轮询解析结果
-        print(f"⏳ 等待解析完成...")
-        md_path = poll_result(token, batch_id, filename)
+    except Exception as e:
+        for result, sha256, _ in pending:
+            if not result["success"] and result["result"] is None:
+                fail(result, sha256, f"处理异常: {str(e)}")
+        print(f"❌ 批次处理异常: {str(e)}")
 
-        if md_path:
-            result["success"] = True
-            result["result"] = md_path
-            print(f"✅ 解析完成: {md_path}")
-        else:
-            result["result"] = "解析失败"
+    return results
 
+def resume_batch(token: str, batch_id: str, entries: List[tuple], journal: ParseJournal) -> List[Dict]:
+    """
+    重新接上中断前已上传的批次：按原 batch_id / data_id 轮询，不重新上传
+    :param entries: [(PDF文件路径, 内容哈希, data_id)]
+    :return: 与 entries 一一对应的处理结果字典
+    """
+    cache = get_parse_cache()
+    results = []
+    members = []
+    for pdf_path, sha256, data_id in entries:
+        result = {"pdf_path": pdf_path, "success": False, "result": None}
+        results.append(result)
+        members.append((result, sha256, cache.key_for_sha256(sha256, "upload:vlm") if cache.enabled else None, data_id))
+
+    print(f"🔁 重新接上批次 {batch_id}: {len(entries)} 个文件")
+    try:
+        _await_members(token, batch_id, members, journal)
     except Exception as e:
-        result["result"] = f"处理异常: {str(e)}"
-        print(f"❌ {result['result']}")
+        for result, sha256, _, _ in members:
+            if not result["success"] and result["result"] is None:
+                result["result"] = f"处理异常: {str(e)}"
+                journal.mark_failed(result["pdf_path"], sha256, result["result"])
+        print(f"❌ 批次处理异常: {str(e)}")
+    return results
 
-    return result
+def process_single_pdf(pdf_path: str, token: str) -> Dict:
+    """
+    处理单个PDF文件
+    :param pdf_path: PDF文件路径
+    :param token: MinerU API Token
+    :return: 处理结果字典 {文件路径, 成功状态, 结果路径/错误信息}
+    """
+    return process_pdf_group([pdf_path], token)[0]
 
-def process_batch(pdf_paths: List[str], token: str) -> Dict:
+def process_batch(pdf_paths: List[str], token: str, journal: Optional[ParseJournal] = None) -> Dict:
     """
-    批量处理PDF文件
+    批量处理PDF文件：每 BATCH_SIZE 个文件组成一个 MinerU 批次，最多 MAX_WORKERS 个批次并行
     :param pdf_paths: PDF文件路径列表
     :param token: MinerU API Token
+    :param journal: 任务日志。给出时跳过已完成的文件，已上传未完成的文件重新接上原批次，
+                    其余 (失败、新增或内容有变化的) 文件重新提交
     :return: 处理结果字典 {文件路径: 结果}
     """
     results = {}
     success_count = 0
     fail_count = 0
 
-    print(f"📦 开始批量处理 {len(pdf_paths)} 个PDF文件")
+    todo = list(pdf_paths)
+    resumed: Dict[str, List[tuple]] = {}  # batch_id -> [(文件路径, 内容哈希, data_id)]
+    if journal:
+        todo = []
+        for pdf_path in pdf_paths:
+            entry = journal.get(pdf_path)
+            if entry is None or not os.path.exists(pdf_path):
+                todo.append(pdf_path)
+                continue
+            sha256 = file_sha256(pdf_path)
+            if entry["sha256"] != sha256:
+                todo.append(pdf_path)
+            elif entry["state"] == DONE and entry["result"] and os.path.exists(entry["result"]):
+                results[pdf_path] = entry["result"]
+                success_count += 1
+            elif entry["state"] == UPLOADED and entry["batch_id"]:
+                resumed.setdefault(entry["batch_id"], []).append((pdf_path, sha256, entry["data_id"]))
+            else:
+                todo.append(pdf_path)
 
-    # 使用线程池并行处理
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_pdf = {executor.submit(process_single_pdf, pdf_path, token): pdf_path
-                        for pdf_path in pdf_paths}
+        attached = sum(len(entries) for entries in resumed.values())
+        print(f"📒 任务日志: 跳过已完成 {success_count} 个，重新接上 {attached} 个 ({len(resumed)} 个批次)，"
+              f"待提交 {len(todo)} 个")
 
-        for future in as_completed(future_to_pdf):
-            pdf_path = future_to_pdf[future]
+    groups = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
+    print(f"📦 开始批量处理 {len(todo)} 个PDF文件 ({len(groups)} 个批次)")
+
+    # 使用线程池并行处理各批次 (重新接上的批次只轮询，不占上传)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        future_to_group = {}
+        for batch_id, entries in resumed.items():
+            future = executor.submit(resume_batch, token, batch_id, entries, journal)
+            future_to_group[future] = [pdf_path for pdf_path, _, _ in entries]
+        for group in groups:
+            future_to_group[executor.submit(process_pdf_group, group, token, journal)] = group
+
+        for future in as_completed(future_to_group):
+            group = future_to_group[future]
             try:
-                result = future.result()
+                group_results = future.result()
+            except Exception as e:
+                group_results = [
+                    {"pdf_path": pdf_path, "success": False, "result": f"处理异常: {str(e)}"}
+                    for pdf_path in group
+                ]
+
+            for result in group_results:
+                pdf_path = result["pdf_path"]
                 results[pdf_path] = result["result"]
 
                 if result["success"]:
@@ -225,11 +382,6 @@ def process_batch(pdf_paths: List[str], token: str) -> Dict:
                     fail_count += 1
                     print(f"❌ 失败: {os.path.basename(pdf_path)} - {result['result']}")
 
-            except Exception as e:
-                results[pdf_path] = f"处理异常: {str(e)}"
-                fail_count += 1
-                print(f"❌ 异常: {os.path.basename(pdf_path)} - {str(e)}")
-
     # 打印汇总
     print(f"\n{'='*60}")
     print("批量处理汇总:")
@@ -249,22 +401,27 @@ def get_pdf_files(directory: str) -> List[str]:
     pdf_files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.pdf')]
     return sorted(pdf_files)
 
-def process_directory(directory: str, token: str) -> Dict:
-    """处理目录中的所有PDF文件"""
+def process_directory(directory: str, token: str, resume: bool = True) -> Dict:
+    """
+    处理目录中的所有PDF文件
+    :param resume: 使用任务日志 (SAVE_DIR/mineru_journal.db)，中断后重新运行时从上次的进度继续
+    """
     pdf_files = get_pdf_files(directory)
     if not pdf_files:
         print(f"❌ 目录中没有PDF文件: {directory}")
         return {}
 
-    return process_batch(pdf_files, token)
+    journal = ParseJournal(JOURNAL_PATH) if resume else None
+    return process_batch(pdf_files, token, journal)
 
 # ====================== 主函数 ======================
 if __name__ == "__main__":
     # 示例：处理目录中的所有PDF
     import sys
-    if len(sys.argv) > 1:
-        directory = sys.argv[1]
+    args = [arg for arg in sys.argv[1:] if arg != "--no-resume"]
+    if args:
+        directory = args[0]
         token = os.getenv("MINERU_API_TOKEN", "your_token_here")
-        process_directory(directory, token)
+        process_directory(directory, token, resume="--no-resume" not in sys.argv)
     else:
-        print("用法: python mineru_batch.py <PDF目录路径>")
\ No newline at end of file
+        print("用法: python mineru_batch.py <PDF目录路径> [--no-resume]")
\ No newline at end of file
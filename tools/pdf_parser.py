@@ -4,24 +4,101 @@ PDF解析工具 - 使用MinerU
 import os
 import json
 from pathlib import Path
-from typing import Dict, List, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from magic_pdf.pipe.UNIPipe import UNIPipe
 
+# 并行解析时每个页段输出到 <输出目录>/<PDF名>/<页段目录>，图片路径加上页段目录前缀，不同页段互不覆盖
+_RANGE_DIR = "pages_{start:04d}_{end:04d}"
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """PDF 页数 (PyMuPDF，MinerU 的依赖)"""
+    try:
+        import pymupdf as fitz
+    except ImportError:  # PyMuPDF < 1.24 只提供 fitz
+        import fitz
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def page_ranges(num_pages: int, pages_per_range: int) -> List[Tuple[int, int]]:
+    """把 [0, num_pages) 切分为不超过 pages_per_range 页的左闭右开页段"""
+    return [(start, min(start + pages_per_range, num_pages)) for start in range(0, num_pages, pages_per_range)]
+
+
+def _run_pipe(pdf_bytes: bytes, pdf_path: str, image_dir: Path, start: int = 0, end: Optional[int] = None) -> List[Dict]:
+    """用 MinerU 解析 [start, end) 页 (end 为 None 表示到最后一页)，返回 content_list"""
+    pipe = UNIPipe(
+        pdf_bytes, {"_pdf_type": ""}, "auto",
+        start_page_id=start, end_page_id=None if end is None else end - 1
+    )
+
+    # 执行解析
+    pipe.pipe_classify()
+    pipe.pipe_analyze()
+    pipe.pipe_parse()
+
+    # 获取结果
+    content_list = pipe.pipe_mk_uni_format(pdf_path, str(image_dir))
+    return content_list if isinstance(content_list, list) else []
+
+
+def _parse_range(pdf_path: str, start: int, end: int, output_subdir: str) -> List[Dict]:
+    """在工作进程中解析一个页段: 页码换算为全文页码，图片路径加上页段目录前缀"""
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    range_name = _RANGE_DIR.format(start=start, end=end - 1)
+    range_dir = Path(output_subdir) / range_name
+    range_dir.mkdir(parents=True, exist_ok=True)
+
+    content_list = _run_pipe(pdf_bytes, pdf_path, range_dir, start, end)
+    for content in content_list:
+        if not isinstance(content, dict):
+            continue
+        page = content.get("page_idx")
+        if not isinstance(page, int) or not start <= page < end:
+            content["page_idx"] = (page if isinstance(page, int) else 0) + start
+        for key in ("img_path", "path"):
+            if content.get(key) and not os.path.isabs(content[key]):
+                content[key] = f"{range_name}/{content[key]}"
+    return content_list
+
+
 class PDFParser:
     """PDF解析器，使用MinerU提取文字、图片、公式、表格"""
 
-    def __init__(self, output_dir: str = "./data/processed"):
+    def __init__(
+        self,
+        output_dir: str = "./data/processed",
+        workers: Optional[int] = None,
+        pages_per_range: Optional[int] = None,
+        min_pages: Optional[int] = None
+    ):
         """初始化PDF解析器
 
         Args:
             output_dir: 输出目录
+            workers: 并行解析的进程数，默认读取 pdf_parser.local.workers (未配置时为 CPU 核数)，1 表示不并行
+            pages_per_range: 每个页段的页数，默认读取 pdf_parser.local.pages_per_range
+            min_pages: 达到该页数才切分并行解析，默认读取 pdf_parser.local.min_pages
         """
+        from config import get_config
+        config = get_config()
+
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or config.get('pdf_parser.local.workers') or os.cpu_count() or 1
+        self.pages_per_range = pages_per_range or config.get('pdf_parser.local.pages_per_range', 20)
+        self.min_pages = min_pages or config.get('pdf_parser.local.min_pages', 40)
 
     def parse(self, pdf_path: str) -> Dict[str, Any]:
         """解析PDF文件
 
+        页数达到 min_pages 时按 pages_per_range 切分页段，在多个进程中并行解析，
+        再按页码顺序合并 content_list
+
         Args:
             pdf_path: PDF文件路径
 
@@ -31,6 +108,7 @@ class PDFParser:
                 "images": ["图片1路径", "图片2路径"],
                 "tables": ["表格1 HTML", "表格2 HTML"],
                 "formulas": ["公式1 LaTeX", "公式2 LaTeX"],
+                "content_list": [...],
                 "metadata": {...}
             }
         """
@@ -48,51 +126,22 @@ class PDFParser:
 
         # 初始化MinerU
         try:
-            pipe = UNIPipe(pdf_bytes, {"_pdf_type": ""}, "auto")
-
-            # 执行解析
-            pipe.pipe_classify()
-            pipe.pipe_analyze()
-            pipe.pipe_parse()
-
-            # 获取结果
-            content_list = pipe.pipe_mk_uni_format(
-                str(pdf_path),
-                str(output_subdir)
-            )
+            ranges = []
+            if self.workers > 1:
+                num_pages = count_pages(pdf_bytes)
+                if num_pages >= self.min_pages:
+                    ranges = page_ranges(num_pages, self.pages_per_range)
+
+            if len(ranges) > 1:
+                content_list = self._parse_parallel(pdf_path, output_subdir, ranges)
+            else:
+                content_list = _run_pipe(pdf_bytes, str(pdf_path), output_subdir)
+            del pdf_bytes
 
             # 整理结果
-            result = {
-                "text": "",
-                "images": [],
-                "tables": [],
-                "formulas": [],
-                "metadata": {
-                    "filename": pdf_path.name,
-                    "pages": len(content_list) if isinstance(content_list, list) else 0
-                }
-            }
-
-            # 解析内容
-            if isinstance(content_list, list):
-                for content in content_list:
-                    if isinstance(content, dict):
-                        content_type = content.get("type", "")
-
-                        if content_type == "text":
-                            result["text"] += content.get("text", "") + "\n"
-                        elif content_type == "image":
-                            image_path = content.get("path", "")
-                            if image_path:
-                                result["images"].append(image_path)
-                        elif content_type == "table":
-                            table_html = content.get("html", "")
-                            if table_html:
-                                result["tables"].append(table_html)
-                        elif content_type == "formula":
-                            formula_latex = content.get("latex", "")
-                            if formula_latex:
-                                result["formulas"].append(formula_latex)
+            result = self._collect(content_list, pdf_path)
+            if len(ranges) > 1:
+                result["metadata"]["page_ranges"] = len(ranges)
 
             # 保存结果到JSON
             result_file = output_subdir / "parsed_result.json"
@@ -106,9 +155,69 @@ class PDFParser:
             print(f"MinerU解析失败: {e}, 使用备用方案")
             return self._fallback_parse(pdf_path)
 
+    def _parse_parallel(self, pdf_path: Path, output_subdir: Path, ranges: List[Tuple[int, int]]) -> List[Dict]:
+        """各页段在独立进程中解析，按页段顺序 (即页码顺序) 合并 content_list"""
+        workers = min(self.workers, len(ranges))
+        print(f"📄 {pdf_path.name}: {ranges[-1][1]} 页，切分为 {len(ranges)} 个页段，{workers} 个进程并行解析")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_parse_range, str(pdf_path), start, end, str(output_subdir))
+                for start, end in ranges
+            ]
+            parts = [future.result() for future in futures]
+
+        content_list = []
+        for part in parts:
+            content_list.extend(part)
+        # 页段内保持 MinerU 的阅读顺序，页段之间按页码排序 (sorted 是稳定排序)
+        content_list.sort(key=lambda content: content.get("page_idx", 0) if isinstance(content, dict) else 0)
+        return content_list
+
+    def _collect(self, content_list: List[Dict], pdf_path: Path) -> Dict[str, Any]:
+        """把 content_list 整理为文字、图片、表格、公式"""
+        result = {
+            "text": "",
+            "images": [],
+            "tables": [],
+            "formulas": [],
+            "content_list": content_list,
+            "metadata": {
+                "filename": pdf_path.name,
+                "pages": len(content_list)
+            }
+        }
+
+        # 解析内容
+        texts = []
+        for content in content_list:
+            if isinstance(content, dict):
+                content_type = content.get("type", "")
+
+                if content_type == "text":
+                    texts.append(content.get("text", "") + "\n")
+                elif content_type == "image":
+                    image_path = content.get("path", "")
+                    if image_path:
+                        result["images"].append(image_path)
+                elif content_type == "table":
+                    table_html = content.get("html", "")
+                    if table_html:
+                        result["tables"].append(table_html)
+                elif content_type == "formula":
+                    formula_latex = content.get("latex", "")
+                    if formula_latex:
+                        result["formulas"].append(formula_latex)
+
+        result["text"] = "".join(texts)
+        return result
+
     def _fallback_parse(self, pdf_path: Path) -> Dict[str, Any]:
         """备用PDF解析方案 - 使用pdfplumber
 
+        页数达到 min_pages 时按 pages_per_range 切分页段，各进程各自打开文件处理一段，
+        结果按页码顺序流回后一次性拼接
+
         Args:
             pdf_path: PDF文件路径
 
@@ -130,20 +239,24 @@ class PDFParser:
             }
 
             with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    # 提取文字
-                    text = page.extract_text()
-                    if text:
-                        result["text"] += text + "\n"
-
-                    # 提取表格
-                    tables = page.extract_tables()
-                    for table in tables:
-                        if table:
-                            # 转换为HTML
-                            html = self._table_to_html(table)
-                            result["tables"].append(html)
-
+                num_pages = len(pdf.pages)
+
+            ranges = page_ranges(num_pages, self.pages_per_range)
+            texts = []
+            if self.workers > 1 and num_pages >= self.min_pages and len(ranges) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(ranges))) as executor:
+                    # map 按提交顺序返回，页段完成即取回，无需等全部完成
+                    parts = executor.map(_extract_pages, [str(pdf_path)] * len(ranges), *zip(*ranges))
+                    for text, tables in parts:
+                        texts.append(text)
+                        result["tables"].extend(tables)
+                result["metadata"]["page_ranges"] = len(ranges)
+            else:
+                text, tables = _extract_pages(str(pdf_path), 0, num_pages)
+                texts.append(text)
+                result["tables"].extend(tables)
+
+            result["text"] = "".join(texts)
             return result
 
         except Exception as e:
@@ -168,20 +281,51 @@ class PDFParser:
         Returns:
             HTML字符串
         """
-        html = "<table border='1'>\n"
+        return table_to_html(table)
+
+
+def table_to_html(table: List[List[str]]) -> str:
+    """将表格转换为HTML"""
+    lines = ["<table border='1'>"]
+
+    for i, row in enumerate(table):
+        lines.append("  <tr>")
+        tag = "th" if i == 0 else "td"
+
+        for cell in row:
+            cell_text = cell if cell else ""
+            lines.append(f"    <{tag}>{cell_text}</{tag}>")
+
+        lines.append("  </tr>")
+
+    lines.append("</table>")
+    return "\n".join(lines)
+
+
+def _extract_pages(pdf_path: str, start: int, end: int) -> Tuple[str, List[str]]:
+    """用 pdfplumber 提取 [start, end) 页的文字与表格 (在工作进程中运行)
+
+    每页处理完立即 close()，释放该页解析出的字符、线条等对象，内存占用不随页数增长
+    """
+    import pdfplumber
 
-        for i, row in enumerate(table):
-            html += "  <tr>\n"
-            tag = "th" if i == 0 else "td"
+    texts = []
+    tables_html = []
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, end + 1))) as pdf:
+        for page in pdf.pages:
+            # 提取文字
+            text = page.extract_text()
+            if text:
+                texts.append(text + "\n")
 
-            for cell in row:
-                cell_text = cell if cell else ""
-                html += f"    <{tag}>{cell_text}</{tag}>\n"
+            # 提取表格
+            for table in page.extract_tables():
+                if table:
+                    tables_html.append(table_to_html(table))
 
-            html += "  </tr>\n"
+            page.close()
 
-        html += "</table>"
-        return html
+    return "".join(texts), tables_html
 
 # 测试代码
 if __name__ == "__main__":
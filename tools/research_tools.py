@@ -4,7 +4,9 @@ SciResearcher Tools - 基于 smolagents 的工具集
 """
 from smolagents import tool
 import json
+import time
 from pathlib import Path
+from typing import Optional
 
 # 导入服务模块
 import sys
@@ -12,9 +14,14 @@ sys.path.append(str(Path(__file__).parent.parent))
 from services import (
     PDFService,
     EmbeddingService,
-    VectorStore
+    VectorStore,
+    VectorStoreCoordinator
 )
 from services.vision_service import VisionService
+from services.asset_store import get_asset_store
+from config import get_config
+from tools.text_chunker import chunk_text, chunk_content_list, iter_chunks
+from services.incremental_index import document_identity, format_report
 
 # ============================================================================
 # 全局服务实例初始化
@@ -29,8 +36,16 @@ embedding_service = EmbeddingService(
     dimension=1536
 )
 
-# 向量存储服务
-vector_service = VectorStore(embedding_service=embedding_service)
+# 向量存储服务 (配置了 vector_db.nodes 时使用多节点协调器)
+_index_nodes = get_config().get('vector_db.nodes') or []
+if _index_nodes:
+    vector_service = VectorStoreCoordinator(
+        embedding_service=embedding_service,
+        nodes=_index_nodes,
+        replicas=get_config().get('vector_db.virtual_nodes', 64)
+    )
+else:
+    vector_service = VectorStore(embedding_service=embedding_service)
 
 # Qwen-VL 视觉服务
 vision_service = VisionService(model_name="qwen-vl-max")
@@ -59,13 +74,13 @@ def parse_pdf_with_mineru(pdf_url: str, model_version: str = "vlm") -> str:
 
 
 @tool
-def index_documents(text: str, chunk_size: int = 500, source: str = "unknown") -> str:
+def index_documents(text: str, chunk_size: Optional[int] = None, source: str = "unknown") -> str:
     """
     Index text chunks using Qwen3 Embedding.
 
     Args:
         text: Text to index
-        chunk_size: Chunk size
+        chunk_size: Maximum tokens per chunk (defaults to retrieval.chunk_size)
         source: Source identifier
 
     Returns:
@@ -73,65 +88,102 @@ def index_documents(text: str, chunk_size: int = 500, source: str = "unknown") -
     """
     try:
         # 文本分块 (按句子)
-        sentences = text.replace('\n', ' ').split('。')
-        sentences = [s.strip() + '。' for s in sentences if s.strip()]
-
-        chunks = []
-        current_chunk = ""
-
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) < chunk_size:
-                current_chunk += sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                current_chunk = sentence
-
-        if current_chunk:
-            chunks.append(current_chunk)
+        chunks = chunk_text(text, chunk_size)
 
         # 添加到向量库
         metadata = [{"source": source, "chunk_id": i} for i in range(len(chunks))]
-        vector_service.add_texts(chunks, metadata)
-        vector_service.save()
+        identity = document_identity(doc_id=None if source == "unknown" else source, markdown=text)
+        detail = _store_chunks(chunks, metadata, identity)
 
-        return f"✅ 成功索引 {len(chunks)} 个文本块 (来源: {source})"
+        return f"✅ 成功索引 {len(chunks)} 个文本块 (来源: {source}{detail})"
     except Exception as e:
         return f"❌ 索引失败: {str(e)}"
 
 
+def _store_chunks(texts: list, metadata: list, identity: dict) -> str:
+    """写入向量库: 能识别文档时增量更新已入库的同一文档，返回附加说明"""
+    if identity:
+        report = vector_service.index_document(texts, metadata, identity)
+        detail = f"，{format_report(report)}"
+    else:
+        vector_service.add_texts(texts, metadata)
+        detail = ""
+    vector_service.save()
+    return detail
+
+
 @tool
-def search_documents(query: str, top_k: int = 5) -> str:
+def search_documents(
+    query: str,
+    top_k: int = 5,
+    section: Optional[str] = None,
+    chunk_type: Optional[str] = None
+) -> str:
     """
     Semantic search using Qwen3 Embedding.
 
     Args:
         query: Search query
         top_k: Number of results
+        section: Only return chunks from this section path (e.g. "3 Method > 3.2 Training")
+        chunk_type: Only return chunks of this type: text, table, equation, figure or code
 
     Returns:
         JSON search results
     """
     try:
-        results = vector_service.search(query, top_k)
+        where = {key: value for key, value in (("section", section), ("chunk_type", chunk_type)) if value}
+        results = vector_service.search(query, top_k, where or None)
         return json.dumps(results, ensure_ascii=False, indent=2)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
+def index_content_list(content_list: list, source: str = "unknown") -> str:
+    """按 MinerU content_list 的结构分块并索引 (块带 chunk_type / section / page 元数据)"""
+    try:
+        chunks = list(chunk_content_list(content_list))
+        if not chunks:
+            return "⚠️ 无文本内容"
+
+        texts = [chunk["text"] for chunk in chunks]
+        metadata = [
+            {"source": source, "chunk_id": i, **chunk["metadata"]}
+            for i, chunk in enumerate(chunks)
+        ]
+        identity = document_identity(doc_id=None if source == "unknown" else source, content_list=content_list)
+        detail = _store_chunks(texts, metadata, identity)
+
+        return f"✅ 成功索引 {len(chunks)} 个结构化文本块 (来源: {source}{detail})"
+    except Exception as e:
+        return f"❌ 索引失败: {str(e)}"
+
+
 @tool
-def analyze_image(image_path: str, question: str = "请详细描述这张图表的内容") -> str:
+def analyze_image(
+    image_path: str = "",
+    question: str = "请详细描述这张图表的内容",
+    doc_id: Optional[str] = None,
+    figure: Optional[int] = None,
+    page: Optional[int] = None
+) -> str:
     """
     Analyze image using Qwen-VL.
 
     Args:
-        image_path: Path to image
+        image_path: Path to image (may be empty when doc_id is given)
         question: Question about image
+        doc_id: Parsed document (its PDF URL) whose figure to analyze instead of image_path
+        figure: Figure number within the document, e.g. 3 for "Figure 3"
+        page: Page number (from 1) of the figure
 
     Returns:
         Analysis result
     """
     try:
+        if doc_id:
+            # 从图片资源库取图 (首次使用时才从本地压缩包写出)
+            image_path = get_asset_store().resolve(doc_id, figure, page)
         image_path = Path(image_path)
         if not image_path.exists():
             return f"❌ 图像不存在: {image_path}"
@@ -152,18 +204,43 @@ def process_research_paper(pdf_url: str) -> str:
     Returns:
         Processing summary
     """
-    # 解析 PDF
+    # 解析 PDF (MinerU 云端解析一次返回整个结果包)
+    parse_start = time.perf_counter()
     parse_result_json = parse_pdf_with_mineru(pdf_url)
     parse_result = json.loads(parse_result_json)
+    parse_seconds = time.perf_counter() - parse_start
 
     if "error" in parse_result:
         return parse_result_json
 
-    # 索引文本 (使用 markdown)
+    # 流水线索引: 有 content_list 时按文档结构分块，否则对 markdown 分块；
+    # 分块边产出边向量化，向量化完的批次随即写入
     text = parse_result.get("markdown", "")
+    content_list = parse_result.get("content_list") or []
 
-    if text:
-        index_status = index_documents(text, chunk_size=500, source=pdf_url)
+    if content_list:
+        chunks = (
+            (chunk["text"], {"source": pdf_url, "chunk_id": i, **chunk["metadata"]})
+            for i, chunk in enumerate(chunk_content_list(content_list))
+        )
+    else:
+        chunks = ((chunk, {"source": pdf_url, "chunk_id": i}) for i, chunk in enumerate(iter_chunks(text)))
+
+    throughput = {"parse": {"seconds": round(parse_seconds, 2)}}
+    if content_list or text:
+        try:
+            identity = document_identity(doc_id=pdf_url, markdown=text, content_list=content_list)
+            report = vector_service.index_stream(chunks, identity)
+            vector_service.save()
+            index_status = f"✅ 成功索引 {report['chunks']} 个文本块 (来源: {pdf_url}，{format_report(report)})"
+            for name, stat in report.get("stages", {}).items():
+                if name == "seconds":
+                    throughput["index"] = {"seconds": round(stat, 2)}
+                else:
+                    throughput[name] = {"items": stat["items"], "busy": round(stat["busy"], 2),
+                                        "per_sec": round(stat["rate"], 1)}
+        except Exception as e:
+            index_status = f"❌ 索引失败: {str(e)}"
     else:
         index_status = "⚠️ 无文本内容"
 
@@ -173,7 +250,8 @@ def process_research_paper(pdf_url: str) -> str:
         "text_length": len(text),
         "tables_count": len(parse_result.get("tables", [])),
         "images_count": len(parse_result.get("images", [])),
-        "index_status": index_status
+        "index_status": index_status,
+        "throughput": throughput
     }
 
     return json.dumps(summary, ensure_ascii=False, indent=2)
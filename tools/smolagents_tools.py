@@ -5,13 +5,19 @@
 from smolagents import tool
 from pathlib import Path
 import json
-import requests
-import zipfile
-import io
-import time
-from typing import List, Dict
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 from openai import OpenAI
 import os
+from services.file_lock import FileLock
+from services import mineru_archive, http_client
+from services.parse_cache import get_parse_cache
+from services.mineru_poller import get_poller, FIRST_FILE
+from services.ingest_pipeline import Pipeline, Stage, format_stats
+from services.pdf_split import needs_split, split_pdf, stitch_results
+from tools.text_chunker import chunk_text, iter_chunks
 
 # ============================================================================
 # MinerU API 封装函数
@@ -41,7 +47,7 @@ def create_task(file_url: str, file_path: str = None) -> str:
         }
 
         try:
-            apply_res = requests.post(apply_url, headers=headers, json=request_data)
+            apply_res = http_client.post(apply_url, headers=headers, json=request_data)
             apply_res.raise_for_status()
             apply_data = apply_res.json()
 
@@ -58,7 +64,7 @@ def create_task(file_url: str, file_path: str = None) -> str:
         try:
             print(f"📤 正在通过PUT方式上传文件...")
             with open(file_path, "rb") as f:
-                upload_res = requests.put(upload_url, data=f)
+                upload_res = http_client.put(upload_url, data=f, timeout=http_client.transfer_timeout())
 
             if upload_res.status_code not in (200, 201):
                 raise RuntimeError(f"文件上传失败：状态码{upload_res.status_code}")
@@ -85,7 +91,7 @@ def create_task(file_url: str, file_path: str = None) -> str:
             'language': "ch",
             'model_version': "v2"
         }
-        res = requests.post(url, headers=header, json=data, timeout=30)
+        res = http_client.post(url, headers=header, json=data)
 
         res.raise_for_status()
         res_data = res.json()
@@ -97,124 +103,57 @@ def create_task(file_url: str, file_path: str = None) -> str:
         return task_id_data
 
 
-def query_by_id(task_id: str, max_retries: int = 60, retry_interval: int = 10) -> str:
+def query_by_id(task_id: str, max_retries: int = 60, retry_interval: int = 10, batch: bool = True) -> str:
     """
-    优化后的轮询查询解析结果（先判断状态，再处理full_zip_url）
-    支持批量结果查询和详细状态反馈
+    等待解析完成并返回结果压缩包URL
+    由共用的轮询协调器统一查询 (间隔按解析进度自适应)，最长等待 max_retries * retry_interval 秒
+
+    :param task_id: 本地上传返回的 batch_id (batch=True) 或 URL 解析返回的 task_id (batch=False)
     """
-    # 使用批量结果查询端点
-    url = f'https://mineru.net/api/v4/extract-results/batch/{task_id}'
     token = os.getenv("MINERU_API_TOKEN")
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {token}'
-    }
-
-    retries = 0
-    while retries < max_retries:
-        try:
-            res = requests.get(url, headers=headers, timeout=30)
-            res.raise_for_status()  # 捕获HTTP请求错误
-            data = res.json()
-
-            if data["code"] != 0:
-                print(f"❌ 查询解析状态失败：{data['msg']}")
-                break
-
-            # 核心：先获取任务状态，再判断是否读取full_zip_url
-            extract_result = data["data"]["extract_result"]
-            if not extract_result:
-                print(f"❌ 第{retries+1}次查询：extract_result为空")
-                time.sleep(retry_interval)
-                retries += 1
-                continue
-
-            task_info = extract_result[0]
-            task_state = task_info["state"]
-            task_err_msg = task_info.get("err_msg", "")
-
-            # 状态分类处理
-            if task_state == "done":
-                # 任务完成，检查full_zip_url是否有效
-                full_zip_url = task_info.get("full_zip_url", "")
-                if full_zip_url:
-                    print(f"✅ 任务完成！获取到结果URL")
-                    return full_zip_url
-                else:
-                    print(f"⚠️ 任务状态为done，但full_zip_url为空，重试第{retries+1}次...")
-
-            elif task_state == "failed":
-                print(f"❌ 解析任务失败：{task_err_msg}")
-                raise Exception(f"解析任务失败：{task_err_msg}")
+    poller = get_poller()
+    timeout = max_retries * retry_interval
 
-            else:
-                # 任务处理中（pending/running/converting）
-                print(f"⏳ 解析中（状态：{task_state}），full_zip_url暂未生成，等待{retry_interval}秒... 已重试{retries+1}次")
-
-            # 未完成则等待重试
-            time.sleep(retry_interval)
-            retries += 1
+    try:
+        if batch:
+            task_info = poller.watch_batch(task_id, token, timeout=timeout)[FIRST_FILE].result()
+        else:
+            task_info = poller.watch_task(task_id, token, timeout=timeout).result()
+    except TimeoutError:
+        raise Exception(f"解析超时（超过{timeout/60}分钟），请检查任务状态或联系MinerU官方")
+    except RuntimeError as e:
+        print(f"❌ 解析任务失败：{e}")
+        raise Exception(f"解析任务失败：{e}")
 
-        except requests.exceptions.RequestException as e:
-            print(f"❌ 查询解析结果异常：{str(e)}，重试第{retries+1}次...")
-            time.sleep(retry_interval)
-            retries += 1
+    full_zip_url = task_info.get("full_zip_url", "")
+    if not full_zip_url:
+        raise Exception("任务状态为done，但full_zip_url为空")
 
-    # 最终结果判断
-    raise Exception(f"解析超时（超过{max_retries*retry_interval/60}分钟），请检查任务状态或联系MinerU官方")
+    print(f"✅ 任务完成！获取到结果URL")
+    return full_zip_url
 
 
 def download_and_extract_zip(zip_url: str) -> Dict[str, any]:
     """
     下载并提取ZIP文件内容
-    优先使用full.md作为最终解析文件
+    压缩包流式下载到磁盘，只读取文本成员 (优先 full.md)；图片只列出成员名，
+    需要时用 services.mineru_archive.load_image 读取
     """
     print(f"📥 Downloading: {zip_url[:60]}...")
-    res = requests.get(zip_url, timeout=300)
-    res.raise_for_status()
-
-    result = {"markdown": "", "content_list": [], "tables": [], "images": []}
-
-    with zipfile.ZipFile(io.BytesIO(res.content)) as zf:
-        # 核心：优先查找full.md（MinerU默认的完整解析结果文件）
-        md_file_found = False
-        for md_filename in ["full.md", "output.md", "parsed.md", "document.md"]:
-            try:
-                markdown_content = zf.read(md_filename).decode("utf-8")
-                result["markdown"] = markdown_content
-                print(f"✅ 成功读取解析文件: {md_filename}")
-                md_file_found = True
-                break
-            except KeyError:
-                continue
-
-        if not md_file_found:
+    archive = mineru_archive.fetch(zip_url)
+    try:
+        result = archive.result()
+        if not result["markdown"]:
             print("⚠️ 未找到标准MD文件，列出压缩包内容以便排查:")
-            for name in zf.namelist():
+            for name in archive.names():
                 print(f"  - {name}")
 
-        # Content List
-        try:
-            result["content_list"] = json.loads(zf.read("content_list.json"))
-        except KeyError:
-            pass
-
         # Tables
-        try:
-            tables_html = zf.read("tables.html").decode("utf-8")
+        tables_html = archive.tables_html()
+        if tables_html:
             result["tables_html"] = tables_html
-        except KeyError:
-            pass
-
-        # Images
-        try:
-            result["images"] = [
-                {"path_in_zip": name}
-                for name in zf.namelist()
-                if name.startswith("images/") and (name.endswith(".jpg") or name.endswith(".png"))
-            ]
-        except Exception:
-            pass
+    finally:
+        mineru_archive.discard(archive)
 
     # 验证markdown内容是否完整
     if result["markdown"]:
@@ -231,6 +170,32 @@ def download_and_extract_zip(zip_url: str) -> Dict[str, any]:
 # Tool 1: PDF解析工具 (使用 MinerU API)
 # ============================================================================
 
+def parse_oversized_pdf(file_path: str) -> Dict[str, any]:
+    """
+    解析超过 MinerU 单文件上限 (200MB / 600 页) 的本地PDF
+    按页段切分后各部分并发上传解析 (由共用的轮询协调器统一查询)，结果按页码顺序拼接，
+    content_list 的页码为全文页码
+    """
+    from config import get_config
+    parts_dir = Path(file_path).with_name(f"{Path(file_path).stem}_parts")
+    parts = split_pdf(file_path, str(parts_dir))
+    workers = min(get_config().get('pdf_parser.split.workers', 4), len(parts))
+
+    def parse_part(part_path: str) -> Dict[str, any]:
+        zip_url = query_by_id(create_task("", file_path=part_path), batch=True)
+        return download_and_extract_zip(zip_url)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(start, end, executor.submit(parse_part, path)) for path, start, end in parts]
+            results = [(start, end, future.result()) for start, end, future in futures]
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    print(f"✅ {len(parts)} 部分解析完成，已拼接为一篇文档")
+    return stitch_results(results)
+
+
 @tool
 def parse_pdf(pdf_url: str, local_file_path: str = None) -> str:
     """
@@ -248,19 +213,43 @@ def parse_pdf(pdf_url: str, local_file_path: str = None) -> str:
         if not api_token:
             return json.dumps({"error": "MINERU_API_TOKEN not configured"})
 
-        # 如果提供了本地文件路径
-        if local_file_path and os.path.exists(local_file_path):
-            print(f"📤 Processing local PDF: {local_file_path}")
-            task_id = create_task("", file_path=local_file_path)
-        elif pdf_url:
-            print(f"📥 Processing PDF from URL: {pdf_url}")
-            task_id = create_task(pdf_url)
-        else:
+        local = bool(local_file_path and os.path.exists(local_file_path))
+        if not local and not pdf_url:
             return json.dumps({"error": "请提供PDF URL或本地文件路径"})
 
-        # 查询任务状态并获取结果
-        zip_url = query_by_id(task_id)
-        result = download_and_extract_zip(zip_url)
+        # 解析过的 PDF 直接返回缓存结果 (本地文件按内容哈希，URL 按 ETag)
+        # 本地文件与 URL 的任务参数不同 (vlm / v2)，作为模型版本的一部分区分
+        cache = get_parse_cache()
+        cache_key = None
+        if cache.enabled:
+            try:
+                if local:
+                    cache_key = cache.key_for_file(local_file_path, "upload:vlm")
+                else:
+                    cache_key = cache.key_for_url(pdf_url, "url:v2")
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return json.dumps({"result": cached, "cached": True}, ensure_ascii=False)
+            except Exception as e:
+                print(f"⚠️ 解析缓存不可用: {e}")
+
+        # 如果提供了本地文件路径 (超过 MinerU 单文件上限时切分后并发解析)
+        if local and needs_split(local_file_path):
+            print(f"📤 Processing oversized local PDF: {local_file_path}")
+            result = parse_oversized_pdf(local_file_path)
+        else:
+            if local:
+                print(f"📤 Processing local PDF: {local_file_path}")
+                task_id = create_task("", file_path=local_file_path)
+            else:
+                print(f"📥 Processing PDF from URL: {pdf_url}")
+                task_id = create_task(pdf_url)
+
+            # 查询任务状态并获取结果 (本地上传为批次，URL 解析为单个任务)
+            zip_url = query_by_id(task_id, batch=local)
+            result = download_and_extract_zip(zip_url)
+        if cache_key:
+            cache.put(cache_key, result, source=local_file_path if local else pdf_url)
 
         return json.dumps({"result": result}, ensure_ascii=False)
 
@@ -291,7 +280,14 @@ def download_mineru_result(zip_url: str) -> str:
 # ============================================================================
 
 class SimpleTextStore:
-    """简单的文本存储，不使用向量数据库"""
+    """简单的文本存储，不使用向量数据库
+
+    文本列表写时复制：写入在锁内生成新元组并整体替换，检索读取当前引用，
+    不会被并发写入阻塞，也不会看到写了一半的列表。
+
+    多个进程共用 text_index.json 时，写入持有跨进程文件锁，先合并磁盘上
+    其他进程已写入的文本再追加，不会互相覆盖。
+    """
     _instance = None
     _initialized = False
 
@@ -302,35 +298,49 @@ class SimpleTextStore:
 
     def __init__(self):
         if not self._initialized:
-            self.texts = []
+            self.texts = ()
+            self._write_lock = threading.Lock()
             self.index_path = Path("./data/text_index.json")
             self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file_lock = FileLock(self.index_path.with_name(self.index_path.name + ".lock"))
 
             # 尝试加载已有索引
             if self.index_path.exists():
                 try:
                     with open(self.index_path, 'r') as f:
-                        self.texts = json.load(f)
+                        self.texts = tuple(json.load(f))
                 except Exception:
-                    self.texts = []
+                    self.texts = ()
 
             SimpleTextStore._initialized = True
 
     def add_texts(self, texts: List[str]):
         """添加文本"""
-        self.texts.extend(texts)
-        self._save()
+        with self._write_lock, self._file_lock:
+            self.texts = self._read_disk() + tuple(texts)
+            self._save()
+
+    def _read_disk(self) -> tuple:
+        """读取磁盘上的最新文本 (包含其他进程的写入)"""
+        if not self.index_path.exists():
+            return self.texts
+        try:
+            with open(self.index_path, 'r') as f:
+                return tuple(json.load(f))
+        except Exception:
+            return self.texts
 
     def search(self, query: str, top_k: int = 5) -> List[Dict]:
         """简单的文本搜索（基于关键词匹配）"""
-        if not self.texts:
+        texts = self.texts
+        if not texts:
             return []
 
         # 简单的关键词匹配
         query_words = query.lower().split()
         results = []
 
-        for text in self.texts:
+        for text in texts:
             text_lower = text.lower()
             score = sum(1 for word in query_words if word in text_lower)
             if score > 0:
@@ -344,9 +354,11 @@ class SimpleTextStore:
         return results[:top_k]
 
     def _save(self):
-        """保存文本"""
-        with open(self.index_path, 'w') as f:
-            json.dump(self.texts, f)
+        """保存文本 (先写临时文件再原子替换，调用方需持有写锁与文件锁)"""
+        tmp = self.index_path.with_suffix(".tmp")
+        with open(tmp, 'w') as f:
+            json.dump(list(self.texts), f)
+        os.replace(tmp, self.index_path)
 
 
 # 全局文本存储实例
@@ -354,35 +366,20 @@ text_store = SimpleTextStore()
 
 
 @tool
-def index_text(text: str, chunk_size: int = 500) -> str:
+def index_text(text: str, chunk_size: Optional[int] = None) -> str:
     """
     Index text by chunking and storing in memory.
 
     Args:
         text: Text to index
-        chunk_size: Size of each chunk
+        chunk_size: Maximum tokens per chunk (defaults to retrieval.chunk_size)
 
     Returns:
         Status message
     """
     try:
-        # 简单的分块
-        sentences = text.replace('\n', ' ').split('。')
-        sentences = [s.strip() + '。' for s in sentences if s.strip()]
-
-        chunks = []
-        current_chunk = ""
-
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) < chunk_size:
-                current_chunk += sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                current_chunk = sentence
-
-        if current_chunk:
-            chunks.append(current_chunk)
+        # 按句子分块
+        chunks = chunk_text(text, chunk_size)
 
         # 存储到内存
         text_store.add_texts(chunks)
@@ -393,6 +390,38 @@ def index_text(text: str, chunk_size: int = 500) -> str:
         return f"Error indexing text: {str(e)}"
 
 
+def _index_text_stream(text: str, chunk_size: Optional[int] = None) -> tuple:
+    """流水线式索引: 分块与写入在两个线程中并行，分块每凑满一批即写入
+
+    :return: (状态信息, 各阶段吞吐)
+    """
+    from config import get_config
+    batch_size = get_config().get('vector_db.bulk.batch_size', 256)
+
+    def batches():
+        batch = []
+        for chunk in iter_chunks(text, chunk_size):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def store(chunk_batches):
+        for batch in chunk_batches:
+            text_store.add_texts(batch)
+            yield len(batch)
+
+    try:
+        pipeline = Pipeline([Stage("chunk", batches, size=len), Stage("index", store, size=lambda n: n)])
+        count = sum(pipeline.run())
+        print(format_stats(pipeline.stats))
+        return f"Successfully indexed {count} chunks", pipeline.stats
+    except Exception as e:
+        return f"Error indexing text: {str(e)}", {}
+
+
 @tool
 def search_knowledge(query: str, top_k: int = 5) -> str:
     """
@@ -515,7 +544,7 @@ def process_and_index_pdf(pdf_url: str) -> str:
             return json.dumps({"error": "No markdown content found"})
 
         print(f"📝 Indexing text...")
-        index_status = index_text(markdown)
+        index_status, stages = _index_text_stream(markdown)
 
         # 4. 返回摘要
         summary = {
@@ -523,6 +552,7 @@ def process_and_index_pdf(pdf_url: str) -> str:
             "images_count": len(download_dict.get("images", [])),
             "tables_count": len(download_dict.get("tables", [])),
             "index_status": index_status,
+            "throughput": stages,
             "images": download_dict.get("images", []),
             "markdown_preview": markdown[:500] + "..." if len(markdown) > 500 else markdown
         }
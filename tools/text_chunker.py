@@ -0,0 +1,624 @@
+"""
+文本分块
+
+所有索引路径 (VectorDatabase、ChromaDB VectorDB、index_documents、index_text) 共用的
+流式分块器。输入可以是整段字符串，也可以是逐块读取的文本流 (如打开的大文件)；
+在块大小的窗口内查找句子边界，整体 O(n)，读取文本流时内存只与块大小有关。
+
+块大小按分词器的 token 数计算，是硬上限: 每块 token 数不超过 retrieval.chunk_size，
+向量化请求不会因超长失败，作为证据放进提示词时大小也可预期。分词器由
+retrieval.tokenizer 指定并在进程内缓存；加载失败 (离线等) 时按字符类别保守估算。
+
+断句同时支持中文 (。！？；…) 和英文 (句点后跟空白，排除 e.g.、Fig.、et al. 等缩写、
+首字母缩写和后面紧跟小写单词的情况)。
+
+基准测试 (与原先基于字符串拼接的分块实现对比):
+    python -m tools.text_chunker --bench paper.md
+"""
+import re
+import time
+import argparse
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# 默认分词器，与本地 Embedding 模型 (Qwen3-Embedding-0.6B) 一致
+DEFAULT_TOKENIZER = "Qwen/Qwen3-Embedding-0.6B"
+
+# 断句符 (中英文句末标点与换行)；英文句点另行判断
+_TERMINATORS = "。！？；!?;…\n"
+# 断句符之后仍属于本句的字符
+_TRAILING = _TERMINATORS + ".\"”’』」)"
+
+# 句点前是这些词时不断句 (小写比较)
+_ABBREVIATIONS = frozenset({
+    "e.g", "i.e", "et al", "al", "etc", "cf", "vs", "viz", "approx", "resp", "ca",
+    "fig", "figs", "eq", "eqs", "tab", "sec", "secs", "ch", "ref", "refs", "vol", "no", "pp", "p",
+    "dr", "mr", "mrs", "ms", "prof", "jr", "sr", "st", "inc", "ltd", "co", "corp",
+})
+
+_NON_SPACE = re.compile(r'\S')
+_WORD_BEFORE = re.compile(r'([A-Za-z][A-Za-z.]*(?: al)?)$')
+
+
+class _EstimatedTokenizer:
+    """分词器不可用时的保守估算: 字母串每 3 个字符计 1 个 token，其余非空白字符 (汉字、数字、
+    符号) 各计 1 个，通常不少于真实分词器的 token 数"""
+
+    name = "estimate"
+    _PIECE = re.compile(r'[A-Za-z]{1,3}|\S')
+
+    def offsets(self, text: str) -> List[Tuple[int, int]]:
+        return [m.span() for m in self._PIECE.finditer(text)]
+
+
+class _Tokenizer:
+    """tokenizers.Tokenizer 的包装"""
+
+    def __init__(self, name: str, tokenizer):
+        self.name = name
+        self._tokenizer = tokenizer
+
+    def offsets(self, text: str) -> List[Tuple[int, int]]:
+        """每个 token 在 text 中的 (起, 止) 字符位置"""
+        return self._tokenizer.encode(text, add_special_tokens=False).offsets
+
+
+_tokenizers: Dict[str, object] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _load_tokenizer(name: str):
+    if name == _EstimatedTokenizer.name:
+        return _EstimatedTokenizer()
+
+    try:
+        from tokenizers import Tokenizer
+
+        path = Path(name)
+        if path.exists():
+            tokenizer = Tokenizer.from_file(str(path / "tokenizer.json" if path.is_dir() else path))
+        else:
+            # 与 Embedding 模型相同: 优先从 ModelScope 下载，失败时使用 HuggingFace
+            try:
+                from modelscope import snapshot_download
+                model_dir = snapshot_download(name, allow_file_pattern=["tokenizer.json"])
+                tokenizer = Tokenizer.from_file(str(Path(model_dir) / "tokenizer.json"))
+            except Exception:
+                tokenizer = Tokenizer.from_pretrained(name)
+        print(f"✅ 分词器已加载: {name}")
+        return _Tokenizer(name, tokenizer)
+    except Exception as e:
+        print(f"⚠️ 分词器 {name} 加载失败 ({e})，按字符类别估算 token 数")
+        return _EstimatedTokenizer()
+
+
+def get_tokenizer(name: Optional[str] = None):
+    """获取分词器 (按名称缓存，进程内只加载一次)
+
+    Args:
+        name: ModelScope/HuggingFace 模型名、本地 tokenizer.json 路径或 "estimate"，
+            默认读取 retrieval.tokenizer
+    """
+    if name is None:
+        from config import get_config
+        name = get_config().get('retrieval.tokenizer', DEFAULT_TOKENIZER)
+    with _tokenizers_lock:
+        if name not in _tokenizers:
+            _tokenizers[name] = _load_tokenizer(name)
+        return _tokenizers[name]
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    """文本的 token 数"""
+    return len((tokenizer or get_tokenizer()).offsets(text))
+
+
+def _settings(chunk_size: Optional[int], overlap: Optional[int]):
+    if chunk_size is None or overlap is None:
+        from config import get_config
+        config = get_config()
+        if chunk_size is None:
+            chunk_size = config.get('retrieval.chunk_size', 500)
+        if overlap is None:
+            overlap = config.get('retrieval.chunk_overlap', 50)
+    if chunk_size < 8:
+        raise ValueError(f"chunk_size 至少为 8 个 token: {chunk_size}")
+    return chunk_size, max(0, min(overlap, chunk_size // 2))
+
+
+def _is_period(text: str, pos: int, final: bool) -> bool:
+    """pos 处的 . 是否为英文句点
+
+    其后 (越过 . 与右引号/括号) 须是空白或文本结尾，下一个词不以小写字母开头，
+    且前一个词不是常见缩写或单个大写字母 (人名首字母)。
+    """
+    j = pos + 1
+    while j < len(text) and text[j] in _TRAILING:
+        j += 1
+    if j == len(text):
+        return final
+    if not text[j].isspace():
+        return False
+
+    match = _NON_SPACE.search(text, j)
+    if match is None:
+        return final
+    if match.group().islower():
+        return False
+
+    word = _WORD_BEFORE.search(text, max(0, pos - 16), pos)
+    if word is None:
+        return True
+    word = word.group(1)
+    return not (word.lower() in _ABBREVIATIONS or (len(word) == 1 and word.isupper()))
+
+
+def _sentence_end(text: str, pos: int, limit: int) -> int:
+    """pos 处断句后句子的结束位置 (越过连续的断句符与右引号，不超过 limit)"""
+    end = pos + 1
+    while end < limit and text[end] in _TRAILING:
+        end += 1
+    return end
+
+
+def _tail_bytes(text: str, end: int) -> int:
+    """end 之前的标点串 (不含字母、数字、空白) 的 UTF-8 字节数，用作分词差异的上界"""
+    begin = end
+    while begin > 0 and end - begin < 32 and not text[begin - 1].isalnum() and not text[begin - 1].isspace():
+        begin -= 1
+    return len(text[begin:end].encode('utf-8')) + 1
+
+
+def _last_boundary(text: str, lo: int, hi: int, final: bool) -> int:
+    """[lo, hi) 内最后一个句子结束位置，没有时返回 -1"""
+    pos = max(text.rfind(c, lo, hi) for c in _TERMINATORS)
+    dot = text.rfind('.', lo, hi)
+    while dot > pos and not _is_period(text, dot, final):
+        dot = text.rfind('.', lo, dot)
+    pos = max(pos, dot)
+    return _sentence_end(text, pos, hi) if pos >= lo else -1
+
+
+def _first_boundary(text: str, lo: int, hi: int, final: bool) -> int:
+    """[lo, hi) 内第一个句子结束位置，没有时返回 -1"""
+    pos = min((i for i in (text.find(c, lo, hi) for c in _TERMINATORS) if i >= 0), default=hi)
+    dot = text.find('.', lo, pos)
+    while dot >= 0 and not _is_period(text, dot, final):
+        dot = text.find('.', dot + 1, pos)
+    if dot >= 0:
+        pos = dot
+    return _sentence_end(text, pos, hi) if pos < hi else -1
+
+
+def iter_chunks(
+    text: Union[str, Iterable[str]],
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    tokenizer=None
+) -> Iterator[str]:
+    """流式分块
+
+    每块取 token 数不超过 chunk_size 的最长整句前缀，下一块从上一块末尾不超过
+    overlap 个 token 的完整句子开始。单句超过上限时在空白处 (没有空白时在 token
+    边界) 切开。块内连续空白 (含换行) 合并为一个空格。
+
+    先对略大于一块的窗口分词，由 token 的字符位置得到窗口边界，再用 str.rfind/find
+    查找句子边界；输出前对块本身再分词一次确认不超过上限。每块只做常数次扫描，
+    不做逐句的字符串拼接。
+
+    Args:
+        text: 字符串或字符串的可迭代对象 (如文件对象、分段读取的生成器)
+        chunk_size: 每块 token 数上限，默认 retrieval.chunk_size
+        overlap: 相邻块重叠的 token 数，默认 retrieval.chunk_overlap
+        tokenizer: 分词器，默认 get_tokenizer()
+
+    Yields:
+        文本块
+    """
+    chunk_size, overlap = _settings(chunk_size, overlap)
+    tokenizer = tokenizer or get_tokenizer()
+
+    buffer = ""
+    start = 0                # 下一块在 buffer 中的起点
+    emitted = 0              # 已输出内容的结束位置 (start 小于它时，两者之间是重叠部分)
+    span = chunk_size * 4    # 分词窗口的字符数，按实际的字符/token 比例调整
+
+    def measure(begin: int) -> List[Tuple[int, int]]:
+        """从 begin 起分词，直到超过 chunk_size 个 token 或到达 buffer 末尾"""
+        nonlocal span
+        while True:
+            offsets = tokenizer.offsets(buffer[begin:begin + span])
+            if len(offsets) > chunk_size:
+                span = max(chunk_size, offsets[chunk_size][0] * 5 // 4)
+                return offsets
+            if begin + span >= len(buffer):
+                return offsets
+            span *= 2
+
+    def fit(limit: int, window: List[Tuple[int, int]], final: bool) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+        """在 [start, limit) 内确定块的结束位置，返回 (结束位置, 块内 token 位置)；
+        带上重叠后放不下下一句时返回 None"""
+        while True:
+            end = _last_boundary(buffer, start, limit, final)
+            if end < 0 or end <= emitted:
+                if start < emitted:
+                    return None
+                # 单句超长: 在空白处切开，没有空白时在 token 边界切开
+                space = buffer.rfind(' ', start + (limit - start) // 2, limit)
+                end = space if space > start else limit
+            elif window:
+                # 窗口从块首开始分词，块单独分词时只有末尾的标点串可能切分不同；
+                # 按其字节数留出余量，余量内无需重新分词
+                count = bisect_left(window, (end - start,))
+                if count + _tail_bytes(buffer, end) <= chunk_size:
+                    return end, window[:count]
+
+            offsets = tokenizer.offsets(buffer[start:end])
+            if len(offsets) <= chunk_size:
+                return end, offsets
+            # 单独分词比窗口内多出 token: 收紧上限重试
+            limit = start + max(1, offsets[chunk_size][0])
+            window = None
+
+    def take(final: bool) -> Iterator[str]:
+        nonlocal start, emitted
+        while True:
+            match = _NON_SPACE.search(buffer, start)
+            if match is None:
+                start = len(buffer)
+                return
+            start = match.start()
+
+            # 文本流未结束时多留一个窗口的后文，判断窗口末尾的句点时不受读取边界影响
+            if not final and len(buffer) - start <= 2 * span:
+                return
+
+            offsets = measure(start)
+            # 剩余部分放得下一块: 文本结束时整体输出，否则等待更多文本
+            if len(offsets) <= chunk_size:
+                if final:
+                    yield buffer[start:]
+                    start = emitted = len(buffer)
+                return
+
+            fitted = fit(start + offsets[chunk_size][0], offsets, final)
+            if fitted is None:
+                # 带上重叠后放不下下一句: 去掉重叠重试
+                start = emitted
+                continue
+            end, offsets = fitted
+
+            yield buffer[start:end]
+            emitted = end
+            if overlap and len(offsets) > overlap:
+                lo = start + offsets[len(offsets) - overlap][0]
+                boundary = _first_boundary(buffer, lo, end, final)
+                start = boundary if 0 <= boundary < end else end
+            else:
+                start = end
+
+    def normalized(chunks: Iterator[str]) -> Iterator[str]:
+        for chunk in chunks:
+            chunk = " ".join(chunk.split())
+            if chunk:
+                yield chunk
+
+    if isinstance(text, str):
+        buffer = text
+    else:
+        for piece in text:
+            buffer += piece
+            yield from normalized(take(final=False))
+            # 丢弃已输出且不再需要的部分
+            buffer = buffer[start:]
+            emitted = max(0, emitted - start)
+            start = 0
+
+    yield from normalized(take(final=True))
+
+
+def chunk_text(
+    text: str,
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    tokenizer=None
+) -> List[str]:
+    """iter_chunks 的列表形式"""
+    if not text:
+        return []
+    return list(iter_chunks(text, chunk_size, overlap, tokenizer))
+
+
+# ============================================================================
+# 按文档结构分块 (MinerU content_list)
+# ============================================================================
+
+# 不参与索引的版面元素
+_SKIPPED_BLOCKS = frozenset({"header", "footer", "page_number", "page_footnote", "aside_text", "discarded"})
+
+_HEADING_NUMBER = re.compile(r'^\s*((?:\d+\.)*\d+)\.?\s+\S')
+_HTML_CELL_END = re.compile(r'</t[dh]\s*>', re.IGNORECASE)
+_HTML_ROW_END = re.compile(r'</tr\s*>|<br\s*/?>', re.IGNORECASE)
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+
+def _heading_depth(title: str, text_level: int) -> int:
+    """标题层级: 有编号时按编号段数 (3.2 -> 2)，否则用 MinerU 给出的 text_level"""
+    match = _HEADING_NUMBER.match(title)
+    return match.group(1).count('.') + 1 if match else max(1, int(text_level))
+
+
+def _table_rows(html_body: str) -> List[str]:
+    """HTML 表格转为逐行文本，单元格以 | 分隔"""
+    import html
+
+    text = _HTML_ROW_END.sub('\n', _HTML_CELL_END.sub(' | ', html_body or ''))
+    rows = (" ".join(html.unescape(_HTML_TAG.sub(' ', line)).split()).strip(' |') for line in text.split('\n'))
+    return [row for row in rows if row]
+
+
+def _joined(value) -> str:
+    """caption/footnote 字段可能是字符串或字符串列表"""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v).strip() for v in value if str(v).strip())
+    return str(value or "").strip()
+
+
+def _pack_rows(rows: List[str], header: str, chunk_size: int, tokenizer) -> Iterator[str]:
+    """表格按行装箱并保留换行，每块都带上表头 (标题)；单行超长时按句子切分"""
+    budget = chunk_size - (count_tokens(header, tokenizer) + 1 if header else 0)
+    if budget < max(16, chunk_size // 4):
+        # 标题本身过长: 不再逐块重复
+        header, budget = "", chunk_size
+
+    lines, used = [header] if header else [], 0
+    for row in rows:
+        pieces = [row] if count_tokens(row, tokenizer) < budget else iter_chunks(row, budget - 1, 0, tokenizer)
+        for piece in pieces:
+            size = count_tokens(piece, tokenizer) + 1   # 含换行
+            if used and used + size > budget:
+                yield "\n".join(lines)
+                lines, used = [header] if header else [], 0
+            lines.append(piece)
+            used += size
+    if used:
+        yield "\n".join(lines)
+
+
+def chunk_content_list(
+    content_list: List[Dict],
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    tokenizer=None
+) -> Iterator[Dict]:
+    """按 MinerU content_list 的文档结构分块
+
+    正文在所在章节内分块，不跨章节；表格、公式、图片说明各自成块。
+    每块的元数据:
+        chunk_type: text / table / equation / figure / code
+        section: 章节路径，如 "3 Method > 3.2 Training" (文档开头的标题之前为空字符串)
+        page: 起始页码 (从 1 开始)；正文块另有 page_end
+        image_path: 表格/图片/公式在 MinerU 结果中的图片路径 (有时)
+
+    Args:
+        content_list: MinerU 的 content_list.json 内容
+        chunk_size: 每块 token 数上限，默认 retrieval.chunk_size
+        overlap: 正文相邻块重叠的 token 数，默认 retrieval.chunk_overlap
+        tokenizer: 分词器，默认 get_tokenizer()
+
+    Yields:
+        {"text": 文本, "metadata": 元数据}
+    """
+    chunk_size, overlap = _settings(chunk_size, overlap)
+    tokenizer = tokenizer or get_tokenizer()
+
+    headings: List[Tuple[int, str]] = []   # (层级, 标题)
+    paragraphs: List[str] = []             # 当前章节的正文段落 (已合并空白)
+    pages: List[int] = []                  # 各段所在页
+
+    def section() -> str:
+        return " > ".join(title for _, title in headings)
+
+    def flush() -> Iterator[Dict]:
+        """输出当前章节的正文块"""
+        if not paragraphs:
+            return
+        # 段落间以换行连接 (分块时即句子边界，输出时合并为空格)，据此把块映射回起始段落
+        offsets, position = [], 0
+        for paragraph in paragraphs:
+            offsets.append(position)
+            position += len(paragraph) + 1
+        flat = " ".join(paragraphs)
+
+        cursor = 0
+        path = section()
+        for chunk in iter_chunks("\n".join(paragraphs), chunk_size, overlap, tokenizer):
+            begin = flat.find(chunk, cursor)
+            if begin < 0:
+                begin = cursor
+            first = max(0, bisect_left(offsets, begin + 1) - 1)
+            last = max(0, bisect_left(offsets, begin + len(chunk)) - 1)
+            cursor = begin + 1
+            yield {
+                "text": chunk,
+                "metadata": {"chunk_type": "text", "section": path, "page": pages[first], "page_end": pages[last]},
+            }
+        paragraphs.clear()
+        pages.clear()
+
+    def typed(chunk_type: str, text: str, page: int, block: Dict) -> Iterator[Dict]:
+        metadata = {"chunk_type": chunk_type, "section": section(), "page": page}
+        if block.get("img_path"):
+            metadata["image_path"] = block["img_path"]
+        if count_tokens(text, tokenizer) <= chunk_size:
+            yield {"text": text, "metadata": metadata}
+        else:
+            for piece in iter_chunks(text, chunk_size, 0, tokenizer):
+                yield {"text": piece, "metadata": dict(metadata)}
+
+    for block in content_list or []:
+        block_type = block.get("type", "text")
+        page = int(block.get("page_idx", 0)) + 1
+
+        if block_type in _SKIPPED_BLOCKS:
+            continue
+
+        if block_type == "text" and block.get("text_level"):
+            title = " ".join(str(block.get("text", "")).split())
+            if not title:
+                continue
+            yield from flush()
+            depth = _heading_depth(title, block["text_level"])
+            while headings and headings[-1][0] >= depth:
+                headings.pop()
+            headings.append((depth, title))
+
+        elif block_type in ("text", "list"):
+            text = block.get("text") or "\n".join(str(item) for item in block.get("list_items", []))
+            text = " ".join(str(text).split())
+            if text:
+                paragraphs.append(text)
+                pages.append(page)
+
+        elif block_type == "table":
+            caption = _joined(block.get("table_caption"))
+            footnote = _joined(block.get("table_footnote"))
+            rows = _table_rows(block.get("table_body", ""))
+            if not rows and not caption:
+                continue
+            # 标题与首行 (列名) 在每个块中重复
+            header = "\n".join(part for part in (caption, rows[0] if len(rows) > 1 else "") if part)
+            rows = rows[1:] if len(rows) > 1 else rows
+            if footnote:
+                rows.append(footnote)
+            metadata = {"chunk_type": "table", "section": section(), "page": page}
+            if block.get("img_path"):
+                metadata["image_path"] = block["img_path"]
+            for text in _pack_rows(rows, header, chunk_size, tokenizer) if rows else [header]:
+                yield {"text": text, "metadata": dict(metadata)}
+
+        elif block_type == "equation":
+            text = str(block.get("text", "")).strip()
+            if text:
+                yield from typed("equation", text, page, block)
+
+        elif block_type == "image":
+            caption = _joined(block.get("image_caption") or block.get("img_caption"))
+            footnote = _joined(block.get("image_footnote") or block.get("img_footnote"))
+            text = " ".join(part for part in (caption, footnote) if part)
+            if text:
+                yield from typed("figure", text, page, block)
+
+        elif block_type == "code":
+            caption = _joined(block.get("code_caption"))
+            body = str(block.get("code_body") or block.get("text") or "").strip()
+            if body:
+                yield from typed("code", f"{caption}\n{body}" if caption else body, page, block)
+
+    yield from flush()
+
+
+# ============================================================================
+# 基准测试
+# ============================================================================
+
+def _baseline_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """原先各处使用的分块方式: 只按 。 切句，字符串反复拼接，全部结果放在列表里"""
+    sentences = text.replace('\n', ' ').split('。')
+    sentences = [s.strip() + '。' for s in sentences if s.strip()]
+
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) < chunk_size:
+            current_chunk += sentence
+        else:
+            if current_chunk:
+                chunks.append(current_chunk)
+            if overlap > 0 and len(current_chunk) > overlap:
+                current_chunk = current_chunk[-overlap:] + sentence
+            else:
+                current_chunk = sentence
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def _baseline_window_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """原先 ChromaDB VectorDB 的分块方式: 按字符窗口切分，窗口内找最后一个 。"""
+    chunks = []
+    start = 0
+    text = text.replace('\n', ' ')
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            last_period = text.rfind('。', start, end)
+            if last_period > start:
+                end = last_period + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = max(start + chunk_size - overlap, end)
+    return chunks
+
+
+def benchmark(
+    path: str,
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    repeat: int = 3,
+    tokenizer: Optional[str] = None
+):
+    """在给定文件上比较新旧分块实现的耗时、块数与最大 token 数
+
+    原先的实现按字符计数，这里以相同的数值作为其字符数上限。
+    """
+    import tracemalloc
+
+    chunk_size, overlap = _settings(chunk_size, overlap)
+    tokenizer = get_tokenizer(tokenizer)
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    print(f"📄 {path}: {len(text) / 1e6:.1f}M 字符，chunk_size={chunk_size} overlap={overlap}，"
+          f"分词器 {tokenizer.name}")
+
+    def streamed():
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from iter_chunks(iter(lambda: f.read(1 << 16), ""), chunk_size, overlap, tokenizer)
+
+    cases = {
+        "拼接 (按 。)": lambda: _baseline_chunks(text, chunk_size, overlap),
+        "字符窗口": lambda: _baseline_window_chunks(text, chunk_size, overlap),
+        "iter_chunks": lambda: iter_chunks(text, chunk_size, overlap, tokenizer),
+        "iter_chunks (文件流)": streamed,
+    }
+    for name, run in cases.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = sum(1 for _ in run())
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        for _ in run():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        longest = max((count_tokens(chunk, tokenizer) for chunk in run()), default=0)
+        print(f"  {name:<20} {best * 1000:9.1f}ms  {len(text) / best / 1e6:7.1f}M 字符/秒  "
+              f"{count:7d} 块  最多 {longest:8d} token  峰值内存 {peak / 1e6:7.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="文本分块基准测试")
+    parser.add_argument("--bench", required=True, help="用于测试的文本/markdown 文件")
+    parser.add_argument("--chunk-size", type=int, default=None, help="每块 token 数上限")
+    parser.add_argument("--overlap", type=int, default=None, help="重叠 token 数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokenizer", default=None, help="分词器，默认 retrieval.tokenizer")
+    args = parser.parse_args()
+
+    benchmark(args.bench, args.chunk_size, args.overlap, args.repeat, args.tokenizer)
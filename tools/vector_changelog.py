@@ -0,0 +1,224 @@
+"""
+向量库变更日志 (写节点 -> 只读副本的日志传输)
+
+写节点把每次变更 (添加向量/删除/清空) 以 JSON 行追加到日志段文件，每条记录带
+单调递增的版本号；save() 时写出一个快照并轮转日志段，较旧的日志段随之清理。
+只读副本从快照启动一次，之后只增量追读日志段，不再整文件复制索引。
+
+目录结构:
+    <log_dir>/<起始版本>.log        日志段，每行一条记录
+    <log_dir>/<版本>.snapshot       某版本的完整状态 (原子写入)
+"""
+import os
+import json
+import base64
+import pickle
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+SEGMENT_SUFFIX = ".log"
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+def encode_vectors(vectors: np.ndarray) -> Dict:
+    """把向量矩阵编码为可写入 JSON 的结构"""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    return {"dim": int(vectors.shape[1]), "data": base64.b64encode(vectors.tobytes()).decode('ascii')}
+
+
+def decode_vectors(encoded: Dict) -> np.ndarray:
+    """还原 encode_vectors 编码的向量矩阵"""
+    data = np.frombuffer(base64.b64decode(encoded["data"]), dtype='float32')
+    return data.reshape(-1, encoded["dim"])
+
+
+def _list_files(log_dir: Path, suffix: str) -> List[Tuple[int, Path]]:
+    files = []
+    for path in log_dir.glob(f"*{suffix}"):
+        try:
+            files.append((int(path.stem), path))
+        except ValueError:
+            continue
+    return sorted(files)
+
+
+class ChangeLog:
+    """写节点侧的追加日志"""
+
+    def __init__(self, log_dir: str, fsync: bool = False, keep_snapshots: int = 2):
+        """
+        Args:
+            log_dir: 日志目录
+            fsync: 每条记录写入后是否 fsync (更安全但更慢)
+            keep_snapshots: 保留的快照数；早于最旧保留快照的日志段会被清理
+        """
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.keep_snapshots = max(1, keep_snapshots)
+
+        self._lock = threading.Lock()
+        self._file = None
+        self.version = self._last_version()
+
+    def _last_version(self) -> int:
+        """扫描日志段与快照得到最新版本号"""
+        last = 0
+        snapshots = _list_files(self.log_dir, SNAPSHOT_SUFFIX)
+        if snapshots:
+            last = snapshots[-1][0]
+
+        segments = _list_files(self.log_dir, SEGMENT_SUFFIX)
+        if segments:
+            last = max(last, segments[-1][0] - 1)
+            for record in _iter_segment(segments[-1][1]):
+                last = max(last, record["version"])
+        return last
+
+    def read(self, after: int = 0) -> Iterator[Dict]:
+        """按顺序读取版本号大于 after 的记录 (写节点重启恢复用)"""
+        for _, path in _list_files(self.log_dir, SEGMENT_SUFFIX):
+            for record in _iter_segment(path):
+                if record["version"] > after:
+                    yield record
+
+    def append(self, record: Dict) -> int:
+        """追加一条记录
+
+        Returns:
+            该记录的版本号
+        """
+        with self._lock:
+            if self._file is None:
+                segment = self.log_dir / f"{self.version + 1:016d}{SEGMENT_SUFFIX}"
+                self._file = open(segment, 'a', encoding='utf-8')
+
+            self.version += 1
+            line = json.dumps({**record, "version": self.version}, ensure_ascii=False)
+            self._file.write(line + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            return self.version
+
+    def snapshot(self, version: int, vectors: Optional[np.ndarray], texts: List[str], metadata: List[Dict]):
+        """写出 version 时刻的完整状态，轮转日志段并清理过旧的段与快照"""
+        state = {"version": version, "vectors": vectors, "texts": texts, "metadata": metadata}
+        target = self.log_dir / f"{version:016d}{SNAPSHOT_SUFFIX}"
+        tmp = target.with_suffix(".tmp")
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp, target)
+
+        with self._lock:
+            # 新记录写入从 version+1 开始的新日志段
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            snapshots = _list_files(self.log_dir, SNAPSHOT_SUFFIX)
+            retained = snapshots[-self.keep_snapshots:]
+            oldest_retained = retained[0][0]
+
+            for _, path in snapshots[:-self.keep_snapshots]:
+                path.unlink(missing_ok=True)
+
+            segments = _list_files(self.log_dir, SEGMENT_SUFFIX)
+            for i, (start, path) in enumerate(segments):
+                next_start = segments[i + 1][0] if i + 1 < len(segments) else self.version + 1
+                # 整段都早于最旧保留快照时才删除
+                if next_start <= oldest_retained + 1 and path.exists():
+                    path.unlink(missing_ok=True)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _iter_segment(path: Path, offset: int = 0) -> Iterator[Dict]:
+    for record, _ in _iter_segment_with_offsets(path, offset):
+        yield record
+
+
+def _iter_segment_with_offsets(path: Path, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """逐条读取日志段，返回 (记录, 读完该记录后的偏移)；末尾不完整的行留到下次再读"""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield json.loads(line), offset
+
+
+class ChangeLogReader:
+    """只读副本侧的日志追读器"""
+
+    def __init__(self, log_dir: str):
+        self.log_dir = Path(log_dir)
+        self._segment: Optional[int] = None
+        self._offset = 0
+
+    def latest_snapshot(self) -> Optional[Dict]:
+        snapshots = _list_files(self.log_dir, SNAPSHOT_SUFFIX)
+        for _, path in reversed(snapshots):
+            try:
+                with open(path, 'rb') as f:
+                    return pickle.load(f)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                continue
+        return None
+
+    def poll(self, version: int, apply: Callable[[Dict], None], bootstrap: Callable[[Dict], None]) -> int:
+        """应用 version 之后的所有新记录
+
+        Args:
+            version: 副本当前版本
+            apply: 应用单条记录的回调
+            bootstrap: 副本落后于日志保留范围时，用快照重置状态的回调
+
+        Returns:
+            应用后的版本号
+        """
+        segments = _list_files(self.log_dir, SEGMENT_SUFFIX)
+
+        covering = [start for start, _ in segments if start <= version + 1]
+        if not covering:
+            # 需要的记录已被清理 (或尚无日志段)，从更新的快照启动
+            snapshots = _list_files(self.log_dir, SNAPSHOT_SUFFIX)
+            if snapshots and snapshots[-1][0] > version:
+                snapshot = self.latest_snapshot()
+                bootstrap(snapshot)
+                version = snapshot["version"]
+                self._segment, self._offset = None, 0
+                covering = [start for start, _ in segments if start <= version + 1]
+
+        if not covering:
+            if segments:
+                raise RuntimeError(f"副本版本 {version} 落后于日志保留范围且没有可用快照")
+            return version
+
+        for start, path in segments:
+            if start < covering[-1]:
+                continue
+
+            offset = self._offset if start == self._segment else 0
+            for record, offset in _iter_segment_with_offsets(path, offset):
+                if record["version"] <= version:
+                    continue
+                if record["version"] != version + 1:
+                    raise RuntimeError(f"变更日志不连续: 期望版本 {version + 1}, 实际 {record['version']}")
+                apply(record)
+                version = record["version"]
+
+            self._segment, self._offset = start, offset
+
+        return version
@@ -4,21 +4,92 @@
 import os
 import json
 import pickle
+import heapq
+import hashlib
+import itertools
+import time
+import shutil
+import threading
 import numpy as np
 import faiss
 from pathlib import Path
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
 from openai import OpenAI
 from config import get_config
+from tools.vector_changelog import ChangeLog, ChangeLogReader, encode_vectors, decode_vectors
+from services.file_lock import FileLock, writer_id
+from services.embedding_retry import EmbeddingRetryQueue, RetryWorker, has_pending
+from tools.text_chunker import chunk_text  # noqa: F401  保留 tools.vector_db.chunk_text 导入路径
+
+class _Segment:
+    """不可变的索引段
+
+    发布后不再修改；写入总是构建新段并整体替换段列表，检索线程拿到的段列表
+    始终是某个已提交版本的完整视图。
+    """
+
+    __slots__ = ("index", "texts", "metadata", "_postings")
+
+    def __init__(self, index, texts: tuple, metadata: tuple):
+        self.index = index
+        self.texts = texts
+        self.metadata = metadata
+        self._postings: Dict[tuple, np.ndarray] = {}
+
+    @property
+    def size(self) -> int:
+        return self.index.ntotal
+
+    @classmethod
+    def build(cls, dimension: int, vectors: Optional[np.ndarray], texts: List[str], metadata: List[Dict]) -> "_Segment":
+        index = faiss.IndexFlatL2(dimension)
+        if len(texts):
+            index.add(np.asarray(vectors, dtype='float32'))
+        return cls(index, tuple(texts), tuple(metadata))
+
+    def vectors(self) -> np.ndarray:
+        return self.index.reconstruct_n(0, self.size)
+
+    def matching(self, where: Dict) -> np.ndarray:
+        """元数据与 where 中所有键值都相等的条目位置 (按键值缓存，段不可变因此无需失效)"""
+        ids = None
+        for key, value in where.items():
+            posting = self._postings.get((key, value))
+            if posting is None:
+                posting = np.fromiter(
+                    (i for i, meta in enumerate(self.metadata) if meta.get(key) == value),
+                    dtype='int64'
+                )
+                self._postings[(key, value)] = posting
+            ids = posting if ids is None else np.intersect1d(ids, posting, assume_unique=True)
+        return ids
+
 
 class VectorDatabase:
-    """向量数据库，使用API进行Embedding"""
+    """向量数据库，使用API进行Embedding
+
+    数据由若干不可变索引段组成：写入在旁路构建新段后一次性发布新的段列表，
+    检索无锁地读取已发布的段列表，因此批量写入期间检索看到的是上一个已提交版本，
+    延迟不受写入影响。
+
+    磁盘布局支持多个进程同时写入同一目录:
+        faiss.index / texts.pkl / metadata.json / checkpoint.json   合并后的基础索引
+        segments/<时间戳>-<写入者>/                                 各写入进程 save() 落下的段
+    每个进程只把自己上次保存以来的新增与删除写成新的段目录 (无需全局锁)；
+    持有租约锁 (.lock) 的进程把段目录按时间顺序合并进基础索引；load() 同样持锁读取，
+    不会读到合并了一半的文件。
+    """
 
-    def __init__(self, index_path: str = None):
+    # 是否记录未保存的变更 (只读副本不落盘)
+    _persists_writes = True
+
+    def __init__(self, index_path: str = None, changelog_dir: str = None):
         """初始化向量数据库
 
         Args:
             index_path: 索引文件路径
+            changelog_dir: 变更日志目录(可选)，指定后作为写节点把变更传输给只读副本
         """
         config = get_config()
 
@@ -41,15 +112,75 @@ class VectorDatabase:
         self.index_file = self.index_path / "faiss.index"
         self.texts_file = self.index_path / "texts.pkl"
         self.metadata_file = self.index_path / "metadata.json"
+        self.checkpoint_file = self.index_path / "checkpoint.json"
+        self.segments_dir = self.index_path / "segments"
+        self.compaction_file = self.index_path / "compaction.json"
+
+        # 写锁串行化本进程内的变更；检索不加锁
+        self._write_lock = threading.Lock()
+
+        # 跨进程的合并锁 (带租约)，在合并段目录、重写基础索引与从磁盘加载时持有
+        self.writer_id = writer_id()
+        self._file_lock = FileLock(
+            self.index_path / ".lock",
+            lease=config.get('vector_db.storage.lock_lease', 30.0)
+        )
+        self._lock_timeout = config.get('vector_db.storage.lock_timeout', 120.0)
 
-        # 初始化或加载索引
-        self.texts = []
-        self.metadata = []
+        # 已发布的段列表 (整体替换，从不原地修改)
+        self._segments: tuple = ()
 
-        if self.index_file.exists():
+        # 上次保存以来本进程的新增与删除，save() 时写成新的段目录
+        self._unsaved_adds: List[tuple] = []
+        self._unsaved_deletes: List[Dict] = []
+
+        # 数据版本号: 每次变更加一，启用变更日志时与日志版本一致
+        self.version = 0
+        self._saved_version = 0
+
+        if self.index_file.exists() or self._segment_names():
             self.load()
-        else:
-            self.index = faiss.IndexFlatL2(self.dimension)
+
+        self.changelog = None
+        if changelog_dir:
+            self._open_changelog(changelog_dir, config.get('vector_db.replication.fsync', False))
+
+        # 向量化失败的文本块进入重试队列，重试成功后再写入；上次未处理完的条目继续重试
+        self._retry_worker: Optional[RetryWorker] = None
+        if self._persists_writes and has_pending(str(self.index_path)):
+            self._ensure_retry_worker()
+
+    @property
+    def ntotal(self) -> int:
+        """向量总数"""
+        return sum(segment.size for segment in self._segments)
+
+    @property
+    def texts(self) -> List[str]:
+        """当前版本的全部文本"""
+        return [text for segment in self._segments for text in segment.texts]
+
+    @property
+    def metadata(self) -> List[Dict]:
+        """当前版本的全部元数据"""
+        return [meta for segment in self._segments for meta in segment.metadata]
+
+    def _open_changelog(self, changelog_dir: str, fsync: bool):
+        """打开变更日志，并重放上次保存之后的记录"""
+        self.changelog = ChangeLog(changelog_dir, fsync=fsync)
+
+        replayed = 0
+        for record in self.changelog.read(after=self.version):
+            self._apply_record(record)
+            replayed += 1
+        if replayed:
+            print(f"已从变更日志恢复 {replayed} 条记录 (版本 {self.version})")
+
+        # 在已有数据上首次启用变更日志: 以当前状态写出基线快照，副本从这里启动
+        if self.changelog.version < self.version or (self.changelog.version == 0 and self.ntotal > 0):
+            self.version = max(self.version, 1)
+            self.changelog.version = self.version
+            self._write_snapshot()
 
     def embed(self, text: str) -> np.ndarray:
         """将文本转换为向量
@@ -59,170 +190,883 @@ class VectorDatabase:
 
         Returns:
             向量数组
+
+        Raises:
+            调用 Embedding API 失败时抛出原异常 (不再返回零向量，避免污染索引)
         """
-        try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
+        response = self.client.embeddings.create(
+            model=self.embedding_model,
+            input=text
+        )
+        embedding = response.data[0].embedding
+        return np.array(embedding, dtype='float32')
+
+    def _ensure_retry_worker(self) -> RetryWorker:
+        if self._retry_worker is None:
+            self._retry_worker = RetryWorker(
+                EmbeddingRetryQueue(),
+                str(self.index_path),
+                self.embed,
+                lambda item, embedding: self.add_vectors(
+                    np.asarray(embedding, dtype='float32')[None],
+                    [item["text"]],
+                    [item["payload"]["metadata"]] if item["payload"].get("metadata") is not None else None
+                ),
+                # add_vectors 只写入内存，保存后才把条目移出重试队列
+                flush=self.save
             )
-            embedding = response.data[0].embedding
-            return np.array(embedding, dtype='float32')
+        self._retry_worker.start()
+        return self._retry_worker
 
-        except Exception as e:
-            print(f"Embedding失败: {e}")
-            # 返回零向量
-            return np.zeros(self.dimension, dtype='float32')
+    def retry_later(self, text: str, metadata: Optional[Dict], error: Exception):
+        """把向量化失败的文本块放入重试队列 (不进入可检索集合)"""
+        worker = self._ensure_retry_worker()
+        worker.queue.put(str(self.index_path), text, {"metadata": metadata}, str(error))
+
+    def retry_depth(self) -> Dict[str, int]:
+        """本索引在重试队列中的条数: {"pending": 待重试, "dead": 死信}"""
+        queue = self._retry_worker.queue if self._retry_worker is not None else EmbeddingRetryQueue()
+        return queue.depth(str(self.index_path))
 
-    def add(self, texts: List[str], metadata: List[Dict] = None):
+    def add(self, texts: List[str], metadata: List[Dict] = None) -> int:
         """添加文本到数据库
 
         Args:
             texts: 文本列表
             metadata: 元数据列表(可选)
+
+        Returns:
+            写入后的数据版本号
         """
         if not texts:
-            return
+            return self.version
 
         print(f"正在向量化 {len(texts)} 个文本块...")
 
-        embeddings = []
+        embeddings, kept = [], []
         for i, text in enumerate(texts):
             if (i + 1) % 10 == 0:
                 print(f"进度: {i + 1}/{len(texts)}")
 
-            embedding = self.embed(text)
+            try:
+                embedding = self.embed(text)
+            except Exception as e:
+                print(f"Embedding失败，已加入重试队列: {e}")
+                self.retry_later(text, metadata[i] if metadata is not None else None, e)
+                continue
             embeddings.append(embedding)
+            kept.append(i)
+
+        if not kept:
+            return self.version
 
         # 转换为numpy数组
         embeddings = np.array(embeddings).astype('float32')
 
-        # 添加到FAISS索引
-        self.index.add(embeddings)
+        version = self.add_vectors(
+            embeddings,
+            [texts[i] for i in kept],
+            [metadata[i] for i in kept] if metadata is not None else None
+        )
 
-        # 保存文本和元数据
-        self.texts.extend(texts)
+        print(f"成功添加 {len(kept)} 个文本块" + (f"，{len(texts) - len(kept)} 个待重试" if len(kept) < len(texts) else ""))
+        return version
 
-        if metadata is None:
-            metadata = [{"index": len(self.metadata) + i} for i in range(len(texts))]
+    def add_vectors(self, embeddings: np.ndarray, texts: List[str], metadata: List[Dict] = None) -> int:
+        """添加已向量化的文本
+
+        整批文本构建成一个新段后原子发布，检索要么看不到这批文本，要么看到全部。
+
+        Args:
+            embeddings: 向量矩阵, 形状为 (len(texts), dimension)
+            texts: 文本列表
+            metadata: 元数据列表(可选)
+
+        Returns:
+            写入后的数据版本号 (可传给副本的 search(min_version=...) 实现读己之写)
+        """
+        if not texts:
+            return self.version
+
+        embeddings = np.asarray(embeddings, dtype='float32').reshape(len(texts), -1)
+
+        with self._write_lock:
+            if metadata is None:
+                offset = self.ntotal
+                metadata = [{"index": offset + i} for i in range(len(texts))]
 
-        self.metadata.extend(metadata)
+            self._apply_add(embeddings, texts, metadata)
 
-        print(f"成功添加 {len(texts)} 个文本块")
+            record = None
+            if self.changelog is not None:
+                record = {"op": "add", "vectors": encode_vectors(embeddings), "texts": texts, "metadata": metadata}
+            return self._commit(record)
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def _apply_add(self, embeddings: np.ndarray, texts: List[str], metadata: List[Dict]):
+        """构建新段并发布 (调用方需持有写锁)"""
+        segment = _Segment.build(self.dimension, embeddings, texts, metadata)
+        self._segments = self._segments + (segment,)
+        self._merge_tail()
+
+        if self._persists_writes:
+            self._unsaved_adds.append((embeddings, list(texts), list(metadata)))
+
+    def _apply_delete(self, where: Dict) -> int:
+        """删除匹配条目，并记下删除条件供 save() 落盘 (调用方需持有写锁)"""
+        keep = self._not_matching(where)
+        removed = self._rebuild_locked(keep)
+
+        if self._persists_writes:
+            # 本进程未保存的新增里匹配的条目直接去掉，删除条件只需作用于更早的数据
+            self._unsaved_adds = [
+                (vectors[mask], [t for t, m in zip(texts, mask) if m], [meta for meta, m in zip(metadata, mask) if m])
+                for vectors, texts, metadata in self._unsaved_adds
+                for mask in [np.array([keep(meta) for meta in metadata], dtype=bool)]
+                if mask.any()
+            ]
+            self._unsaved_deletes.append(where)
+        return removed
+
+    def _merge_tail(self):
+        """分层合并尾部的段 (调用方需持有写锁)
+
+        最新段不小于前一段时二者合并，类似二项堆，段数保持在 O(log N)，
+        每个向量被重写的次数也是 O(log N)。合并结果构建完成后才发布。
+        """
+        segments = self._segments
+        merged = False
+        while len(segments) > 1 and segments[-1].size >= segments[-2].size:
+            segments = segments[:-2] + (self._concat(segments[-2:]),)
+            merged = True
+        if merged:
+            self._segments = segments
+
+    def _concat(self, segments, keep: Callable[[Dict], bool] = None) -> _Segment:
+        """把多个段合并成一个新段，可选地过滤条目"""
+        vectors, texts, metadata = [], [], []
+        for segment in segments:
+            if segment.size == 0:
+                continue
+            ids = [
+                i for i, meta in enumerate(segment.metadata)
+                if keep is None or keep(meta)
+            ]
+            if not ids:
+                continue
+            vectors.append(segment.vectors()[ids])
+            texts.extend(segment.texts[i] for i in ids)
+            metadata.extend(segment.metadata[i] for i in ids)
+
+        stacked = np.vstack(vectors) if vectors else None
+        return _Segment.build(self.dimension, stacked, texts, metadata)
+
+    def _commit(self, record: Optional[Dict]) -> int:
+        """记录一次变更并推进版本号 (调用方需持有写锁)"""
+        if self.changelog is not None:
+            self.version = self.changelog.append(record)
+        else:
+            self.version += 1
+        return self.version
+
+    def _apply_record(self, record: Dict):
+        """应用一条变更日志记录"""
+        op = record["op"]
+        if op == "add":
+            self._apply_add(decode_vectors(record["vectors"]), record["texts"], record["metadata"])
+        elif op == "delete":
+            self._apply_delete(record["where"])
+        elif op == "clear":
+            self._apply_clear()
+        else:
+            raise ValueError(f"未知的变更类型: {op}")
+        self.version = record["version"]
+
+    def search(self, query: str, top_k: int = 5, where: Optional[Dict] = None) -> List[Dict[str, Any]]:
         """检索最相关的文本
 
         Args:
             query: 查询文本
             top_k: 返回结果数量
+            where: 元数据等值过滤，如 {"chunk_type": "table", "section": "3 Method"}
 
         Returns:
             结果列表，每个包含 text, score, metadata
         """
-        if self.index.ntotal == 0:
+        if self.ntotal == 0:
             return []
 
         # 向量化查询
-        query_embedding = self.embed(query).reshape(1, -1).astype('float32')
+        try:
+            query_embedding = self.embed(query)
+        except Exception as e:
+            print(f"查询向量化失败: {e}")
+            return []
 
-        # 搜索
-        distances, indices = self.index.search(query_embedding, min(top_k, self.index.ntotal))
+        return self.search_vector(query_embedding, top_k, where)
 
-        # 构建结果
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.texts):
-                results.append({
-                    "text": self.texts[idx],
-                    "score": float(distances[0][i]),
-                    "metadata": self.metadata[idx] if idx < len(self.metadata) else {}
-                })
+    def search_vector(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        where: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """使用已向量化的查询检索
 
-        return results
+        Args:
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+            where: 元数据等值过滤；在 FAISS 内按 ID 选择器过滤，而不是检索后丢弃
+
+        Returns:
+            按距离升序排列的结果列表，每个包含 text, score, metadata
+        """
+        query_embedding = np.asarray(query_embedding, dtype='float32').reshape(1, -1)
+
+        # 读取已发布的段列表，之后的写入不影响本次检索
+        segments = self._segments
+
+        partials = []
+        for segment in segments:
+            if segment.size == 0:
+                continue
+
+            # 搜索 (FAISS 在检索期间释放 GIL)
+            if where:
+                ids = segment.matching(where)
+                if len(ids) == 0:
+                    continue
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+                distances, indices = segment.index.search(query_embedding, min(top_k, len(ids)), params=params)
+            else:
+                distances, indices = segment.index.search(query_embedding, min(top_k, segment.size))
+
+            partials.append([
+                {
+                    "text": segment.texts[idx],
+                    "score": float(distance),
+                    "metadata": segment.metadata[idx]
+                }
+                for distance, idx in zip(distances[0], indices[0])
+                if idx >= 0
+            ])
+
+        merged = heapq.merge(*partials, key=lambda r: r["score"])
+        return list(itertools.islice(merged, top_k))
+
+    def rebuild(self, keep: Callable[[Dict], bool] = None) -> int:
+        """重建(压缩)索引
+
+        所有段合并为一个新段，构建完成后一次性发布；重建期间检索继续读取旧版本。
+        过滤函数无法写成段目录，因此带 keep 的重建会持有合并锁，先合并磁盘上所有
+        写入者的数据，再过滤并直接重写基础索引。
+
+        Args:
+            keep: 过滤函数，接收元数据，返回 False 的条目将被移除；为 None 时保留全部。
+                启用变更日志时过滤函数无法传输给副本，请改用 delete(where)
+
+        Returns:
+            被移除的条目数
+        """
+        if keep is not None and self.changelog is not None:
+            raise ValueError("启用变更日志时请使用 delete(where) 删除条目，以便同步到副本")
+
+        with self._write_lock:
+            if keep is None:
+                return self._rebuild_locked()
+
+            self._file_lock.acquire(timeout=self._lock_timeout)
+            try:
+                self._flush_locked()
+                self._compact_locked()
+                self._load_locked()
+                removed = self._rebuild_locked(keep)
+                if removed:
+                    self._write_base(self._concat(self._segments), self.version, merged=[])
+                return removed
+            finally:
+                self._file_lock.release()
+
+    def delete(self, where: Dict) -> int:
+        """删除元数据与 where 中所有键值都相等的条目
+
+        Args:
+            where: 匹配条件，如 {"doc_id": "paper_1"}
+
+        Returns:
+            被删除的条目数
+        """
+        with self._write_lock:
+            removed = self._apply_delete(where)
+            if removed:
+                self._commit({"op": "delete", "where": where} if self.changelog is not None else None)
+            return removed
+
+    @staticmethod
+    def _not_matching(where: Dict) -> Callable[[Dict], bool]:
+        return lambda meta: not all(meta.get(key) == value for key, value in where.items())
+
+    def _rebuild_locked(self, keep: Callable[[Dict], bool] = None) -> int:
+        """重建索引 (调用方需持有写锁)"""
+        segments = self._segments
+        total = sum(segment.size for segment in segments)
+
+        rebuilt = self._concat(segments, keep)
+        self._segments = (rebuilt,) if rebuilt.size else ()
+
+        return total - rebuilt.size
 
     def save(self):
-        """保存索引到磁盘"""
+        """保存索引到磁盘 (启用变更日志时同时写出快照并清理旧日志段)
+
+        本进程上次保存以来的变更写成一个新的段目录，随后在合并锁空闲时把所有
+        段目录合并进基础索引；锁被其他进程占用时跳过合并，由下一次保存或持锁进程完成。
+        """
+        with self._write_lock:
+            self._rebuild_locked()
+            self._flush_locked()
+
+            if self.changelog is not None:
+                self._write_snapshot()
+
+        self.compact(wait=False)
+
+        print(f"索引已保存到 {self.index_path}")
+
+    def compact(self, wait: bool = True) -> bool:
+        """把所有写入者的段目录合并进基础索引
+
+        Args:
+            wait: 是否等待合并锁；为 False 时锁被占用则直接返回
+
+        Returns:
+            是否执行了合并
+        """
+        if not self._file_lock.acquire(timeout=self._lock_timeout, blocking=wait):
+            return False
+        try:
+            self._compact_locked()
+        finally:
+            self._file_lock.release()
+        return True
+
+    def _segment_names(self) -> List[str]:
+        """磁盘上已完成的段目录，按写入时间排序"""
+        if not self.segments_dir.exists():
+            return []
+        return sorted(p.name for p in self.segments_dir.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+    def _flush_locked(self):
+        """把未保存的变更写成本进程的新段目录 (调用方需持有写锁)
+
+        先写到隐藏的临时目录，完成后改名发布，合并进程不会读到写了一半的段。
+        """
+        if not (self._unsaved_adds or self._unsaved_deletes or self.version != self._saved_version):
+            return
+
+        texts = [text for _, part, _ in self._unsaved_adds for text in part]
+        metadata = [meta for _, _, part in self._unsaved_adds for meta in part]
+        vectors = np.vstack([v for v, _, _ in self._unsaved_adds]) if texts else None
+        segment = _Segment.build(self.dimension, vectors, texts, metadata)
+
+        name = f"{time.time_ns():020d}-{self.writer_id}"
+        tmp = self.segments_dir / f".{name}"
+        tmp.mkdir(parents=True)
+        self._write_files(tmp, segment, self.version)
+        with open(tmp / "deletes.json", 'w', encoding='utf-8') as f:
+            json.dump(self._unsaved_deletes, f, ensure_ascii=False)
+        os.rename(tmp, self.segments_dir / name)
+
+        self._unsaved_adds = []
+        self._unsaved_deletes = []
+        self._saved_version = self.version
+
+    def _compact_locked(self):
+        """合并段目录 (调用方需持有合并锁)
+
+        新的基础索引先写成临时文件，再记录合并意图 (compaction.json)，之后才替换
+        文件并删除段目录；中途崩溃时由下一个持锁进程按意图文件继续完成。
+        """
+        self._finish_compaction()
+
+        names = self._segment_names()
+        if not names:
+            return
+
+        segment, version = self._merge_from_disk(names)
+        self._file_lock.check()
+        self._write_base(segment, version, merged=names)
+
+    def _write_base(self, segment: _Segment, version: int, merged: List[str]):
+        """以可恢复的方式重写基础索引 (调用方需持有合并锁)"""
+        self._write_files(self.index_path, segment, version, suffix=".tmp")
+
+        tmp = self.compaction_file.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"merged": merged}, f)
+        os.replace(tmp, self.compaction_file)
+
+        self._finish_compaction()
+
+    def _finish_compaction(self):
+        """按合并意图文件替换基础索引并删除已合并的段目录 (可重复执行)"""
+        if not self.compaction_file.exists():
+            return
+
+        with open(self.compaction_file, 'r', encoding='utf-8') as f:
+            merged = json.load(f)["merged"]
+
+        for path in (self.index_file, self.texts_file, self.metadata_file, self.checkpoint_file):
+            tmp = path.with_name(path.name + ".tmp")
+            if tmp.exists():
+                os.replace(tmp, path)
+
+        for name in merged:
+            shutil.rmtree(self.segments_dir / name, ignore_errors=True)
+
+        self.compaction_file.unlink()
+
+    def _write_files(self, directory: Path, segment: _Segment, version: int, suffix: str = ""):
+        """按基础索引的文件格式写出一个段"""
         # 保存FAISS索引
-        faiss.write_index(self.index, str(self.index_file))
+        faiss.write_index(segment.index, str(directory / f"faiss.index{suffix}"))
 
         # 保存文本
-        with open(self.texts_file, 'wb') as f:
-            pickle.dump(self.texts, f)
+        with open(directory / f"texts.pkl{suffix}", 'wb') as f:
+            pickle.dump(list(segment.texts), f)
 
         # 保存元数据
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        with open(directory / f"metadata.json{suffix}", 'w', encoding='utf-8') as f:
+            json.dump(list(segment.metadata), f, ensure_ascii=False, indent=2)
 
-        print(f"索引已保存到 {self.index_path}")
+        # 保存数据版本号
+        with open(directory / f"checkpoint.json{suffix}", 'w', encoding='utf-8') as f:
+            json.dump({"version": version}, f)
+
+    def _read_files(self, directory: Path) -> tuple:
+        """读取 _write_files 写出的段，返回 (段, 版本号)"""
+        index_file = directory / "faiss.index"
+        if not index_file.exists():
+            return _Segment.build(self.dimension, None, [], []), 0
 
-    def load(self):
-        """从磁盘加载索引"""
         # 加载FAISS索引
-        self.index = faiss.read_index(str(self.index_file))
+        index = faiss.read_index(str(index_file))
 
         # 加载文本
-        if self.texts_file.exists():
-            with open(self.texts_file, 'rb') as f:
-                self.texts = pickle.load(f)
+        texts = []
+        if (directory / "texts.pkl").exists():
+            with open(directory / "texts.pkl", 'rb') as f:
+                texts = pickle.load(f)
+
+        # 加载元数据 (缺失的条目补空字典，保持与文本一一对应)
+        metadata = []
+        if (directory / "metadata.json").exists():
+            with open(directory / "metadata.json", 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        metadata = (metadata + [{}] * len(texts))[:len(texts)]
+
+        version = 0
+        if (directory / "checkpoint.json").exists():
+            with open(directory / "checkpoint.json", 'r', encoding='utf-8') as f:
+                version = json.load(f)["version"]
+
+        return _Segment(index, tuple(texts), tuple(metadata)), version
+
+    def _merge_from_disk(self, names: List[str]) -> tuple:
+        """读取基础索引并按时间顺序应用各段目录的删除与新增，返回 (段, 版本号)"""
+        base, version = self._read_files(self.index_path)
+        parts = [base]
 
-        # 加载元数据
-        if self.metadata_file.exists():
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
+        for name in names:
+            directory = self.segments_dir / name
+            segment, segment_version = self._read_files(directory)
+            version = max(version, segment_version)
+
+            deletes = []
+            if (directory / "deletes.json").exists():
+                with open(directory / "deletes.json", 'r', encoding='utf-8') as f:
+                    deletes = json.load(f)
+            if deletes:
+                keeps = [self._not_matching(where) for where in deletes]
+                parts = [self._concat(parts, lambda meta: all(keep(meta) for keep in keeps))]
+
+            parts.append(segment)
+
+        return self._concat(parts), version
+
+    def _write_snapshot(self):
+        """把当前状态写成变更日志快照 (调用方需持有写锁)"""
+        segment = self._concat(self._segments)
+        vectors = segment.vectors() if segment.size else None
+        self.changelog.snapshot(self.version, vectors, list(segment.texts), list(segment.metadata))
+
+    def load(self):
+        """从磁盘加载索引 (基础索引加上所有写入者尚未合并的段目录)
+
+        其他进程保存的数据在重新 load() 后可见；本进程未保存的变更会被丢弃。
+        读取期间持有合并锁: 合并进程逐个替换基础索引的文件并删除已合并的段目录，
+        不加锁读取可能读到新索引配旧文本，或新的基础索引加上已合并的段 (重复条目)。
+        """
+        with self._write_lock:
+            self._file_lock.acquire(timeout=self._lock_timeout)
+            try:
+                # 上一次合并没有完成时先补完再读
+                self._finish_compaction()
+                self._load_locked()
+            finally:
+                self._file_lock.release()
 
-        print(f"索引已加载，共 {self.index.ntotal} 个向量")
+        print(f"索引已加载，共 {self.ntotal} 个向量")
+
+    def _load_locked(self):
+        """读取基础索引与段目录 (调用方需持有写锁与合并锁)"""
+        segment, version = self._merge_from_disk(self._segment_names())
+        self._segments = (segment,) if segment.size else ()
+        self.version = self._saved_version = version
+        self._unsaved_adds = []
+        self._unsaved_deletes = []
 
     def clear(self):
         """清空索引"""
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.texts = []
-        self.metadata = []
+        with self._write_lock:
+            self._apply_clear()
+            self._commit({"op": "clear"} if self.changelog is not None else None)
+
+    def _apply_clear(self):
+        self._segments = ()
+
+        if self._persists_writes:
+            # 空条件匹配所有条目
+            self._unsaved_adds = []
+            self._unsaved_deletes.append({})
+
+
+class VectorDatabaseReplica(VectorDatabase):
+    """只读副本
+
+    追读写节点 (VectorDatabase(changelog_dir=...)) 的变更日志并增量应用，
+    首次启动或落后于日志保留范围时从快照启动。检索可指定 min_version，
+    等待副本追上写节点返回的版本号后再查询 (读己之写)。
+    """
+
+    _persists_writes = False
+
+    def __init__(self, log_dir: str = None, index_path: str = None, poll_interval: float = None):
+        """初始化只读副本
+
+        Args:
+            log_dir: 写节点的变更日志目录，默认读取 vector_db.replication.log_dir
+            index_path: 副本自身的持久化目录，默认读取 vector_db.replication.replica_path
+            poll_interval: 追读间隔(秒)，默认读取 vector_db.replication.poll_interval
+        """
+        config = get_config()
+
+        if log_dir is None:
+            log_dir = config.get('vector_db.replication.log_dir', './data/vector_changelog')
+        if index_path is None:
+            index_path = config.get('vector_db.replication.replica_path', './data/vector_replica')
+        if poll_interval is None:
+            poll_interval = config.get('vector_db.replication.poll_interval', 1.0)
+
+        super().__init__(index_path=index_path)
 
-# 文本分块工具
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """将长文本分块
+        self.poll_interval = poll_interval
+        self.read_timeout = config.get('vector_db.replication.read_timeout', 10.0)
+        self.reader = ChangeLogReader(log_dir)
 
-    Args:
-        text: 输入文本
-        chunk_size: 块大小
-        overlap: 重叠大小
+        self._version_changed = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
 
-    Returns:
-        文本块列表
+    def catch_up(self) -> int:
+        """应用所有新的日志记录
+
+        Returns:
+            本次应用的版本数
+        """
+        with self._write_lock:
+            before = self.version
+            self.version = self.reader.poll(self.version, self._apply_record, self._bootstrap)
+            applied = self.version - before
+
+        if applied:
+            with self._version_changed:
+                self._version_changed.notify_all()
+        return applied
+
+    def _bootstrap(self, snapshot: Dict):
+        """用快照重置副本状态 (调用方需持有写锁)"""
+        segment = _Segment.build(self.dimension, snapshot["vectors"], snapshot["texts"], snapshot["metadata"])
+        self._segments = (segment,) if segment.size else ()
+        self.version = snapshot["version"]
+
+        print(f"副本已从快照启动 (版本 {self.version}, {segment.size} 个向量)")
+
+    def start(self):
+        """启动后台追读线程"""
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._follow, name="vector-replica", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台追读线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _follow(self):
+        while not self._stop_event.is_set():
+            try:
+                self.catch_up()
+            except Exception as e:
+                print(f"副本追读失败: {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def wait_for_version(self, version: int, timeout: float = None) -> bool:
+        """等待副本追上指定版本
+
+        Returns:
+            是否在超时前追上
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while self.version < version:
+            # 未启动后台线程时主动拉取
+            if self._thread is None:
+                self.catch_up()
+                if self.version >= version:
+                    break
+
+            wait = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+
+            with self._version_changed:
+                self._version_changed.wait(wait)
+
+        return True
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        min_version: int = None,
+        where: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """检索 (可要求副本至少追上 min_version)"""
+        if min_version is not None and not self.wait_for_version(min_version, self.read_timeout):
+            raise TimeoutError(f"副本在 {self.read_timeout} 秒内未追上版本 {min_version} (当前 {self.version})")
+
+        return super().search(query, top_k, where)
+
+    def add(self, *args, **kwargs):
+        raise RuntimeError("只读副本不支持写入，请写入主节点")
+
+    def add_vectors(self, *args, **kwargs):
+        raise RuntimeError("只读副本不支持写入，请写入主节点")
+
+    def delete(self, *args, **kwargs):
+        raise RuntimeError("只读副本不支持写入，请写入主节点")
+
+    def rebuild(self, *args, **kwargs):
+        raise RuntimeError("只读副本不支持写入，请写入主节点")
+
+    def clear(self):
+        raise RuntimeError("只读副本不支持写入，请写入主节点")
+
+
+class ShardedVectorDatabase:
+    """分片向量数据库
+
+    按文档哈希把数据划分到 N 个 VectorDatabase 分片，检索时在线程池中并行查询
+    各分片 (FAISS/NumPy 检索期间释放 GIL)，再用堆归并各分片的 top-k。
+    重建与压缩逐个分片进行，其余分片照常服务。
     """
-    if not text:
-        return []
 
-    # 按句子分割
-    sentences = text.replace('\n', ' ').split('。')
-    sentences = [s.strip() + '。' for s in sentences if s.strip()]
+    MANIFEST_NAME = "shards.json"
+
+    def __init__(self, index_path: str = None, num_shards: int = None, max_workers: int = None):
+        """初始化分片向量数据库
+
+        Args:
+            index_path: 索引根目录，每个分片存放在 shard_XX 子目录
+            num_shards: 分片数量，默认读取 vector_db.num_shards
+            max_workers: 检索线程数，默认读取 vector_db.search_workers
+        """
+        config = get_config()
 
-    chunks = []
-    current_chunk = ""
-    current_length = 0
+        if index_path is None:
+            index_path = config.get('vector_db.index_path', './data/vector_index')
+        if num_shards is None:
+            num_shards = config.get('vector_db.num_shards', 4)
 
-    for sentence in sentences:
-        sentence_length = len(sentence)
+        self.index_path = Path(index_path)
+        self.index_path.mkdir(parents=True, exist_ok=True)
 
-        if current_length + sentence_length < chunk_size:
-            current_chunk += sentence
-            current_length += sentence_length
+        # 分片数一旦落盘就固定，否则文档路由会错位
+        manifest_file = self.index_path / self.MANIFEST_NAME
+        if manifest_file.exists():
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                stored_shards = json.load(f)["num_shards"]
+            if stored_shards != num_shards:
+                print(f"⚠️ 索引已按 {stored_shards} 个分片构建，忽略配置的 {num_shards}")
+            num_shards = stored_shards
         else:
-            if current_chunk:
-                chunks.append(current_chunk)
+            with open(manifest_file, 'w', encoding='utf-8') as f:
+                json.dump({"num_shards": num_shards}, f)
 
-            # 添加overlap
-            if overlap > 0 and len(current_chunk) > overlap:
-                current_chunk = current_chunk[-overlap:] + sentence
-                current_length = overlap + sentence_length
-            else:
-                current_chunk = sentence
-                current_length = sentence_length
+        self.num_shards = num_shards
+        self.shards = [
+            VectorDatabase(index_path=str(self.index_path / f"shard_{i:02d}"))
+            for i in range(num_shards)
+        ]
+
+        if max_workers is None:
+            max_workers = config.get('vector_db.search_workers') or min(num_shards, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-shard")
+
+    @property
+    def ntotal(self) -> int:
+        """所有分片的向量总数"""
+        return sum(shard.ntotal for shard in self.shards)
+
+    def retry_depth(self) -> Dict[str, int]:
+        """所有分片在重试队列中的条数"""
+        depths = [shard.retry_depth() for shard in self.shards]
+        return {key: sum(depth[key] for depth in depths) for key in ("pending", "dead")}
+
+    def embed(self, text: str) -> np.ndarray:
+        """将文本转换为向量 (所有分片共用同一个Embedding模型)"""
+        return self.shards[0].embed(text)
+
+    def shard_for(self, doc_key: str) -> int:
+        """计算文档所属分片
+
+        Args:
+            doc_key: 文档标识 (doc_id 或 source)
+
+        Returns:
+            分片编号
+        """
+        digest = hashlib.md5(doc_key.encode('utf-8')).hexdigest()
+        return int(digest[:8], 16) % self.num_shards
+
+    @staticmethod
+    def _doc_key(text: str, metadata: Dict) -> str:
+        """确定用于路由的文档标识，同一文档的所有块落在同一分片"""
+        return str(metadata.get("doc_id") or metadata.get("source") or text)
+
+    def add(self, texts: List[str], metadata: List[Dict] = None, doc_id: Optional[str] = None):
+        """添加文本到数据库
+
+        Args:
+            texts: 文本列表
+            metadata: 元数据列表(可选)
+            doc_id: 文档ID(可选)，指定时所有文本写入同一分片
+        """
+        if not texts:
+            return
+
+        if metadata is None:
+            metadata = [{} for _ in texts]
+        if doc_id is not None:
+            metadata = [{**meta, "doc_id": doc_id} for meta in metadata]
+
+        print(f"正在向量化 {len(texts)} 个文本块...")
+
+        # 按分片分组后批量写入；向量化失败的文本块进入所属分片的重试队列
+        groups: Dict[int, List[int]] = {}
+        embeddings: Dict[int, np.ndarray] = {}
+        for i, (text, meta) in enumerate(zip(texts, metadata)):
+            shard_id = self.shard_for(self._doc_key(text, meta))
+            try:
+                embeddings[i] = self.embed(text)
+            except Exception as e:
+                print(f"Embedding失败，已加入重试队列: {e}")
+                self.shards[shard_id].retry_later(text, meta, e)
+                continue
+            groups.setdefault(shard_id, []).append(i)
 
-    if current_chunk:
-        chunks.append(current_chunk)
+        for shard_id, ids in groups.items():
+            self.shards[shard_id].add_vectors(
+                np.array([embeddings[i] for i in ids], dtype='float32'),
+                [texts[i] for i in ids],
+                [metadata[i] for i in ids]
+            )
+
+        print(f"成功添加 {len(embeddings)} 个文本块 (涉及 {len(groups)} 个分片)")
+
+    def search(self, query: str, top_k: int = 5, where: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """并行检索所有分片并归并 top-k
+
+        Args:
+            query: 查询文本
+            top_k: 返回结果数量
+            where: 元数据等值过滤
+
+        Returns:
+            结果列表，每个包含 text, score, metadata
+        """
+        if self.ntotal == 0:
+            return []
+
+        try:
+            query_embedding = self.embed(query)
+        except Exception as e:
+            print(f"查询向量化失败: {e}")
+            return []
+
+        futures = [
+            self._executor.submit(shard.search_vector, query_embedding, top_k, where)
+            for shard in self.shards
+        ]
 
-    return chunks
+        # 各分片结果已按距离升序，堆归并取全局 top-k
+        merged = heapq.merge(*(future.result() for future in futures), key=lambda r: r["score"])
+        return list(itertools.islice(merged, top_k))
+
+    def rebuild(self, keep: Callable[[Dict], bool] = None) -> int:
+        """逐个分片重建(压缩)索引
+
+        Args:
+            keep: 过滤函数，接收元数据，返回 False 的条目将被移除
+
+        Returns:
+            被移除的条目总数
+        """
+        removed = 0
+        for i, shard in enumerate(self.shards):
+            removed += shard.rebuild(keep)
+            print(f"分片 {i + 1}/{self.num_shards} 重建完成")
+        return removed
+
+    def delete_document(self, doc_key: str) -> int:
+        """删除文档，只重建其所在分片
+
+        Args:
+            doc_key: 文档标识 (doc_id 或 source)
+
+        Returns:
+            被删除的文本块数
+        """
+        shard = self.shards[self.shard_for(doc_key)]
+        return shard.delete({"doc_id": doc_key}) or shard.delete({"source": doc_key})
+
+    def save(self):
+        """保存所有分片到磁盘"""
+        for shard in self.shards:
+            shard.save()
+
+    def clear(self):
+        """清空所有分片"""
+        for shard in self.shards:
+            shard.clear()
 
 # 测试代码
 if __name__ == "__main__":
@@ -3,19 +3,27 @@
 使用ChromaDB + 本地嵌入模型
 """
 import json
+import time
 from pathlib import Path
 from typing import List, Dict, Optional
 import uuid
 
+from tools.text_chunker import chunk_text, chunk_content_list
+from services.incremental_index import document_identity, sync_document, format_report
+
 
 class VectorDB:
     """基于ChromaDB的向量数据库"""
 
+    # 本地模型加载失败后，间隔多久再尝试加载(秒)
+    MODEL_RETRY_INTERVAL = 60
+
     def __init__(self, collection_name: str = "papers"):
         """初始化向量数据库"""
         try:
-            import chromadb
-            from chromadb.config import Settings
+            # 配置了索引服务 (INDEX_SERVER_URL) 时连接共享的服务进程，否则本地打开
+            from services.index_server import get_chroma_client
+            self.client = get_chroma_client("./data/chromadb")
         except ImportError:
             print("警告: chromadb 未安装，请运行: pip install chromadb")
             # 创建一个简单的fallback实现
@@ -23,16 +31,33 @@ class VectorDB:
             self.openai_client = None
             return
 
-        self.client = chromadb.PersistentClient(path="./data/chromadb")
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+        # HNSW 参数来自 vector_db.hnsw (或自动调优结果)；按版本指针路由，支持在线更换模型
+        from services.index_server import hnsw_metadata
+        from services.index_migration import VersionedCollection
+        self.collection = VersionedCollection(
+            self.client,
+            "./data/chromadb",
+            collection_name,
+            metadata=hnsw_metadata(default_space="cosine", collection=collection_name)
         )
 
+        # 上次未处理完的重试条目继续重试
+        self._retry_store = f"chromadb:{collection_name}"
+        from services.embedding_retry import has_pending
+        if has_pending(self._retry_store):
+            self._retry_worker()
+
     def embed_text(self, text: str) -> List[float]:
-        """使用本地Qwen3-Embedding-0.6B模型生成文本向量"""
+        """使用本地Qwen3-Embedding-0.6B模型生成文本向量
+
+        模型不可用或生成失败时抛出异常 (不再返回随机向量，避免污染索引)，
+        由调用方把文本块放入重试队列。
+        """
         # 检查本地模型是否已初始化
         if not hasattr(self, '_local_model'):
+            failed_at = getattr(self, '_model_failed_at', None)
+            if failed_at is not None and time.time() - failed_at < self.MODEL_RETRY_INTERVAL:
+                raise RuntimeError("本地Embedding模型不可用")
             try:
                 print("🔄 正在加载本地Embedding模型 (Qwen3-Embedding-0.6B)...")
                 from sentence_transformers import SentenceTransformer
@@ -50,78 +75,114 @@ class VectorDB:
 
                 print("✅ 本地Embedding模型加载成功!")
             except Exception as e:
-                print(f"⚠️ 本地模型加载失败，将使用随机向量: {e}")
-                # 返回随机向量作为fallback
-                import random
-                return [random.random() for _ in range(1024)]  # Qwen3-Embedding-0.6B的维度
-
-        try:
-            # 使用本地模型生成嵌入
-            embedding = self._local_model.encode(text)
-            return embedding.tolist()
-        except Exception as e:
-            print(f"本地嵌入生成失败: {e}")
-            # 返回随机向量作为fallback
-            import random
-            return [random.random() for _ in range(1024)]
-
-    def add_document(self, doc_id: str, content: str, metadata: Dict = None):
-        """添加文档到数据库"""
+                print(f"⚠️ 本地模型加载失败: {e}")
+                self._model_failed_at = time.time()
+                raise RuntimeError(f"本地Embedding模型加载失败: {e}") from e
+
+        # 使用本地模型生成嵌入
+        embedding = self._local_model.encode(text)
+        return embedding.tolist()
+
+    def _retry_worker(self):
+        """向量化失败的文本块由后台线程重试，成功后写入集合"""
+        if getattr(self, '_worker', None) is None:
+            from services.embedding_retry import EmbeddingRetryQueue, RetryWorker
+            self._worker = RetryWorker(
+                EmbeddingRetryQueue(),
+                self._retry_store,
+                lambda text: self.collection.embed_function(self.embed_text)(text),
+                lambda item, embedding: self.collection.upsert(
+                    ids=[item["payload"]["id"]],
+                    embeddings=[embedding.tolist() if hasattr(embedding, "tolist") else embedding],
+                    documents=[item["text"]],
+                    metadatas=[item["payload"]["metadata"]]
+                )
+            )
+        self._worker.start()
+        return self._worker
+
+    def _retry_later(self, chunk_id: str, text: str, metadata: Optional[Dict], error: Exception):
+        self._retry_worker().queue.put(self._retry_store, text, {"id": chunk_id, "metadata": metadata}, str(error))
+
+    def add_document(self, doc_id: str, content: str, metadata: Dict = None, content_list: List[Dict] = None):
+        """添加文档到数据库 (已入库的同一文档增量更新，见 index_document)"""
+        report = self.index_document(doc_id, content, metadata, content_list)
+        return bool(report) and report["embedded"] + report["deferred"] + report["reused"] == report["chunks"]
+
+    def index_document(
+        self,
+        doc_id: str,
+        content: str,
+        metadata: Dict = None,
+        content_list: List[Dict] = None,
+        title: str = None,
+        doi: str = None
+    ) -> Dict:
+        """增量索引文档
+
+        提供 MinerU 的 content_list 时按文档结构分块 (章节、表格、公式、图注)，
+        每个块带 chunk_type / section / page 元数据；否则对纯文本分块。
+        已入库的同一文档 (按 doc_id、DOI 或标题匹配，如论文的新版本) 只向量化
+        新增或改动的块，并删除新版本中已不存在的块。
+
+        Returns:
+            统计信息 (doc_id、reused、embedded、deleted 等)；失败时为空字典
+        """
         if not self.collection:
             print("ChromaDB未初始化，无法添加文档")
-            return False
+            return {}
 
         # 分块
-        chunks = self._chunk_text(content)
+        if content_list:
+            structured = list(chunk_content_list(content_list))
+            chunks = [chunk["text"] for chunk in structured]
+            chunk_metadata = [chunk["metadata"] for chunk in structured]
+        else:
+            chunks = chunk_text(content)
+            chunk_metadata = [{} for _ in chunks]
 
         if not chunks:
-            return False
-
-        # 为每个块生成嵌入（添加延迟避免过载）
-        print(f"正在为文档 '{doc_id}' 生成 {len(chunks)} 个嵌入...")
-        import time
-        embeddings = []
-
-        for i, chunk in enumerate(chunks):
-            if i > 0 and i % 10 == 0:
-                print(f"  已处理 {i}/{len(chunks)} 块...")
-                time.sleep(0.1)  # 每10个块暂停0.1秒
-
-            embedding = self.embed_text(chunk)
-            embeddings.append(embedding)
+            return {}
 
-        # 准备数据
-        ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
         metadatas = [
-            {**(metadata or {}), "chunk_index": i, "doc_id": doc_id}
-            for i in range(len(chunks))
+            {**(metadata or {}), **chunk_meta, "chunk_index": i}
+            for i, chunk_meta in enumerate(chunk_metadata)
         ]
+        identity = document_identity(doc_id, title, doi, markdown=content, content_list=content_list)
 
-        # 添加到ChromaDB
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas
-        )
+        # 新块分批写入ChromaDB: 不超过单批上限，向量化下一批的同时写入上一批
+        from services.bulk_loader import BulkLoader
+        embed = self.collection.embed_function(self.embed_text)
+        loader = BulkLoader(self.client, self.collection, embed, on_embed_error=self._retry_later)
+
+        try:
+            report = sync_document(self.collection, loader.load, chunks, metadatas, identity)
+        except Exception as e:
+            print(f"✗ 文档 '{doc_id}' 索引失败: {e}")
+            return {}
 
-        print(f"✓ 成功添加文档 '{doc_id}' ({len(chunks)} 个块)")
-        return True
+        if report["matched_by"]:
+            print(f"✓ 已更新文档 '{report['doc_id']}' ({format_report(report)})")
+        else:
+            print(f"✓ 成功添加文档 '{report['doc_id']}' ({format_report(report)})")
+        return report
 
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """搜索相关文档"""
+    def search(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """搜索相关文档 (where 为元数据等值过滤，如 {"chunk_type": "table"})"""
         if not self.collection:
             print("ChromaDB未初始化，无法搜索")
             return []
 
-        # 生成查询向量
-        query_embedding = self.embed_text(query)
-
         # 搜索
         try:
+            # 生成查询向量 (使用当前版本的模型)
+            query_embedding = self.collection.embed_function(self.embed_text)(query)
+
+            from services.index_server import chroma_where
             results = self.collection.query(
                 query_embeddings=[query_embedding],
-                n_results=n_results
+                n_results=n_results,
+                where=chroma_where(where)
             )
 
             # 格式化结果
@@ -142,32 +203,6 @@ class VectorDB:
             print(f"搜索失败: {e}")
             return []
 
-    def _chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-        """将文本分块"""
-        if not text:
-            return []
-
-        chunks = []
-        start = 0
-        text = text.replace('\n', ' ')
-
-        while start < len(text):
-            end = min(start + chunk_size, len(text))
-
-            # 尝试在句号处分割
-            if end < len(text):
-                last_period = text.rfind('。', start, end)
-                if last_period > start:
-                    end = last_period + 1
-
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-
-            start = max(start + chunk_size - overlap, end)
-
-        return chunks
-
     def list_documents(self) -> List[Dict]:
         """列出所有文档"""
         if not self.collection:
@@ -231,10 +266,12 @@ class VectorDB:
         try:
             count = self.collection.count()
             docs = self.list_documents()
+            from services.embedding_retry import EmbeddingRetryQueue
             return {
                 "total_chunks": count,
                 "total_documents": len(docs),
-                "documents": docs
+                "documents": docs,
+                "retry_queue": EmbeddingRetryQueue().depth(self._retry_store)
             }
         except Exception as e:
             return {"error": str(e)}